@@ -4,17 +4,25 @@ from flask_cors import CORS
 from mongoengine import connect, disconnect
 from app.config import Config
 from app.extensions import db
+from app.utils.structured_logging import setup_logging, parse_sample_rates
+from app.utils.event_sink import init_event_sink
+from app.events.partitions import start_maintenance as start_partition_maintenance
+from app.events.analytics import init_sketches
+from app.auth.hashing import hashing_pool
+from app.utils.metrics import init_metrics, instrument_engine, instrument_mongo
+from app.utils.profiling import init_profiling
 from flask_jwt_extended import JWTManager
 
 def configure_logging():
-    """Configure logging for the application."""
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.StreamHandler(),
-            logging.FileHandler("app.log")
-        ]
+    """Configure logging for the application (queued, JSON, rotated)."""
+    setup_logging(
+        level=Config.LOG_LEVEL,
+        log_file=Config.LOG_FILE,
+        max_bytes=Config.LOG_MAX_BYTES,
+        backup_count=Config.LOG_BACKUP_COUNT,
+        json_format=Config.LOG_JSON,
+        sample_rates=parse_sample_rates(Config.LOG_SAMPLE_RATES),
+        queue_size=Config.LOG_QUEUE_SIZE
     )
 
 def init_postgres(app):
@@ -47,9 +55,24 @@ def init_mongo(app):
         logging.error(f"Failed to connect to MongoDB: {e}")
         raise e
 
+def instrumented(app):
+    """DB calls are timed for metrics and for slow-request timelines"""
+    return app.config.get('METRICS_ENABLED', True) or app.config.get('SLOW_REQUEST_THRESHOLD_MS', 0) > 0
+
 def create_app():
     """Create and configure a Flask application."""
+    # Fork the password hashing workers first: forking is only safe while the
+    # process has no other threads, and configure_logging starts the log
+    # queue listener thread
+    hashing_error = None
+    try:
+        hashing_pool.start()
+    except Exception as e:
+        hashing_error = e
+
     configure_logging()
+    if hashing_error is not None:
+        logging.error(f"Password hashing pool failed to start: {hashing_error}")
     
     # Create Flask app instance with configuration from Config class
     app = Flask(__name__, instance_relative_config=True, static_folder='static')
@@ -79,10 +102,18 @@ def create_app():
     # Initialize extensions and databases
     try:
         init_postgres(app)
+        with app.app_context():
+            if instrumented(app):
+                instrument_engine(db.engine)
+            init_event_sink(app, db.engine)
+            init_sketches(app, db.engine)
+            start_partition_maintenance(db.engine)
     except Exception as e:
         logging.error("PostgreSQL initialization failed.")
     
     try:
+        if instrumented(app):
+            instrument_mongo()
         init_mongo(app)
     except Exception as e:
         logging.error("MongoDB initialization failed.")
@@ -91,6 +122,16 @@ def create_app():
     jwt = JWTManager()
     jwt.init_app(app)
 
+    if app.config.get('METRICS_ENABLED', True):
+        init_metrics(app)
+    init_profiling(app)
+
+    # Register CLI commands
+    from app.products.commands import register_commands as register_product_commands
+    from app.events.commands import register_commands as register_event_commands
+    register_product_commands(app)
+    register_event_commands(app)
+
     # Register blueprints
     # from app.auth.routes import api as auth_api
     # app.register_blueprint(auth_api, url_prefix='/api')
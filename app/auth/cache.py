@@ -0,0 +1,107 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict
+
+# Short-lived per-process cache of emails with no account, so repeated
+# logins for unknown emails (credential stuffing) skip the user lookup
+NEGATIVE_CACHE_TTL = float(os.getenv('AUTH_NEGATIVE_CACHE_TTL', 30))
+NEGATIVE_CACHE_MAX_ENTRIES = int(os.getenv('AUTH_NEGATIVE_CACHE_MAX_ENTRIES', 10000))
+# Signups can happen on any worker: before answering from the cache, the
+# shared user count is re-read at most this often (seconds, 0 = every time)
+# and any change drops every cached miss
+NEGATIVE_CACHE_RECHECK = float(os.getenv('AUTH_NEGATIVE_CACHE_RECHECK', 1))
+
+_lock = threading.Lock()
+_unknown = OrderedDict()
+# Last value read from the shared signal, when it was read and when it was
+# last seen to move (or first read)
+_signal = {
+    'value': None,
+    'checked_at': None,
+    'changed_at': None,
+}
+_stats = {
+    'hits': 0,
+    'misses': 0,
+    'stored': 0,
+    'resets': 0,
+}
+
+
+def _signal_changed(read_signal: Callable[[], int], now: float) -> bool:
+    """Re-read the shared signal when due; True if it moved since the last read"""
+    with _lock:
+        checked_at = _signal['checked_at']
+        if checked_at is not None and now - checked_at < NEGATIVE_CACHE_RECHECK:
+            return False
+    value = read_signal()
+    with _lock:
+        changed = value != _signal['value']
+        if changed:
+            _unknown.clear()
+            _signal['changed_at'] = now
+            if _signal['value'] is not None:
+                _stats['resets'] += 1
+        _signal['value'], _signal['checked_at'] = value, now
+    return changed
+
+
+def is_unknown(email: str, read_signal: Callable[[], int]) -> bool:
+    """
+    Return True if `email` recently had no account.
+
+    `read_signal` returns a value that changes whenever any process creates
+    an account (the user count); cached misses are dropped when it moves.
+    """
+    if NEGATIVE_CACHE_TTL <= 0:
+        return False
+    now = time.monotonic()
+    with _lock:
+        expires_at = _unknown.get(email)
+        if expires_at is not None and expires_at <= now:
+            del _unknown[email]
+            expires_at = None
+    if expires_at is not None and _signal_changed(read_signal, now):
+        expires_at = None
+    with _lock:
+        _stats['hits' if expires_at is not None else 'misses'] += 1
+    return expires_at is not None
+
+
+def remember_unknown(email: str, looked_up_at: float, read_signal: Callable[[], int]):
+    """
+    Cache that the lookup started at `looked_up_at` (time.monotonic()) found no
+    account for `email`.
+
+    The miss is not kept if the signal has moved since the lookup started (or
+    had never been read), since a signup in between would not be noticed.
+    """
+    if NEGATIVE_CACHE_TTL <= 0:
+        return
+    now = time.monotonic()
+    _signal_changed(read_signal, now)
+    with _lock:
+        if _signal['changed_at'] >= looked_up_at:
+            return
+        _unknown[email] = now + NEGATIVE_CACHE_TTL
+        _unknown.move_to_end(email)
+        _stats['stored'] += 1
+        while len(_unknown) > NEGATIVE_CACHE_MAX_ENTRIES:
+            _unknown.popitem(last=False)
+
+
+def forget(email: str):
+    """Drop `email` once an account exists for it"""
+    with _lock:
+        _unknown.pop(email, None)
+
+
+def stats() -> Dict:
+    with _lock:
+        result = dict(_stats)
+        result['entries'] = len(_unknown)
+    result['ttl'] = NEGATIVE_CACHE_TTL
+    result['recheck'] = NEGATIVE_CACHE_RECHECK
+    return result
@@ -1,48 +1,86 @@
-import bcrypt
+import time
 from datetime import datetime, timedelta
 from typing import Optional, Dict
 from flask import current_app
 from flask_jwt_extended import create_access_token
+from mongoengine.errors import NotUniqueError
 from .models import User
+from . import cache
+from .hashing import hashing_pool, needs_rehash, HashingBusy
 from app.extensions import db
 from app.events.models import Event
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash"""
-    return bcrypt.checkpw(
-        plain_password.encode('utf-8'),
-        hashed_password.encode('utf-8')
-    )
+    """Verify a password against its hash (in the hashing process pool)"""
+    return hashing_pool.check_password(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    """Generate password hash"""
-    return bcrypt.hashpw(
-        password.encode('utf-8'),
-        bcrypt.gensalt()
-    ).decode('utf-8')
+    """Generate password hash at the configured cost (in the hashing process pool)"""
+    return hashing_pool.hash_password(password)
+
+def upgrade_password_hash(user: User, password: str):
+    """Rehash a verified password whose hash uses an outdated cost factor"""
+    try:
+        hashed_password = get_password_hash(password)
+        User.objects(id=user.id, hashed_password=user.hashed_password).update_one(
+            set__hashed_password=hashed_password
+        )
+        user.hashed_password = hashed_password
+    except Exception as e:
+        # The old hash still works; try again on the next login
+        current_app.logger.warning(f"Password rehash failed: {str(e)}")
+
+# Fields read by login (found through the unique email index)
+LOGIN_FIELDS = ('id', 'name', 'hashed_password', 'is_active')
+
+def count_users() -> int:
+    """Collection-metadata user count; moves whenever any worker creates a user"""
+    return User._get_collection().estimated_document_count()
+
+def find_login_user(email: str) -> Optional[User]:
+    """Look up the login fields of the active user with this email"""
+    if cache.is_unknown(email, count_users):
+        return None
+
+    looked_up_at = time.monotonic()
+    doc = User.objects(email=email).only(*LOGIN_FIELDS).as_pymongo().first()
+    if doc is None:
+        cache.remember_unknown(email, looked_up_at, count_users)
+        return None
+    if not doc.get('is_active', True):
+        return None
+
+    return User(
+        id=doc['_id'],
+        name=doc.get('name'),
+        email=email,
+        hashed_password=doc['hashed_password'],
+        is_active=True
+    )
 
 def authenticate_user(email: str, password: str) -> Optional[User]:
     """Authenticate user and return user object if valid"""
     try:
-        user = User.objects(email=email).first()
+        user = find_login_user(email)
         if not user or not verify_password(password, user.hashed_password):
             return None
+
+        if needs_rehash(user.hashed_password):
+            upgrade_password_hash(user, password)
         
         # Log successful login event
         # log_event('LOGIN', 'AUTH', str(user.id))
         
         return user
+    except HashingBusy:
+        raise
     except Exception as e:
         current_app.logger.error(f"Authentication error: {str(e)}")
         return None
 
 def create_user(user_data: Dict) -> User:
-    """Create new user"""
+    """Create new user with a single insert; the unique email index rejects duplicates"""
     try:
-        # Check if user already exists
-        if User.objects(email=user_data['email']).first():
-            raise ValueError("Email already registered")
-
         # Hash the password
         hashed_password = get_password_hash(user_data['password'])
         
@@ -52,7 +90,11 @@ def create_user(user_data: Dict) -> User:
             email=user_data['email'],
             hashed_password=hashed_password
         )
-        user.save()
+        try:
+            user.save(force_insert=True)
+        except NotUniqueError:
+            raise ValueError("Email already registered")
+        cache.forget(user.email)
         
         # Log user creation event
         # log_event('CREATE', 'USER', str(user.id))
@@ -0,0 +1,149 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional
+
+import bcrypt
+
+# bcrypt cost factor for new hashes; hashes with another cost are upgraded on login
+BCRYPT_ROUNDS = int(os.getenv('AUTH_BCRYPT_ROUNDS', 12))
+# Worker processes doing bcrypt (0 hashes on the calling thread)
+HASH_WORKERS = int(os.getenv('AUTH_HASH_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+# Hash jobs allowed to be running or queued for the pool at once
+HASH_MAX_PENDING = int(os.getenv('AUTH_HASH_MAX_PENDING', HASH_WORKERS * 4))
+# Seconds a request waits for a pool slot before it is rejected
+HASH_QUEUE_TIMEOUT = float(os.getenv('AUTH_HASH_QUEUE_TIMEOUT', 2.0))
+
+
+class HashingBusy(Exception):
+    """Raised when the password hashing pool is saturated"""
+
+
+def _hashpw(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def _checkpw(password: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(password, hashed)
+
+
+class HashingPool:
+    """
+    Runs bcrypt in a dedicated process pool so password hashing cannot pin
+    the request workers.
+
+    At most `max_pending` jobs are running or queued; callers wait up to
+    `queue_timeout` seconds for a slot and then get HashingBusy.
+
+    Workers are forked, which is cheap but only safe before the process
+    starts threads, so `start()` is the first thing create_app does (before
+    logging starts its queue listener). A pool inherited across a later fork
+    is replaced lazily in the child.
+    """
+
+    def __init__(self, workers: int = HASH_WORKERS, max_pending: int = HASH_MAX_PENDING,
+                 queue_timeout: float = HASH_QUEUE_TIMEOUT):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'jobs': 0,
+            'rejected': 0,
+            'queue_wait_seconds_total': 0.0,
+            'hash_seconds_total': 0.0
+        }
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is not None and self._pid == os.getpid():
+            return self._executor
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                # spawn/forkserver would re-import the app's main module in every worker
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('fork')
+                )
+                self._pid = os.getpid()
+        return self._executor
+
+    def start(self):
+        """Fork the worker processes now (all of them start on the first job)"""
+        if self.workers > 0:
+            self._get_executor().submit(_checkpw, b'', _hashpw(b'', 4)).result()
+
+    def _run(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._stats_lock:
+                self._stats['rejected'] += 1
+            raise HashingBusy('Password hashing is at capacity, try again shortly')
+        acquired = time.perf_counter()
+        try:
+            executor = self._get_executor()
+            try:
+                result = executor.submit(fn, *args).result()
+            except BrokenProcessPool:
+                # A worker died; replace the pool and retry once
+                with self._lock:
+                    if self._executor is executor:
+                        self._executor = None
+                result = self._get_executor().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+        with self._stats_lock:
+            self._stats['jobs'] += 1
+            self._stats['queue_wait_seconds_total'] += acquired - started
+            self._stats['hash_seconds_total'] += time.perf_counter() - acquired
+        return result
+
+    def hash_password(self, password: str, rounds: int = BCRYPT_ROUNDS) -> str:
+        return self._run(_hashpw, password.encode('utf-8'), rounds).decode('utf-8')
+
+    def check_password(self, password: str, hashed: str) -> bool:
+        return self._run(_checkpw, password.encode('utf-8'), hashed.encode('utf-8'))
+
+    def close(self):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        jobs = stats['jobs']
+        stats.update({
+            'hash_seconds_avg': stats['hash_seconds_total'] / jobs if jobs else 0.0,
+            'queue_wait_seconds_avg': stats['queue_wait_seconds_total'] / jobs if jobs else 0.0,
+            'workers': self.workers,
+            'max_pending': self.max_pending,
+            'rounds': BCRYPT_ROUNDS
+        })
+        return stats
+
+
+def hash_rounds(hashed: str) -> Optional[int]:
+    """Cost factor of a bcrypt hash ('$2b$12$...'), None if it is not one"""
+    parts = hashed.split('$')
+    try:
+        return int(parts[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def needs_rehash(hashed: str, rounds: int = BCRYPT_ROUNDS) -> bool:
+    return hash_rounds(hashed) != rounds
+
+
+hashing_pool = HashingPool()
@@ -12,7 +12,12 @@ class User(Document):
 
     meta = {
         'collection': 'identifier_users',
-        'indexes': ['email']
+        # One unique index serves both signup's duplicate check and the login
+        # lookup; a covering (email, ...) compound index could not enforce
+        # uniqueness of email on its own
+        'indexes': [
+            {'fields': ['email'], 'unique': True}
+        ]
     }
 
     def to_dict(self):
@@ -1,4 +1,4 @@
-import traceback
+import logging
 from flask import request
 from flask_restx import Namespace, Resource
 from flask_jwt_extended import create_access_token
@@ -6,6 +6,15 @@ from .controller import (
     create_user, authenticate_user
 )
 from .models import init_models
+from .hashing import HashingBusy
+
+logger = logging.getLogger(__name__)
+
+# Returned when the password hashing pool is saturated
+BUSY_RESPONSE = {
+    'code': 'AUTH_BUSY',
+    'message': 'Too many authentication requests, try again shortly'
+}
 
 api = Namespace('auth', description='Authentication related endpoints')
 models = init_models(api)
@@ -19,6 +28,8 @@ class Signup(Resource):
             data = request.json
             user = create_user(data)
             return user.to_dict(), 201
+        except HashingBusy:
+            return BUSY_RESPONSE, 503, {'Retry-After': '1'}
         except Exception as e:
             return {'error': str(e)}, 400
 
@@ -42,9 +53,11 @@ class Login(Resource):
                 'user': user.to_dict()
             }, 200
             
+        except HashingBusy:
+            return BUSY_RESPONSE, 503, {'Retry-After': '1'}
         except Exception as e:
             # Log the actual error for debugging
-            print(f"Login error: {str(e)}")
+            logger.error(f"Login error: {str(e)}")
             return {
                 'code': 'SERVER_ERROR',
                 'message': 'An unexpected error occurred'
@@ -39,3 +39,41 @@ class Config:
     SHOPIFY_ACCESS_TOKEN = os.getenv('SHOPIFY_ACCESS_TOKEN', 'your-access-token')
     SHOPIFY_API_VERSION = os.getenv('SHOPIFY_API_VERSION', '2024-01')
 
+    # Background event writer ('block' or 'drop' when the queue is full,
+    # 'insert' or 'copy' to write batches)
+    EVENT_SINK_ENABLED = os.getenv('EVENT_SINK_ENABLED', 'false').lower() == 'true'
+    EVENT_SINK_BATCH_SIZE = int(os.getenv('EVENT_SINK_BATCH_SIZE', 500))
+    EVENT_SINK_MAX_AGE = float(os.getenv('EVENT_SINK_MAX_AGE', 1.0))
+    EVENT_SINK_MAX_QUEUE = int(os.getenv('EVENT_SINK_MAX_QUEUE', 10000))
+    EVENT_SINK_POLICY = os.getenv('EVENT_SINK_POLICY', 'block')
+    EVENT_SINK_BLOCK_TIMEOUT = float(os.getenv('EVENT_SINK_BLOCK_TIMEOUT', 0.5))
+    EVENT_SINK_METHOD = os.getenv('EVENT_SINK_METHOD', 'insert')
+    EVENT_SINK_RETRIES = int(os.getenv('EVENT_SINK_RETRIES', 3))
+    EVENT_SINK_RETRY_DELAY = float(os.getenv('EVENT_SINK_RETRY_DELAY', 0.5))
+
+    # Seconds between flushes of the analytics sketches to PostgreSQL
+    EVENT_SKETCH_FLUSH_INTERVAL = float(os.getenv('EVENT_SKETCH_FLUSH_INTERVAL', 10))
+
+    # Logging (queued background writer, JSON records, size-based rotation)
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_FILE = os.getenv('LOG_FILE', 'app.log')
+    LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024))
+    LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', 5))
+    LOG_JSON = os.getenv('LOG_JSON', 'true').lower() == 'true'
+    # Fraction of DEBUG records kept per logger, e.g. 'app.utils.shopify=0.01'
+    LOG_SAMPLE_RATES = os.getenv('LOG_SAMPLE_RATES', '')
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+
+    # Prometheus metrics on /metrics (set PROMETHEUS_MULTIPROC_DIR with several workers)
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+
+    # Request profiling (cProfile on demand) and slow-request timelines
+    PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'false').lower() == 'true'
+    PROFILING_DIR = os.getenv('PROFILING_DIR', 'profiles')
+    PROFILING_HEADER = os.getenv('PROFILING_HEADER', 'X-Profile')
+    PROFILING_TOKEN = os.getenv('PROFILING_TOKEN', '')
+    PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 0.0))
+    SLOW_REQUEST_THRESHOLD_MS = int(os.getenv('SLOW_REQUEST_THRESHOLD_MS', 0))
+
+    # JSON encoder for API responses: 'auto' (orjson when installed), 'orjson' or 'json'
+    JSON_BACKEND = os.getenv('JSON_BACKEND', 'auto')
@@ -0,0 +1,289 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import text, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.events.models import Event, EventSketch
+from app.events.rollups import hour_bucket
+from app.events.services import on_events_committed
+from app.extensions import db
+from app.utils.sketches import HyperLogLog, TopK, CountMinSketch
+
+logger = logging.getLogger(__name__)
+
+# Approximate analytics: per-hour sketches fed from committed events. Run
+# `flask rebuild-event-sketches` after enabling to fill in history.
+SKETCHES_ENABLED = os.getenv('EVENT_SKETCHES_ENABLED', 'false').lower() == 'true'
+HLL_PRECISION = int(os.getenv('EVENT_SKETCH_HLL_PRECISION', 12))
+CMS_WIDTH = int(os.getenv('EVENT_SKETCH_CMS_WIDTH', 2048))
+CMS_DEPTH = int(os.getenv('EVENT_SKETCH_CMS_DEPTH', 4))
+TOP_CAPACITY = int(os.getenv('EVENT_SKETCH_TOP_CAPACITY', 100))
+# Seconds between writes of the in-process sketches to Postgres
+FLUSH_INTERVAL = float(os.getenv('EVENT_SKETCH_FLUSH_INTERVAL', 10))
+
+HLL = 'hll'
+TOPK = 'topk'
+# HLL key for distinct users across all products
+ALL_PRODUCTS = ''
+
+SketchKey = Tuple[str, str, datetime]
+
+
+def new_sketch(kind: str):
+    if kind == HLL:
+        return HyperLogLog(HLL_PRECISION)
+    return TopK(TOP_CAPACITY, CountMinSketch(CMS_WIDTH, CMS_DEPTH))
+
+
+def load_sketch(kind: str, raw: bytes):
+    if kind == HLL:
+        return HyperLogLog.from_bytes(raw)
+    return TopK.from_bytes(raw)
+
+
+def add_rows(sketches: Dict[SketchKey, object], rows: Iterable[Dict]):
+    """Add event rows to in-memory sketches keyed (kind, key, hour bucket)"""
+    now = datetime.utcnow()
+    for row in rows:
+        bucket = hour_bucket(row.get('timestamp') or now)
+        user_id = str(row['user_id'])
+        product_id = str(row['product_id'])
+        for key in (product_id, ALL_PRODUCTS):
+            sketch_key = (HLL, key, bucket)
+            if sketch_key not in sketches:
+                sketches[sketch_key] = new_sketch(HLL)
+            sketches[sketch_key].add(user_id)
+        sketch_key = (TOPK, row['event_type'], bucket)
+        if sketch_key not in sketches:
+            sketches[sketch_key] = new_sketch(TOPK)
+        sketches[sketch_key].add(product_id)
+
+
+def write_sketches(connection, sketches: Dict[SketchKey, object]):
+    """
+    Merge in-memory sketches into the stored ones.
+
+    New rows are inserted; existing rows are locked, merged in Python and
+    rewritten. Keys are processed in sorted order so concurrent writers
+    lock rows in the same order.
+    """
+    if not sketches:
+        return
+    table = EventSketch.__table__
+    keys = sorted(sketches)
+
+    statement = pg_insert(table).values([
+        {'kind': kind, 'key': key, 'bucket': bucket, 'data': sketches[(kind, key, bucket)].to_bytes()}
+        for kind, key, bucket in keys
+    ]).on_conflict_do_nothing().returning(table.c.kind, table.c.key, table.c.bucket)
+    inserted = {tuple(row) for row in connection.execute(statement)}
+
+    existing = [sketch_key for sketch_key in keys if sketch_key not in inserted]
+    if not existing:
+        return
+    stored = connection.execute(
+        db.select(table.c.kind, table.c.key, table.c.bucket, table.c.data)
+        .where(tuple_(table.c.kind, table.c.key, table.c.bucket).in_(existing))
+        .order_by(table.c.kind, table.c.key, table.c.bucket)
+        .with_for_update()
+    )
+    for kind, key, bucket, data in stored:
+        merged = load_sketch(kind, data)
+        merged.merge(sketches[(kind, key, bucket)])
+        connection.execute(
+            table.update()
+            .where(table.c.kind == kind, table.c.key == key, table.c.bucket == bucket)
+            .values(data=merged.to_bytes())
+        )
+
+
+class SketchAggregator:
+    """
+    Builds sketches from committed events in memory and merges them into
+    Postgres every `flush_interval` seconds from a background thread.
+
+    Sketch updates never touch the database on the request path; estimates
+    for the current process include its unflushed sketches, while other
+    processes' writes show up after their next flush.
+    """
+
+    def __init__(self, engine, flush_interval: float = FLUSH_INTERVAL):
+        self.engine = engine
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._stats = {
+            'added_rows': 0,
+            'flushes': 0,
+            'flushed_sketches': 0,
+            'failed_flushes': 0,
+            'flush_seconds_total': 0.0,
+            'flush_seconds_max': 0.0
+        }
+
+    def _ensure_started(self):
+        # Start lazily and again after a fork, since threads don't survive it
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='event-sketches', daemon=True)
+            self._thread.start()
+
+    def add(self, rows: List[Dict]):
+        """Commit listener: fold committed event rows into the pending sketches"""
+        self._ensure_started()
+        with self._lock:
+            add_rows(self._pending, rows)
+            self._stats['added_rows'] += len(rows)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+        self.flush()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return
+
+            started = time.perf_counter()
+            try:
+                with self.engine.begin() as connection:
+                    write_sketches(connection, pending)
+            except Exception as e:
+                logger.error(f"Failed to flush {len(pending)} event sketches: {str(e)}")
+                # Keep the deltas for the next attempt
+                with self._lock:
+                    for sketch_key, sketch in pending.items():
+                        if sketch_key in self._pending:
+                            sketch.merge(self._pending[sketch_key])
+                        self._pending[sketch_key] = sketch
+                    self._stats['failed_flushes'] += 1
+                return
+
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._stats['flushes'] += 1
+                self._stats['flushed_sketches'] += len(pending)
+                self._stats['flush_seconds_total'] += elapsed
+                self._stats['flush_seconds_max'] = max(self._stats['flush_seconds_max'], elapsed)
+
+    def pending(self, kind: str, key: str, start: Optional[datetime]) -> List:
+        """Copies of unflushed sketches for (kind, key) from `start` on"""
+        with self._lock:
+            return [
+                load_sketch(kind, sketch.to_bytes())
+                for (sketch_kind, sketch_key, bucket), sketch in self._pending.items()
+                if sketch_kind == kind and sketch_key == key and (start is None or bucket >= start)
+            ]
+
+    def close(self, timeout: float = 10.0):
+        """Write the pending sketches and stop the flusher"""
+        self._stop.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending_sketches'] = len(self._pending)
+        stats['flush_interval'] = self.flush_interval
+        return stats
+
+
+aggregator = None
+
+
+def init_sketches(app, engine) -> Optional[SketchAggregator]:
+    """Start feeding committed events into the sketches (EVENT_SKETCHES_ENABLED)"""
+    global aggregator
+    if not SKETCHES_ENABLED:
+        return None
+
+    aggregator = SketchAggregator(engine, app.config.get('EVENT_SKETCH_FLUSH_INTERVAL', FLUSH_INTERVAL))
+    on_events_committed(aggregator.add)
+    atexit.register(aggregator.close)
+    return aggregator
+
+
+def get_aggregator() -> Optional[SketchAggregator]:
+    return aggregator
+
+
+def load_sketches(kind: str, key: str, start: Optional[datetime] = None) -> List:
+    """Stored plus unflushed sketches for (kind, key) in hours from `start` on"""
+    query = db.session.query(EventSketch.data).filter(EventSketch.kind == kind, EventSketch.key == key)
+    if start is not None:
+        query = query.filter(EventSketch.bucket >= hour_bucket(start))
+    sketches = [load_sketch(kind, data) for (data,) in query]
+    if aggregator is not None:
+        sketches.extend(aggregator.pending(kind, key, hour_bucket(start) if start else None))
+    return sketches
+
+
+def rebuild_sketches(since: Optional[datetime] = None, batch_size: int = 10000) -> Dict:
+    """
+    Recompute the sketches from raw events (all history, or hours from `since`).
+
+    Events are streamed in timestamp order and written one hour at a time.
+    The sketch table is locked for the rebuild; sketches that running
+    workers have not flushed yet are merged on top afterwards, which can
+    only raise Count-Min estimates for the most recent hours.
+    """
+    table = EventSketch.__table__
+    result = {'events': 0, 'sketches': 0}
+    with db.engine.begin() as connection:
+        table.create(bind=connection, checkfirst=True)
+        connection.execute(text(f'LOCK TABLE {table.name} IN EXCLUSIVE MODE'))
+
+        delete = table.delete()
+        if since is not None:
+            delete = delete.where(table.c.bucket >= hour_bucket(since))
+        connection.execute(delete)
+
+        select = db.select(Event.event_type, Event.user_id, Event.product_id, Event.timestamp) \
+            .order_by(Event.timestamp)
+        if since is not None:
+            select = select.where(Event.timestamp >= hour_bucket(since))
+
+        rows = connection.execution_options(stream_results=True, yield_per=batch_size).execute(select)
+        current_hour = None
+        sketches = {}
+        for row in rows.mappings():
+            bucket = hour_bucket(row['timestamp'])
+            if bucket != current_hour:
+                write_sketches(connection, sketches)
+                result['sketches'] += len(sketches)
+                sketches = {}
+                current_hour = bucket
+            add_rows(sketches, [row])
+            result['events'] += 1
+        write_sketches(connection, sketches)
+        result['sketches'] += len(sketches)
+
+    return result
+
+
+def error_bounds() -> Dict:
+    """Documented accuracy of the configured sketches"""
+    overcount, confidence = CountMinSketch.error_rate(CMS_WIDTH, CMS_DEPTH)
+    return {
+        'unique_relative_standard_error': round(HyperLogLog.standard_error(HLL_PRECISION), 5),
+        'top_count_max_overcount_fraction': round(overcount, 5),
+        'top_count_confidence': round(confidence, 5)
+    }
@@ -0,0 +1,63 @@
+import json
+import click
+from datetime import datetime
+from app.extensions import db
+from .rollups import rebuild_rollups
+from .analytics import rebuild_sketches
+from . import partitions
+
+
+@click.command('rebuild-event-rollups')
+@click.option('--since', default=None, help='Only rebuild hours from this ISO timestamp (default: all history)')
+def rebuild_event_rollups_command(since):
+    """Recompute the hourly event rollup tables from raw events"""
+    since = datetime.fromisoformat(since) if since else None
+    result = rebuild_rollups(since)
+    click.echo(json.dumps(result, indent=2))
+
+
+@click.command('rebuild-event-sketches')
+@click.option('--since', default=None, help='Only rebuild hours from this ISO timestamp (default: all history)')
+def rebuild_event_sketches_command(since):
+    """Recompute the hourly unique-user and top-product sketches from raw events"""
+    since = datetime.fromisoformat(since) if since else None
+    result = rebuild_sketches(since)
+    click.echo(json.dumps(result, indent=2))
+
+
+@click.group('event-partitions')
+def event_partitions_group():
+    """Manage monthly partitions of identifier_events"""
+
+
+@event_partitions_group.command('migrate')
+@click.option('--batch-size', default=50000, show_default=True, help='Rows copied per transaction')
+def migrate_partitions_command(batch_size):
+    """Move identifier_events to a month-partitioned table online"""
+    result = partitions.migrate_to_partitioned(db.engine, batch_size=batch_size, echo=click.echo)
+    click.echo(json.dumps(result, indent=2))
+
+
+@event_partitions_group.command('ensure')
+@click.option('--months-ahead', default=partitions.MONTHS_AHEAD, show_default=True)
+def ensure_partitions_command(months_ahead):
+    """Create missing partitions up to --months-ahead"""
+    with db.engine.begin() as connection:
+        created = partitions.ensure_partitions(connection, months_ahead=months_ahead)
+    click.echo(json.dumps({'created': created}, indent=2))
+
+
+@event_partitions_group.command('drop-expired')
+@click.option('--retain-months', default=partitions.RETENTION_MONTHS, show_default=True)
+def drop_expired_partitions_command(retain_months):
+    """Drop whole partitions older than --retain-months"""
+    with db.engine.begin() as connection:
+        dropped = partitions.drop_expired_partitions(connection, retain_months=retain_months)
+    click.echo(json.dumps({'dropped': dropped}, indent=2))
+
+
+def register_commands(app):
+    """Register event CLI commands on the Flask app"""
+    app.cli.add_command(rebuild_event_rollups_command)
+    app.cli.add_command(rebuild_event_sketches_command)
+    app.cli.add_command(event_partitions_group)
@@ -1,93 +1,453 @@
-from datetime import datetime, timedelta
-from app.events.models import Event
+import base64
+from collections import namedtuple
+import csv
+import io
+import json
+from datetime import datetime, timedelta, timezone
+from marshmallow import ValidationError, EXCLUDE
+from app.events.models import Event, EventRollup, ProductEventRollup
+from app.events import rollups
+from app.events.input_validation import EventCreateSchema, MAX_PAGE_SIZE
+from app.events.services import insert_events, notify_events_committed
+from app.events import stats_cache
+from app.events import analytics
 from app.extensions import db
-from sqlalchemy import func, desc, and_
+from app.utils.serialization import dumps
+from app.utils.sketches import TopK, merge_all
+from sqlalchemy import func, desc, and_, tuple_, distinct
+
+# One aggregated stats row, shaped like the raw GROUP BY result
+StatRow = namedtuple('StatRow', ['timestamp', 'event_type', 'count'])
+
+# Default page size for keyset pagination
+DEFAULT_PAGE_SIZE = 100
+# Rows fetched per round trip by the server-side export cursor
+EXPORT_BATCH_SIZE = 2000
+# Events loaded per COPY / INSERT statement by ingest_events
+INGEST_CHUNK_SIZE = 5000
+# Validation errors echoed back per ingest request
+MAX_REPORTED_ERRORS = 100
+# Event types combined by event_type=all
+EVENT_TYPES = ('CREATE', 'READ', 'UPDATE', 'DELETE')
+
+def time_range_start(time_range, now=None):
+    """Start of a 'day', 'week' or 'month' time range ending now (None for no range)"""
+    now = now or datetime.utcnow()
+    if time_range == 'day':
+        return now - timedelta(days=1)
+    elif time_range == 'week':
+        return now - timedelta(weeks=1)
+    elif time_range == 'month':
+        return now - timedelta(days=30)
+    return None
+
+
+def apply_filters(query, filters=None):
+    """
+    Apply the EventFilterSchema filters (time range, event type, user, product)
+    to an Event query
+    """
+    if not filters:
+        return query
+
+    # Handle time range filter
+    start_date = time_range_start(filters.get('time_range'))
+    if start_date is not None:
+        query = query.filter(Event.timestamp >= start_date)
+
+    # Handle event type filter - skip if 'all' is selected
+    if filters.get('event_type') and filters['event_type'].lower() != 'all':
+        query = query.filter(Event.event_type == filters['event_type'])
+
+    # Handle user ID filter
+    if filters.get('user_id'):
+        query = query.filter(Event.user_id == filters['user_id'])
+
+    # Handle product ID filter
+    if filters.get('product_id'):
+        query = query.filter(Event.product_id == filters['product_id'])
+
+    return query
+
+
+def encode_cursor(event):
+    """Opaque keyset cursor for the (timestamp, event_id) position of an event"""
+    raw = json.dumps([event.timestamp.isoformat(), event.event_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor"""
+    try:
+        timestamp, event_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return datetime.fromisoformat(timestamp), int(event_id)
+    except (ValueError, TypeError) as e:
+        raise ValidationError({'cursor': ['Invalid cursor']}) from e
+
+
+def estimate_count(query):
+    """Row estimate from the planner (EXPLAIN) instead of running COUNT(*)"""
+    statement = query.order_by(None).statement
+    compiled = statement.compile(dialect=db.engine.dialect)
+    plan = db.session.connection().exec_driver_sql(
+        f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params
+    ).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
 
 def get_all_events(filters=None):
     """
-    Get all events with optional filtering
+    Get one page of events with optional filtering.
+
+    Pages are `limit` events (DEFAULT_PAGE_SIZE when missing, at most
+    MAX_PAGE_SIZE), newest first, using keyset pagination on
+    (timestamp, event_id); follow `next_cursor` for the rest. `include_total`
+    adds an 'exact' COUNT(*) or a cheap planner 'estimate' of the total.
     """
-    query = Event.query
+    filters = filters or {}
+    query = apply_filters(Event.query, filters)
 
-    if filters:
-        # Handle time range filter
-        if filters.get('time_range'):
-            now = datetime.utcnow()
-            if filters['time_range'] == 'day':
-                start_date = now - timedelta(days=1)
-                query = query.filter(Event.timestamp >= start_date)
-            elif filters['time_range'] == 'week':
-                start_date = now - timedelta(weeks=1)
-                query = query.filter(Event.timestamp >= start_date)
-            elif filters['time_range'] == 'month':
-                start_date = now - timedelta(days=30)
-                query = query.filter(Event.timestamp >= start_date)
+    limit = min(filters.get('limit') or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
 
-        # Handle event type filter - skip if 'all' is selected
-        if filters.get('event_type') and filters['event_type'].lower() != 'all':
-            query = query.filter(Event.event_type == filters['event_type'])
+    total = None
+    if filters.get('include_total') == 'exact':
+        total = query.order_by(None).count()
+    elif filters.get('include_total') == 'estimate':
+        total = estimate_count(query)
 
-        # Handle user ID filter
-        if filters.get('user_id'):
-            query = query.filter(Event.user_id == filters['user_id'])
+    page_query = query
+    if filters.get('cursor'):
+        timestamp, event_id = decode_cursor(filters['cursor'])
+        page_query = page_query.filter(
+            tuple_(Event.timestamp, Event.event_id) < (timestamp, event_id),
+            # Redundant bound so monthly partitions after the cursor are pruned
+            Event.timestamp <= timestamp
+        )
 
-    # Order by timestamp descending (newest first)
-    query = query.order_by(desc(Event.timestamp))
+    # Fetch one extra row to know whether another page exists
+    events = page_query.with_entities(*Event.columns()).order_by(
+        desc(Event.timestamp), desc(Event.event_id)
+    ).limit(limit + 1).all()
+    has_more = len(events) > limit
+    events = events[:limit]
 
-    # Execute query and convert to dict
-    events = query.all()
-    return [event.to_dict() for event in events]
+    result = {
+        'events': Event.dump_rows(events),
+        'next_cursor': encode_cursor(events[-1]) if has_more else None
+    }
+    if total is not None:
+        result['total'] = total
+    return result
 
 
-def get_event_stats(filters=None):
+def export_events(filters=None, fmt='ndjson', batch_size=EXPORT_BATCH_SIZE, backend='auto'):
     """
-    Get event statistics for visualization
+    Stream filtered events as NDJSON (encoded with the `backend` JSON
+    encoder) or CSV chunks.
+
+    Rows are read through a server-side (named) cursor `batch_size` rows at
+    a time, so memory stays flat however many rows match. Closing the
+    generator (e.g. when the client disconnects) closes the cursor and
+    releases its connection.
     """
-    # query = Event.query
+    columns = (Event.event_id, Event.event_type, Event.user_id, Event.product_id, Event.timestamp)
+    query = apply_filters(db.session.query(*columns), filters)
+    statement = query.order_by(desc(Event.timestamp), desc(Event.event_id)).statement
+    names = [column.key for column in columns]
 
-  
+    # Resolve the engine now; the generator may run after the request context
+    engine = db.engine
 
-    # Get group by parameter (default to day if not specified)
-    group_by = filters.get('group_by', 'day') if filters else 'day'
+    def generate():
+        connection = engine.connect().execution_options(stream_results=True, yield_per=batch_size)
+        result = None
+        try:
+            result = connection.execute(statement)
+
+            if fmt == 'csv':
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerow(names)
+                yield buffer.getvalue()
+
+            for partition in result.partitions():
+                if fmt == 'csv':
+                    buffer = io.StringIO()
+                    writer = csv.writer(buffer)
+                    writer.writerows(
+                        (row.event_id, row.event_type, row.user_id, row.product_id,
+                         row.timestamp.isoformat() if row.timestamp else '')
+                        for row in partition
+                    )
+                    yield buffer.getvalue()
+                else:
+                    yield b''.join(
+                        dumps({
+                            'event_id': row.event_id,
+                            'event_type': row.event_type,
+                            'user_id': row.user_id,
+                            'product_id': row.product_id,
+                            'timestamp': row.timestamp
+                        }, backend)
+                        for row in partition
+                    )
+        finally:
+            if result is not None:
+                result.close()
+            connection.close()
+
+    return generate()
 
-    # Create the grouping expression based on the group_by parameter
-    if group_by == 'day':
-        group_expr = func.date_trunc('day', Event.timestamp)
-    elif group_by == 'week':
-        group_expr = func.date_trunc('week', Event.timestamp)
-    else:  # month
-        group_expr = func.date_trunc('month', Event.timestamp)
+
+def _raw_stats(group_by, filters, start=None, end=None):
+    """(timestamp, event_type, count) rows aggregated from raw events"""
+    group_expr = func.date_trunc(group_by, Event.timestamp)
 
     # Group by timestamp and event type, count occurrences
-    stats = db.session.query(
+    query = db.session.query(
         group_expr.label('timestamp'),
         Event.event_type,
         func.count(Event.event_id).label('count')
-    ).group_by(
-        group_expr,
-        Event.event_type
-    ).order_by(
-        group_expr
-    ).all()
-
-    # Format the results
-    result = {
-        'timestamps': [],
-        'event_types': set(),
-        'data': {}
-    }
+    )
+    query = apply_filters(query, dict(filters, time_range=None))
+    if start is not None:
+        query = query.filter(Event.timestamp >= start)
+    if end is not None:
+        query = query.filter(Event.timestamp < end)
+    return query.group_by(group_expr, Event.event_type).all()
+
+
+def _rollup_stats(group_by, filters, start=None, end=None):
+    """
+    (timestamp, event_type, count) rows per group_by bucket for events in
+    [start, end), built from the hourly rollups for whole closed hours and
+    from raw events for the partial hours at either end of the range
+    """
+    current_hour = rollups.hour_bucket(datetime.utcnow())
+
+    # Whole hours in [first_hour, last_hour) come from the rollups
+    first_hour = None
+    if start is not None:
+        first_hour = rollups.hour_bucket(start)
+        if first_hour < start:
+            first_hour += timedelta(hours=1)
+    last_hour = current_hour if end is None else min(rollups.hour_bucket(end), current_hour)
+
+    if first_hour is not None and first_hour >= last_hour:
+        return _raw_stats(group_by, filters, start, end)
+
+    table = ProductEventRollup if filters.get('product_id') else EventRollup
+    rollup_expr = func.date_trunc(group_by, table.bucket)
+    query = db.session.query(
+        rollup_expr.label('timestamp'),
+        table.event_type,
+        func.sum(table.count).label('count')
+    ).filter(
+        table.bucket < last_hour
+    )
+    if first_hour is not None:
+        query = query.filter(table.bucket >= first_hour)
+    if filters.get('event_type') and filters['event_type'].lower() != 'all':
+        query = query.filter(table.event_type == filters['event_type'])
+    if filters.get('product_id'):
+        query = query.filter(table.product_id == filters['product_id'])
+
+    rows = list(query.group_by(rollup_expr, table.event_type).all())
+    if start is not None and start < first_hour:
+        rows.extend(_raw_stats(group_by, filters, start, first_hour))
+    if end is None or last_hour < end:
+        rows.extend(_raw_stats(group_by, filters, last_hour, end))
+    return rows
+
+
+def aggregate_stats(group_by, filters, start=None, end=None):
+    """
+    Event counts keyed by (bucket, event_type) for events in [start, end)
+    matching the filters (time_range is ignored in favour of start/end)
+    """
+    filters = filters or {}
+    if _can_use_rollups(filters):
+        stats = _rollup_stats(group_by, filters, start, end)
+    else:
+        stats = _raw_stats(group_by, filters, start, end)
 
+    counts = {}
     for stat in stats:
-        timestamp_str = stat.timestamp.isoformat()
-        if timestamp_str not in result['timestamps']:
-            result['timestamps'].append(timestamp_str)
-        result['event_types'].add(stat.event_type)
-        
-        if stat.event_type not in result['data']:
-            result['data'][stat.event_type] = {}
-        result['data'][stat.event_type][timestamp_str] = stat.count
-
-    # Convert event_types set to sorted list
-    result['event_types'] = sorted(list(result['event_types']))
-
-    return result 
\ No newline at end of file
+        key = (stat.timestamp, stat.event_type)
+        counts[key] = counts.get(key, 0) + int(stat.count)
+    return counts
+
+
+def _can_use_rollups(filters):
+    """Rollups have no user dimension, and product filters need the product rollups"""
+    if not rollups.ROLLUPS_ENABLED or filters.get('user_id'):
+        return False
+    return not filters.get('product_id') or rollups.PRODUCT_ROLLUPS_ENABLED
+
+
+def pivot_stats(stats):
+    """
+    Pivot (timestamp, event_type, count) rows into a dense columnar result:
+    one sorted timestamps array and one zero-filled count array per event
+    type, aligned with it.
+    """
+    # One pass to index the rows by bucket and event type
+    by_type = {}
+    buckets = set()
+    for stat in stats:
+        buckets.add(stat.timestamp)
+        by_type.setdefault(stat.event_type, {})[stat.timestamp] = int(stat.count)
+
+    timestamps = sorted(buckets)
+    event_types = sorted(by_type)
+    return {
+        'timestamps': [timestamp.isoformat() for timestamp in timestamps],
+        'event_types': event_types,
+        'data': {
+            event_type: [by_type[event_type].get(timestamp, 0) for timestamp in timestamps]
+            for event_type in event_types
+        }
+    }
+
+
+def get_event_stats(filters=None):
+    """
+    Get event statistics for visualization.
+
+    Accepts the EventFilterSchema filters (time_range, event_type, user_id,
+    product_id) plus group_by, all applied in SQL. Reads the hourly rollups
+    when they can answer the filters, raw events otherwise. With the stats
+    cache on, only the open bucket (and a partial first bucket) is queried
+    once the closed buckets are cached.
+    """
+    filters = dict(filters or {})
+
+    # Get group by parameter (default to day if not specified)
+    group_by = filters.get('group_by') or 'day'
+    if group_by not in ('day', 'week', 'month'):
+        group_by = 'month'
+
+    start = time_range_start(filters.get('time_range'))
+    if stats_cache.CACHE_ENABLED:
+        counts = stats_cache.get(
+            group_by, filters, start,
+            lambda range_start, range_end: aggregate_stats(group_by, filters, range_start, range_end)
+        )
+    else:
+        counts = aggregate_stats(group_by, filters, start=start)
+    stats = [StatRow(timestamp, event_type, count) for (timestamp, event_type), count in counts.items()]
+
+    return pivot_stats(stats)
+
+
+def get_unique_users(filters=None):
+    """
+    Distinct users for a product (or all products) over the time range.
+
+    Merges the hourly HyperLogLog sketches when they are enabled, so the
+    range is widened to whole hours; counts exactly with COUNT(DISTINCT)
+    otherwise.
+    """
+    filters = filters or {}
+    product_id = filters.get('product_id')
+    start = time_range_start(filters.get('time_range'))
+    result = {'product_id': product_id, 'time_range': filters.get('time_range')}
+
+    if analytics.SKETCHES_ENABLED:
+        sketch = merge_all(analytics.load_sketches(analytics.HLL, product_id or analytics.ALL_PRODUCTS, start))
+        result.update({
+            'unique_users': sketch.count() if sketch else 0,
+            'approximate': True,
+            'error_bounds': analytics.error_bounds()
+        })
+        return result
+
+    query = apply_filters(db.session.query(func.count(distinct(Event.user_id))), {
+        'time_range': filters.get('time_range'),
+        'product_id': product_id
+    })
+    result.update({'unique_users': query.scalar(), 'approximate': False})
+    return result
+
+
+def get_top_products(filters=None):
+    """
+    Most frequent products for an event type (READ by default, 'all' for
+    every type) over the time range.
+
+    Combines the hourly Count-Min top-K sketches when they are enabled;
+    counts exactly with GROUP BY ... ORDER BY count otherwise.
+    """
+    filters = filters or {}
+    event_type = filters.get('event_type') or 'READ'
+    limit = filters.get('limit') or 10
+    start = time_range_start(filters.get('time_range'))
+    result = {'event_type': event_type, 'time_range': filters.get('time_range')}
+
+    if analytics.SKETCHES_ENABLED:
+        limit = min(limit, analytics.TOP_CAPACITY)
+        event_types = EVENT_TYPES if event_type.lower() == 'all' else (event_type,)
+        sketches = []
+        for key in event_types:
+            sketches.extend(analytics.load_sketches(analytics.TOPK, key, start))
+        ranked = TopK.combine(sketches, limit)
+        result.update({
+            'products': [{'product_id': product_id, 'count': count} for product_id, count in ranked],
+            'total_events': sum(sketch.sketch.total for sketch in sketches),
+            'approximate': True,
+            'error_bounds': analytics.error_bounds()
+        })
+        return result
+
+    count = func.count(Event.event_id).label('count')
+    query = apply_filters(db.session.query(Event.product_id, count), {
+        'time_range': filters.get('time_range'),
+        'event_type': event_type
+    })
+    rows = query.group_by(Event.product_id).order_by(desc(count), Event.product_id).limit(limit).all()
+    result.update({
+        'products': [{'product_id': row.product_id, 'count': row.count} for row in rows],
+        'approximate': False
+    })
+    return result
+
+
+def ingest_events(records, method='copy'):
+    """
+    Validate and bulk load event records into identifier_events.
+
+    All records are validated with a single schema pass. Valid rows are
+    loaded with COPY FROM STDIN (or a multi-row INSERT) in chunks of
+    INGEST_CHUNK_SIZE rows, all in one transaction: a failure leaves none
+    of the batch written.
+    """
+    schema = EventCreateSchema(many=True, unknown=EXCLUDE)
+    errors = {}
+    try:
+        rows = schema.load(records)
+    except ValidationError as e:
+        errors = e.messages
+        rows = [row for index, row in enumerate(e.valid_data) if index not in errors]
+
+    now = datetime.utcnow()
+    for row in rows:
+        if not row.get('timestamp'):
+            row['timestamp'] = now
+        elif row['timestamp'].tzinfo is not None:
+            # The column is a naive UTC timestamp
+            row['timestamp'] = row['timestamp'].astimezone(timezone.utc).replace(tzinfo=None)
+
+    chunks = [rows[start:start + INGEST_CHUNK_SIZE] for start in range(0, len(rows), INGEST_CHUNK_SIZE)]
+    with db.engine.begin() as connection:
+        for chunk in chunks:
+            insert_events(connection, chunk, method)
+    for chunk in chunks:
+        notify_events_committed(chunk)
+
+    return {
+        'accepted': len(rows),
+        'rejected': len(errors),
+        'errors': {index: errors[index] for index in sorted(errors)[:MAX_REPORTED_ERRORS]}
+    }
@@ -1,9 +1,13 @@
 from marshmallow import Schema, fields, validate
 from datetime import datetime, timedelta
 
+# Largest page of events one list request returns
+MAX_PAGE_SIZE = 1000
+
 class EventFilterSchema(Schema):
+    # 'all' is the same as no event type filter
     event_type = fields.String(required=False, allow_none=True, validate=validate.OneOf([
-        'CREATE', 'READ', 'UPDATE', 'DELETE'
+        'all', 'CREATE', 'READ', 'UPDATE', 'DELETE'
     ]))
     user_id = fields.String(required=False, allow_none=True)
     time_range = fields.String(required=False, allow_none=True, validate=validate.OneOf(['day', 'week', 'month']))
@@ -11,3 +15,15 @@ class EventFilterSchema(Schema):
     # end_date = fields.DateTime(required=False, allow_none=True)
     product_id = fields.String(required=False, allow_none=True)
     group_by = fields.String(required=False, allow_none=True, validate=validate.OneOf(['day', 'week', 'month']))
+    # Keyset pagination
+    limit = fields.Integer(required=False, allow_none=True, validate=validate.Range(min=1, max=MAX_PAGE_SIZE))
+    cursor = fields.String(required=False, allow_none=True)
+    include_total = fields.String(required=False, allow_none=True, validate=validate.OneOf(['exact', 'estimate']))
+
+class EventCreateSchema(Schema):
+    event_type = fields.String(required=True, validate=validate.OneOf([
+        'CREATE', 'READ', 'UPDATE', 'DELETE'
+    ]))
+    user_id = fields.String(required=True, validate=validate.Length(min=1, max=100))
+    product_id = fields.String(required=True, validate=validate.Length(min=1, max=100))
+    timestamp = fields.DateTime(required=False, allow_none=True)
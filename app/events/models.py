@@ -1,23 +1,46 @@
 from datetime import datetime
-from sqlalchemy import Enum, Index
+from sqlalchemy import DDL, Enum, Index, PrimaryKeyConstraint, event
 from app.extensions import db
 
 
 class Event(db.Model):
     __tablename__ = 'identifier_events'
 
-    event_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    event_id = db.Column(db.Integer, autoincrement=True)
     event_type = db.Column(db.String(20), nullable=False)
     user_id = db.Column(db.String(100), nullable=False)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)  # SUCCESS, FAILURE, WARNING
+    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # SUCCESS, FAILURE, WARNING
     product_id = db.Column(db.String(100), nullable=False)
     # Add composite indexes for better query performance
     __table_args__ = (
+        # Range partitioned by month on timestamp (app/events/partitions.py);
+        # the partition key has to be part of the primary key
+        PrimaryKeyConstraint(event_id, timestamp, name='identifier_events_pkey'),
         Index('idx_events_user_timestamp', user_id, timestamp),
         Index('idx_events_type_timestamp', event_type, timestamp),
+        # Keyset pagination order when no user/type filter applies
+        Index('idx_events_timestamp_id', timestamp, event_id),
         # Index('idx_events_entity_timestamp', entity_type, entity_id, timestamp),
+        {'postgresql_partition_by': 'RANGE (timestamp)'},
     )
 
+    # Response fields, in the order of Event.columns()
+    FIELDS = ('event_id', 'event_type', 'user_id', 'product_id', 'timestamp')
+
+    @classmethod
+    def columns(cls):
+        return [getattr(cls, field) for field in cls.FIELDS]
+
+    @classmethod
+    def dump_rows(cls, rows):
+        """
+        Response dicts for rows selected with Event.columns(), without
+        building ORM objects; timestamps stay datetimes and are encoded by
+        the JSON representation
+        """
+        fields = cls.FIELDS
+        return [dict(zip(fields, row)) for row in rows]
+
     def to_dict(self):
         return {
             'event_id': self.event_id,
@@ -25,4 +48,45 @@ class Event(db.Model):
             'user_id': self.user_id,    
             'product_id': self.product_id,
             'timestamp': self.timestamp.isoformat(),
-        } 
\ No newline at end of file
+        } 
+
+# A partitioned table without partitions rejects every insert; monthly
+# partitions are added by partition maintenance
+event.listen(Event.__table__, 'after_create', DDL(
+    'CREATE TABLE IF NOT EXISTS identifier_events_default PARTITION OF identifier_events DEFAULT'
+).execute_if(dialect='postgresql'))
+
+class EventRollup(db.Model):
+    """Hourly event counts per event type, maintained as events are written"""
+    __tablename__ = 'identifier_event_rollups_hourly'
+
+    bucket = db.Column(db.DateTime, primary_key=True)
+    event_type = db.Column(db.String(20), primary_key=True)
+    count = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+class ProductEventRollup(db.Model):
+    """Hourly event counts per event type and product"""
+    __tablename__ = 'identifier_event_product_rollups_hourly'
+
+    bucket = db.Column(db.DateTime, primary_key=True)
+    event_type = db.Column(db.String(20), primary_key=True)
+    product_id = db.Column(db.String(100), primary_key=True)
+    count = db.Column(db.BigInteger, nullable=False, default=0)
+    __table_args__ = (
+        Index('idx_product_rollups_product_bucket', product_id, bucket),
+    )
+
+
+class EventSketch(db.Model):
+    """
+    Serialized per-hour sketches: HyperLogLog of user_ids per product
+    (kind 'hll', key product_id, '' for all products) and Count-Min top-K
+    of product_ids per event type (kind 'topk', key event_type)
+    """
+    __tablename__ = 'identifier_event_sketches_hourly'
+
+    kind = db.Column(db.String(10), primary_key=True)
+    key = db.Column(db.String(100), primary_key=True)
+    bucket = db.Column(db.DateTime, primary_key=True)
+    data = db.Column(db.LargeBinary, nullable=False)
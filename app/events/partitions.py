@@ -0,0 +1,283 @@
+import logging
+import os
+import threading
+from datetime import date, datetime
+from typing import Dict, List, Optional
+from sqlalchemy import text
+from app.events.models import Event
+
+logger = logging.getLogger(__name__)
+
+TABLE = Event.__tablename__
+# Staging name used while migrating a plain table to a partitioned one
+NEW_TABLE = f'{TABLE}_partitioned'
+LEGACY_TABLE = f'{TABLE}_legacy'
+SEQUENCE = f'{TABLE}_event_id_seq'
+
+# Indexes created on the partitioned table (propagated to every partition)
+INDEXES = {
+    'idx_events_user_timestamp': '(user_id, timestamp)',
+    'idx_events_type_timestamp': '(event_type, timestamp)',
+    'idx_events_timestamp_id': '(timestamp, event_id)',
+}
+
+PARTITIONING_ENABLED = os.getenv('EVENT_PARTITIONING_ENABLED', 'false').lower() == 'true'
+MONTHS_AHEAD = int(os.getenv('EVENT_PARTITION_MONTHS_AHEAD', 3))
+# Whole months of events to keep; 0 keeps everything
+RETENTION_MONTHS = int(os.getenv('EVENT_RETENTION_MONTHS', 0))
+MAINTENANCE_INTERVAL = int(os.getenv('EVENT_PARTITION_MAINTENANCE_INTERVAL', 3600))
+
+# Advisory lock key so only one worker runs maintenance at a time
+MAINTENANCE_LOCK_KEY = 0x5E7E
+
+
+def month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(value: date, months: int) -> date:
+    month = value.month - 1 + months
+    return date(value.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f'{table}_{month.year:04d}_{month.month:02d}'
+
+
+def default_partition_name(table: str) -> str:
+    return f'{table}_default'
+
+
+def is_partitioned(connection, table: str = TABLE) -> bool:
+    return bool(connection.execute(text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = :table"
+    ), {'table': table}).scalar())
+
+
+def list_partitions(connection, table: str = TABLE) -> List[str]:
+    return list(connection.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = :table ORDER BY child.relname"
+    ), {'table': table}).scalars())
+
+
+def create_partitioned_table(connection, table: str = NEW_TABLE, index_suffix: str = ''):
+    """Create an empty month-partitioned copy of identifier_events"""
+    connection.execute(text(f'CREATE SEQUENCE IF NOT EXISTS {SEQUENCE}'))
+    # The partition key has to be part of the primary key
+    connection.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            event_id INTEGER NOT NULL DEFAULT nextval('{SEQUENCE}'),
+            event_type VARCHAR(20) NOT NULL,
+            user_id VARCHAR(100) NOT NULL,
+            timestamp TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+            product_id VARCHAR(100) NOT NULL,
+            CONSTRAINT {table}_pkey PRIMARY KEY (event_id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+    """))
+    for name, columns in INDEXES.items():
+        connection.execute(text(f'CREATE INDEX IF NOT EXISTS {name}{index_suffix} ON {table} {columns}'))
+
+
+def create_month_partition(connection, table: str, month: date):
+    """
+    Create one monthly partition, moving rows the DEFAULT partition already
+    holds for that month into it (Postgres refuses the new partition otherwise)
+    """
+    name = partition_name(table, month)
+    bounds = f"FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    default = default_partition_name(table)
+    params = {'low': month, 'high': add_months(month, 1)}
+
+    has_default = default in list_partitions(connection, table)
+    if not has_default or not connection.execute(text(
+        f'SELECT 1 FROM {default} WHERE timestamp >= :low AND timestamp < :high LIMIT 1'
+    ), params).scalar():
+        connection.execute(text(f'CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} FOR VALUES {bounds}'))
+        return
+
+    connection.execute(text(f'ALTER TABLE {table} DETACH PARTITION {default}'))
+    connection.execute(text(f'CREATE TABLE {name} PARTITION OF {table} FOR VALUES {bounds}'))
+    connection.execute(text(
+        f'INSERT INTO {name} SELECT * FROM {default} WHERE timestamp >= :low AND timestamp < :high'
+    ), params)
+    connection.execute(text(f'DELETE FROM {default} WHERE timestamp >= :low AND timestamp < :high'), params)
+    connection.execute(text(f'ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT'))
+
+
+def ensure_partitions(connection, start: Optional[date] = None, months_ahead: int = MONTHS_AHEAD,
+                      table: str = TABLE) -> List[str]:
+    """
+    Create the DEFAULT partition and any missing monthly partitions from
+    `start` (default: this month) to months_ahead
+    """
+    first = month_start(start or datetime.utcnow())
+    last = add_months(month_start(datetime.utcnow()), months_ahead)
+    created = []
+    existing = set(list_partitions(connection, table))
+
+    # Catches events outside every monthly partition (back/forward-dated or
+    # in months removed by retention) instead of failing their whole batch
+    default = default_partition_name(table)
+    if default not in existing:
+        connection.execute(text(f'CREATE TABLE IF NOT EXISTS {default} PARTITION OF {table} DEFAULT'))
+        created.append(default)
+
+    month = first
+    while month <= last:
+        name = partition_name(table, month)
+        if name not in existing:
+            create_month_partition(connection, table, month)
+            created.append(name)
+        month = add_months(month, 1)
+    return created
+
+
+def drop_expired_partitions(connection, retain_months: int = RETENTION_MONTHS, table: str = TABLE) -> List[str]:
+    """Detach and drop monthly partitions older than the retention window"""
+    if retain_months <= 0:
+        return []
+
+    cutoff = add_months(month_start(datetime.utcnow()), -retain_months)
+    dropped = []
+    for name in list_partitions(connection, table):
+        try:
+            year, month = name[len(table) + 1:].split('_')
+            partition_month = date(int(year), int(month), 1)
+        except ValueError:
+            continue
+        if partition_month < cutoff:
+            connection.execute(text(f'ALTER TABLE {table} DETACH PARTITION {name}'))
+            connection.execute(text(f'DROP TABLE {name}'))
+            dropped.append(name)
+
+    # Old events that landed in the DEFAULT partition expire as well
+    default = default_partition_name(table)
+    if default in list_partitions(connection, table):
+        connection.execute(text(f'DELETE FROM {default} WHERE timestamp < :cutoff'), {'cutoff': cutoff})
+    return dropped
+
+
+def run_maintenance(engine) -> Dict:
+    """Create upcoming partitions and apply retention, once across all workers"""
+    with engine.begin() as connection:
+        if not connection.execute(text('SELECT pg_try_advisory_xact_lock(:key)'),
+                                  {'key': MAINTENANCE_LOCK_KEY}).scalar():
+            return {'skipped': True}
+        if not is_partitioned(connection):
+            return {'skipped': True, 'reason': f'{TABLE} is not partitioned'}
+        return {
+            'created': ensure_partitions(connection),
+            'dropped': drop_expired_partitions(connection)
+        }
+
+
+def start_maintenance(engine, interval: int = MAINTENANCE_INTERVAL) -> Optional[threading.Thread]:
+    """Run partition maintenance now and then every `interval` seconds in the background"""
+    if not PARTITIONING_ENABLED:
+        return None
+
+    stop = threading.Event()
+
+    def loop():
+        while True:
+            try:
+                result = run_maintenance(engine)
+                if result.get('created') or result.get('dropped'):
+                    logger.info(f"Event partition maintenance: {result}")
+            except Exception as e:
+                logger.error(f"Event partition maintenance failed: {str(e)}")
+            if stop.wait(interval):
+                return
+
+    thread = threading.Thread(target=loop, name='event-partitions', daemon=True)
+    thread.stop = stop
+    thread.start()
+    return thread
+
+
+def migrate_to_partitioned(engine, batch_size: int = 50000, echo=print) -> Dict:
+    """
+    Move identifier_events to a month-partitioned table online.
+
+    Rows are copied into a staging partitioned table in event_id batches
+    (one short transaction each) while the application keeps writing. The
+    final step locks the old table, copies the rows written meanwhile and
+    swaps the table names. The old table is kept as identifier_events_legacy.
+
+    Legacy rows without a timestamp (the old column is nullable, the
+    partition key is not) are copied with the oldest timestamp in the table.
+    """
+    with engine.begin() as connection:
+        if is_partitioned(connection):
+            return {'migrated': 0, 'status': 'already partitioned'}
+        # SHARE mode waits for in-flight inserts, so every id up to the
+        # high-water mark is committed before the batches copy it
+        connection.execute(text(f'LOCK TABLE {TABLE} IN SHARE MODE'))
+        bounds = connection.execute(text(
+            f'SELECT min(timestamp), max(event_id) FROM {TABLE}'
+        )).one()
+        create_partitioned_table(connection, NEW_TABLE, index_suffix='_p')
+        ensure_partitions(connection, start=bounds[0], table=NEW_TABLE)
+
+    copied = 0
+    last_id = 0
+    high_water = bounds[1] or 0
+    columns = 'event_id, event_type, user_id, timestamp, product_id'
+    source_columns = 'event_id, event_type, user_id, COALESCE(timestamp, :fallback), product_id'
+    fallback = bounds[0] or datetime.utcnow()
+
+    while last_id < high_water:
+        upper = last_id + batch_size
+        with engine.begin() as connection:
+            result = connection.execute(text(
+                f'INSERT INTO {NEW_TABLE} ({columns}) '
+                f'SELECT {source_columns} FROM {TABLE} WHERE event_id > :low AND event_id <= :high '
+                f'ON CONFLICT DO NOTHING'
+            ), {'low': last_id, 'high': upper, 'fallback': fallback})
+            copied += result.rowcount
+        last_id = upper
+        echo(f'Copied events up to id {min(last_id, high_water)} of {high_water}')
+
+    with engine.begin() as connection:
+        connection.execute(text(f'LOCK TABLE {TABLE} IN EXCLUSIVE MODE'))
+        # Rows written since the batches started (possibly in months with no partition yet)
+        start = connection.execute(text(
+            f'SELECT min(timestamp) FROM {TABLE} WHERE event_id > :low'
+        ), {'low': high_water}).scalar()
+        if start is not None:
+            ensure_partitions(connection, start=start, table=NEW_TABLE)
+        result = connection.execute(text(
+            f'INSERT INTO {NEW_TABLE} ({columns}) '
+            f'SELECT {source_columns} FROM {TABLE} WHERE event_id > :low ON CONFLICT DO NOTHING'
+        ), {'low': high_water, 'fallback': fallback})
+        copied += result.rowcount
+
+        connection.execute(text(f'ALTER TABLE {TABLE} RENAME TO {LEGACY_TABLE}'))
+        for name in INDEXES:
+            connection.execute(text(f'ALTER INDEX IF EXISTS {name} RENAME TO {name}_legacy'))
+        # Free the primary key name for the new table, as Event declares it
+        legacy_pkey = connection.execute(text(
+            "SELECT conname FROM pg_constraint WHERE conrelid = CAST(:table AS regclass) AND contype = 'p'"
+        ), {'table': LEGACY_TABLE}).scalar()
+        if legacy_pkey:
+            connection.execute(text(f'ALTER TABLE {LEGACY_TABLE} RENAME CONSTRAINT {legacy_pkey} TO {LEGACY_TABLE}_pkey'))
+        connection.execute(text(f'ALTER TABLE {NEW_TABLE} RENAME TO {TABLE}'))
+        connection.execute(text(f'ALTER TABLE {TABLE} RENAME CONSTRAINT {NEW_TABLE}_pkey TO {TABLE}_pkey'))
+        for name in INDEXES:
+            connection.execute(text(f'ALTER INDEX {name}_p RENAME TO {name}'))
+        connection.execute(text(f'ALTER SEQUENCE {SEQUENCE} OWNED BY {TABLE}.event_id'))
+        connection.execute(text(f"ALTER TABLE {TABLE} ALTER COLUMN event_id SET DEFAULT nextval('{SEQUENCE}')"))
+
+        # Partitions were created under the staging name; rename them and
+        # their primary key indexes to match
+        for name in list_partitions(connection, TABLE):
+            if name.startswith(NEW_TABLE):
+                renamed = f'{TABLE}{name[len(NEW_TABLE):]}'
+                connection.execute(text(f'ALTER TABLE {name} RENAME TO {renamed}'))
+                connection.execute(text(f'ALTER INDEX IF EXISTS {name}_pkey RENAME TO {renamed}_pkey'))
+
+    return {'migrated': copied, 'status': 'partitioned', 'legacy_table': LEGACY_TABLE}
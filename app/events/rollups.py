@@ -0,0 +1,94 @@
+import os
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import func, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.events.models import Event, EventRollup, ProductEventRollup
+from app.extensions import db
+
+# Rollups are maintained on every event write once enabled; run
+# `flask rebuild-event-rollups` after enabling to fill in history
+ROLLUPS_ENABLED = os.getenv('EVENT_ROLLUPS_ENABLED', 'false').lower() == 'true'
+# Also keep per-product hourly counts
+PRODUCT_ROLLUPS_ENABLED = os.getenv('EVENT_PRODUCT_ROLLUPS_ENABLED', 'false').lower() == 'true'
+
+
+def hour_bucket(timestamp: datetime) -> datetime:
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def _upsert(executor, table, counts: Counter, keys: List[str]):
+    # Sorted keys give concurrent writers the same lock order
+    values = [dict(zip(keys, key), count=count) for key, count in sorted(counts.items())]
+    statement = pg_insert(table).values(values)
+    statement = statement.on_conflict_do_update(
+        index_elements=keys,
+        set_={'count': table.c.count + statement.excluded.count}
+    )
+    executor.execute(statement)
+
+
+def update_rollups(executor, rows: Iterable[Dict]):
+    """
+    Add a batch of event rows to the hourly rollups.
+
+    `executor` is the session or connection that inserts the events, so the
+    rollups commit (or roll back) together with them.
+    """
+    if not ROLLUPS_ENABLED:
+        return
+
+    counts = Counter()
+    product_counts = Counter()
+    now = datetime.utcnow()
+    for row in rows:
+        bucket = hour_bucket(row.get('timestamp') or now)
+        counts[(bucket, row['event_type'])] += 1
+        if PRODUCT_ROLLUPS_ENABLED:
+            product_counts[(bucket, row['event_type'], row['product_id'])] += 1
+
+    if counts:
+        _upsert(executor, EventRollup.__table__, counts, ['bucket', 'event_type'])
+    if product_counts:
+        _upsert(executor, ProductEventRollup.__table__, product_counts, ['bucket', 'event_type', 'product_id'])
+
+
+def rebuild_rollups(since: Optional[datetime] = None) -> Dict:
+    """
+    Recompute the rollups from raw events (all history, or hours from `since`).
+
+    The rollup tables are locked for the rebuild, so concurrent event writes
+    wait and then add their counts on top of the rebuilt values.
+    """
+    tables = [EventRollup.__table__]
+    if PRODUCT_ROLLUPS_ENABLED:
+        tables.append(ProductEventRollup.__table__)
+
+    result = {}
+    with db.engine.begin() as connection:
+        for table in tables:
+            table.create(bind=connection, checkfirst=True)
+
+        for table in tables:
+            connection.execute(text(f'LOCK TABLE {table.name} IN EXCLUSIVE MODE'))
+
+            delete = table.delete()
+            if since is not None:
+                delete = delete.where(table.c.bucket >= hour_bucket(since))
+            connection.execute(delete)
+
+            bucket = func.date_trunc('hour', Event.timestamp)
+            columns = [bucket, Event.event_type]
+            if table is ProductEventRollup.__table__:
+                columns.append(Event.product_id)
+            select = db.select(*columns, func.count()).group_by(*columns)
+            if since is not None:
+                select = select.where(Event.timestamp >= hour_bucket(since))
+
+            inserted = connection.execute(
+                table.insert().from_select([c.name for c in table.c], select)
+            )
+            result[table.name] = inserted.rowcount
+
+    return result
@@ -1,13 +1,22 @@
-import traceback
-from flask import request, jsonify
+import json
+import logging
+from flask import current_app, request, jsonify, Response, stream_with_context
 from marshmallow import ValidationError
 from flask_restx import Namespace, Resource
-from app.events.controller import get_all_events,get_event_stats
+from app.events.controller import get_all_events,get_event_stats, ingest_events, export_events, \
+    get_unique_users, get_top_products
 from app.events.input_validation import EventFilterSchema
 from app.utils.event_logger import log_event
+from app.utils.event_sink import get_event_sink
+from app.events import stats_cache
+
+logger = logging.getLogger(__name__)
 
 api = Namespace('events', description='Event logging related endpoints')
 
+# Upper bound on events accepted by one batch request
+MAX_BATCH_EVENTS = 100000
+
 @api.route('/')
 class EventList(Resource):
     def post(self):
@@ -16,7 +25,7 @@ class EventList(Resource):
             data = request.json
             
             # Check if this is a filter request (frontend sends filters in POST body)
-            if data and ('event_type' in data or 'user_id' in data or 'time_range' in data):
+            if data and any(key in data for key in ('event_type', 'user_id', 'time_range', 'limit', 'cursor')):
                 # This is a filter request
                 filters = data
                 
@@ -49,12 +58,111 @@ class EventList(Resource):
             )
 
             if event:
-                return event.to_dict(), 201
+                # Queued events are written later and have no event_id yet
+                return event.to_dict(), 202 if get_event_sink() is not None else 201
             return {'error': 'Failed to create event'}, 500
         except ValidationError as e:
             return {'error': e.messages}, 400
         except Exception as e:
-            print(traceback.format_exc())
+            logger.exception('Request failed: %s %s', request.method, request.path)
+            return {'error': str(e)}, 500
+
+@api.route('/batch')
+class EventBatch(Resource):
+    def post(self):
+        """Bulk load events from a JSON array or NDJSON stream"""
+        try:
+            if request.mimetype in ('application/x-ndjson', 'application/ndjson'):
+                records = [json.loads(line) for line in request.stream if line.strip()]
+            else:
+                records = request.get_json(silent=True)
+                if not isinstance(records, list):
+                    return {'error': 'Body must be a JSON array or NDJSON'}, 400
+
+            if not records:
+                return {'error': 'No events provided'}, 400
+            if len(records) > MAX_BATCH_EVENTS:
+                return {'error': f'At most {MAX_BATCH_EVENTS} events per batch'}, 400
+
+            result = ingest_events(records)
+            return result, 201 if result['accepted'] else 400
+        except ValueError as e:
+            return {'error': f'Invalid JSON: {str(e)}'}, 400
+        except Exception as e:
+            logger.exception('Request failed: %s %s', request.method, request.path)
+            return {'error': str(e)}, 500
+
+EXPORT_MIMETYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+
+@api.route('/export')
+class EventExport(Resource):
+    def get(self):
+        """Stream filtered events as NDJSON or CSV"""
+        try:
+            fmt = request.args.get('format', 'ndjson')
+            if fmt not in EXPORT_MIMETYPES:
+                return {'error': 'format must be ndjson or csv'}, 400
+
+            filters = {key: value for key, value in request.args.items() if key != 'format'}
+            schema = EventFilterSchema(only=('event_type', 'user_id', 'time_range', 'product_id'))
+            validated_filters = schema.load(filters)
+
+            rows = export_events(validated_filters, fmt, backend=current_app.config.get('JSON_BACKEND', 'auto'))
+            return Response(
+                stream_with_context(rows),
+                mimetype=EXPORT_MIMETYPES[fmt],
+                headers={'Content-Disposition': f'attachment; filename=events.{fmt}'}
+            )
+        except ValidationError as e:
+            return {'error': e.messages}, 400
+        except Exception as e:
+            logger.exception('Request failed: %s %s', request.method, request.path)
+            return {'error': str(e)}, 500
+
+@api.route('/sink/stats')
+class EventSinkStats(Resource):
+    def get(self):
+        """Get background event writer queue depth, flush latency and throughput"""
+        sink = get_event_sink()
+        if sink is None:
+            return {'enabled': False}, 200
+        return dict(sink.stats(), enabled=True), 200
+
+@api.route('/stats/cache')
+class EventStatsCache(Resource):
+    def get(self):
+        """Get stats cache hit rate and recompute time"""
+        return stats_cache.stats(), 200
+
+@api.route('/stats/unique')
+class EventUniqueUsers(Resource):
+    def get(self):
+        """Get (approximate) distinct users for a product or all products"""
+        try:
+            schema = EventFilterSchema(only=('time_range', 'product_id'))
+            validated_filters = schema.load(request.args.to_dict())
+            return get_unique_users(validated_filters), 200
+        except ValidationError as e:
+            return {'error': e.messages}, 400
+        except Exception as e:
+            logger.exception('Request failed: %s %s', request.method, request.path)
+            return {'error': str(e)}, 500
+
+@api.route('/stats/top')
+class EventTopProducts(Resource):
+    def get(self):
+        """Get the (approximate) most frequent products for an event type"""
+        try:
+            schema = EventFilterSchema(only=('time_range', 'event_type', 'limit'))
+            validated_filters = schema.load(request.args.to_dict())
+            return get_top_products(validated_filters), 200
+        except ValidationError as e:
+            return {'error': e.messages}, 400
+        except Exception as e:
+            logger.exception('Request failed: %s %s', request.method, request.path)
             return {'error': str(e)}, 500
 
 @api.route('/stats')
@@ -63,17 +171,10 @@ class EventStats(Resource):
         """Get event statistics for visualization"""
         try:
             # Get filter parameters from query string
-            filters = {}
-            
-            if request.args.get('group_by'):
-                filters['group_by'] = request.args.get('group_by')
-            
-            # Validate filters if any are provided
-            if filters:
-                schema = EventFilterSchema()
-                validated_filters = schema.load(filters)
-            else:
-                validated_filters = None
+            schema = EventFilterSchema(only=(
+                'event_type', 'user_id', 'time_range', 'product_id', 'group_by'
+            ))
+            validated_filters = schema.load(request.args.to_dict())
             
             # Get event statistics
             stats = get_event_stats(validated_filters)
@@ -81,6 +182,6 @@ class EventStats(Resource):
         except ValidationError as e:
             return {'error': e.messages}, 400
         except Exception as e:
-            print(traceback.format_exc())
+            logger.exception('Request failed: %s %s', request.method, request.path)
             return {'error': str(e)}, 500
 
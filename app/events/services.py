@@ -1,10 +1,70 @@
-# from app.events.models import Event
-
-# def log_event(event_type: str, entity_type: str, entity_id: str) -> None:
-#     """Log an event to the database"""
-#     event = Event(
-#         event_type=event_type,
-#         entity_type=entity_type,
-#         entity_id=entity_id
-#     )
-#     event.save() 
\ No newline at end of file
+import csv
+import io
+import logging
+from typing import Dict, List
+from app.events.models import Event
+from app.events.rollups import update_rollups
+
+logger = logging.getLogger(__name__)
+
+# Columns written by bulk event loads, in COPY order
+EVENT_COLUMNS = ('event_type', 'user_id', 'product_id', 'timestamp')
+
+# Callbacks run with the rows of every committed event write
+_commit_listeners = []
+
+
+def on_events_committed(listener):
+    """Register `listener(rows)` to run after event rows are committed"""
+    _commit_listeners.append(listener)
+
+
+def notify_events_committed(rows: List[Dict]):
+    """Run the commit listeners; failures are logged, never raised to the writer"""
+    for listener in _commit_listeners:
+        try:
+            listener(rows)
+        except Exception as e:
+            logger.error(f"Event commit listener failed: {str(e)}")
+
+
+def copy_events(connection, rows: List[Dict]):
+    """Load event rows with COPY FROM STDIN on a SQLAlchemy connection (psycopg2 only)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([
+            row['timestamp'].isoformat() if column == 'timestamp' else row[column]
+            for column in EVENT_COLUMNS
+        ])
+    buffer.seek(0)
+
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {Event.__tablename__} ({', '.join(EVENT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+    finally:
+        cursor.close()
+
+
+def insert_events(connection, rows: List[Dict], method: str = 'insert'):
+    """
+    Write event rows in one statement and add them to the hourly rollups.
+
+    `method` is 'copy' for COPY FROM STDIN or 'insert' for a multi-row
+    INSERT; COPY falls back to INSERT on drivers without copy_expert.
+    """
+    if not rows:
+        return
+    copied = False
+    if method == 'copy':
+        try:
+            copy_events(connection, rows)
+            copied = True
+        except AttributeError:
+            pass
+    if not copied:
+        connection.execute(Event.__table__.insert(), rows)
+    update_rollups(connection, rows)
@@ -0,0 +1,265 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, Optional, Tuple
+from app.events.services import on_events_committed
+
+# Stats results cache. Closed buckets are kept until an event lands in them;
+# the open (current) bucket is always recomputed.
+CACHE_ENABLED = os.getenv('STATS_CACHE_ENABLED', 'true').lower() == 'true'
+MAX_ENTRIES = int(os.getenv('STATS_CACHE_MAX_ENTRIES', 256))
+# Rebuild entries older than this many seconds (0 = never). Invalidation only
+# sees events committed by this process, so this bounds how long back-dated
+# events written by other workers stay unseen
+MAX_AGE = int(os.getenv('STATS_CACHE_MAX_AGE', 300))
+
+# Filters that are part of an entry's identity (time_range is not: entries
+# hold every closed bucket they have seen and requests take the slice they need)
+KEY_FILTERS = ('event_type', 'user_id', 'product_id')
+
+Counts = Dict[Tuple[datetime, str], int]
+
+_lock = threading.Lock()
+_entries = OrderedDict()
+_key_locks = {}
+_inflight = {}
+# Bumped by every invalidation touching a closed bucket; a fill or patch that
+# saw it change is not kept, since the invalidation could not mark it
+_generation = 0
+_stats = {
+    'requests': 0,
+    'hits': 0,
+    'misses': 0,
+    'shared': 0,
+    'invalidations': 0,
+    'closed_recomputes': 0,
+    'recompute_seconds_total': 0.0,
+    'recompute_seconds_max': 0.0,
+    'open_seconds_total': 0.0,
+}
+
+
+def bucket_start(timestamp: datetime, group_by: str) -> datetime:
+    """Python equivalent of date_trunc(group_by, timestamp)"""
+    day = timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    if group_by == 'day':
+        return day
+    if group_by == 'week':
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def next_bucket(bucket: datetime, group_by: str) -> datetime:
+    if group_by == 'day':
+        return bucket + timedelta(days=1)
+    if group_by == 'week':
+        return bucket + timedelta(weeks=1)
+    return (bucket.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _key_filters(filters: Dict) -> Dict:
+    key_filters = {name: filters.get(name) for name in KEY_FILTERS if filters.get(name)}
+    if str(key_filters.get('event_type', '')).lower() == 'all':
+        key_filters.pop('event_type')
+    return key_filters
+
+
+def _matches(entry: Dict, row: Dict) -> bool:
+    return all(row.get(name) == value for name, value in entry['filters'].items())
+
+
+def _timed(compute: Callable, stat: str, *args) -> Counts:
+    started = time.perf_counter()
+    result = compute(*args)
+    elapsed = time.perf_counter() - started
+    with _lock:
+        _stats[stat] += elapsed
+        if stat == 'recompute_seconds_total':
+            _stats['recompute_seconds_max'] = max(_stats['recompute_seconds_max'], elapsed)
+    return result
+
+
+def _closed_counts(key, group_by: str, key_filters: Dict, need_from: Optional[datetime],
+                   closed_until: datetime, compute: Callable) -> Counts:
+    """Counts for closed buckets in [need_from, closed_until), filling the entry as needed"""
+    with _lock:
+        key_lock = _key_locks.setdefault(key, threading.Lock())
+
+    with key_lock:
+        with _lock:
+            generation = _generation
+            entry = _entries.get(key)
+            if entry is not None and MAX_AGE and time.monotonic() - entry['created'] > MAX_AGE:
+                entry = None
+            if entry is not None:
+                _entries.move_to_end(key)
+                dirty, entry['dirty'] = entry['dirty'], set()
+
+        def recompute(start, end):
+            return _timed(compute, 'recompute_seconds_total', start, end)
+
+        if entry is None:
+            entry = {
+                'filters': key_filters,
+                'group_by': group_by,
+                'from': need_from,
+                'until': closed_until,
+                'counts': recompute(need_from, closed_until),
+                'dirty': set(),
+                'created': time.monotonic()
+            }
+            with _lock:
+                _stats['misses'] += 1
+                if _generation == generation:
+                    _entries[key] = entry
+                while len(_entries) > MAX_ENTRIES:
+                    old_key, _ = _entries.popitem(last=False)
+                    _key_locks.pop(old_key, None)
+        else:
+            patched = False
+            # Buckets that closed since the entry was filled
+            if entry['until'] < closed_until:
+                entry['counts'].update(recompute(entry['until'], closed_until))
+                entry['until'] = closed_until
+                patched = True
+            # Older history than the entry has seen so far
+            if entry['from'] is not None and (need_from is None or need_from < entry['from']):
+                entry['counts'].update(recompute(need_from, entry['from']))
+                entry['from'] = need_from
+                patched = True
+            # Closed buckets that received events since they were computed
+            for bucket in dirty:
+                for count_key in [k for k in entry['counts'] if k[0] == bucket]:
+                    del entry['counts'][count_key]
+                entry['counts'].update(recompute(bucket, next_bucket(bucket, group_by)))
+                patched = True
+            with _lock:
+                _stats['closed_recomputes' if patched else 'hits'] += 1
+                # An invalidation during the patch was checked against the old bounds
+                if patched and _generation != generation:
+                    _entries.pop(key, None)
+
+        return {
+            count_key: count for count_key, count in entry['counts'].items()
+            if need_from is None or count_key[0] >= need_from
+        }
+
+
+def _compute(group_by: str, filters: Dict, compute: Callable) -> Counts:
+    now = datetime.utcnow()
+    open_start = bucket_start(now, group_by)
+    start = filters.get('_start')
+
+    need_from = None
+    if start is not None:
+        need_from = bucket_start(start, group_by)
+        if need_from < start:
+            need_from = next_bucket(need_from, group_by)
+        if need_from >= open_start:
+            # The whole range sits in the open bucket
+            return _timed(compute, 'open_seconds_total', start, None)
+
+    key_filters = _key_filters(filters)
+    key = (group_by, tuple(sorted(key_filters.items())))
+    counts = dict(_closed_counts(key, group_by, key_filters, need_from, open_start, compute))
+
+    live = _timed(compute, 'open_seconds_total', open_start, None)
+    if start is not None and start < need_from:
+        # Partial first bucket of a sliding time range
+        live.update(_timed(compute, 'open_seconds_total', start, need_from))
+    for count_key, count in live.items():
+        counts[count_key] = counts.get(count_key, 0) + count
+    return counts
+
+
+def get(group_by: str, filters: Dict, start: Optional[datetime], compute: Callable) -> Counts:
+    """
+    Return counts keyed (bucket, event_type) for events from `start` on.
+
+    `compute(start, end)` aggregates events in [start, end) for these
+    filters. Concurrent identical requests share a single computation.
+    """
+    filters = dict(filters, _start=start)
+    request_key = (group_by, tuple(sorted((k, v) for k, v in _key_filters(filters).items())),
+                   filters.get('time_range'))
+
+    with _lock:
+        _stats['requests'] += 1
+        future = _inflight.get(request_key)
+        leader = future is None
+        if leader:
+            future = _inflight[request_key] = Future()
+        else:
+            _stats['shared'] += 1
+
+    if not leader:
+        return dict(future.result())
+
+    try:
+        result = _compute(group_by, filters, compute)
+        future.set_result(result)
+        return result
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _lock:
+            _inflight.pop(request_key, None)
+
+
+def invalidate(rows: Iterable[Dict]):
+    """Mark closed buckets that received the given committed events as dirty"""
+    global _generation
+    # Every entry's closed range ends at or before today, so events from today
+    # on (the usual case) only touch open buckets, which are always recomputed
+    today = bucket_start(datetime.utcnow(), 'day')
+    rows = [row for row in rows if row.get('timestamp') is not None and row['timestamp'] < today]
+    if not rows:
+        return
+
+    # Group the rows by bucket once per granularity, outside the lock
+    buckets = {}
+    for group_by in ('day', 'week', 'month'):
+        by_bucket = buckets[group_by] = {}
+        for row in rows:
+            by_bucket.setdefault(bucket_start(row['timestamp'], group_by), []).append(row)
+
+    with _lock:
+        _generation += 1
+        for entry in _entries.values():
+            for bucket, bucket_rows in buckets[entry['group_by']].items():
+                if bucket >= entry['until'] or bucket in entry['dirty']:
+                    continue
+                if entry['from'] is not None and bucket < entry['from']:
+                    continue
+                if any(_matches(entry, row) for row in bucket_rows):
+                    entry['dirty'].add(bucket)
+                    _stats['invalidations'] += 1
+
+
+def clear():
+    global _generation
+    with _lock:
+        _generation += 1
+        _entries.clear()
+        _key_locks.clear()
+
+
+def stats() -> Dict:
+    """Hit rate and recompute time of the stats cache"""
+    with _lock:
+        result = dict(_stats)
+        result['entries'] = len(_entries)
+    result['enabled'] = CACHE_ENABLED
+    answered = result['hits'] + result['misses'] + result['closed_recomputes']
+    result['hit_rate'] = result['hits'] / answered if answered else 0.0
+    recomputes = result['misses'] + result['closed_recomputes']
+    result['recompute_seconds_avg'] = result['recompute_seconds_total'] / recomputes if recomputes else 0.0
+    return result
+
+
+if CACHE_ENABLED:
+    on_events_committed(invalidate)
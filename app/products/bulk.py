@@ -0,0 +1,164 @@
+import json
+import time
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, Optional
+from . import cache as product_cache
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+BATCH_SIZE = 1000
+
+
+def _peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MB (None where unsupported)"""
+    if resource is None:
+        return None
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def iter_bulk_products(lines: Iterable[bytes]) -> Iterator[Dict]:
+    """
+    Assemble products from bulk operation JSONL lines.
+
+    Shopify writes each product line before its child variant and media
+    lines (linked through __parentId), so only the product being assembled
+    is kept in memory.
+    """
+    current = None
+    for line in lines:
+        record = json.loads(line)
+        gid = record.get('id', '')
+
+        if '__parentId' not in record:
+            if current is not None:
+                yield current
+            current = {
+                'shopify_id': gid.split('/')[-1],
+                'title': record['title'],
+                'description': record.get('descriptionHtml') or '',
+                'price': 0.0,
+                'sku': '',
+                'image_url': '',
+                'variant_id': None,
+                'media_id': None
+            }
+            continue
+
+        if current is None or record['__parentId'].split('/')[-1] != current['shopify_id']:
+            continue
+
+        # Keep the first variant and first image, like the single product reads
+        if '/ProductVariant/' in gid and not current['variant_id']:
+            current['variant_id'] = gid
+            current['price'] = float(record.get('price') or 0.0)
+            current['sku'] = record.get('sku') or ''
+        elif '/MediaImage/' in gid and not current['media_id']:
+            current['media_id'] = gid
+            current['image_url'] = (record.get('image') or {}).get('url') or ''
+
+    if current is not None:
+        yield current
+
+
+def ingest_products(lines: Iterable[bytes], batch_size: int = BATCH_SIZE, prune: bool = True,
+                    synced_at: Optional[datetime] = None) -> Dict:
+    """
+    Upsert products from JSONL lines into the Mongo mirror with batched bulk_write.
+
+    `synced_at` is when the export was taken (default: now). Mirrored
+    products written after it are kept as they are, and with `prune`,
+    products synced before it that are missing from the export are removed.
+    """
+    synced_at = synced_at or datetime.utcnow()
+    started = time.perf_counter()
+    rows = 0
+    batch = []
+
+    for product in iter_bulk_products(lines):
+        batch.append(product)
+        rows += 1
+        if len(batch) >= batch_size:
+            product_cache.store_many(batch, synced_at=synced_at)
+            batch = []
+    product_cache.store_many(batch, synced_at=synced_at)
+
+    pruned = 0
+    if prune:
+        pruned = product_cache.prune_unsynced(synced_at)
+    product_cache.invalidate_catalog()
+
+    elapsed = time.perf_counter() - started
+    return {
+        'rows': rows,
+        'pruned': pruned,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(rows / elapsed, 1) if elapsed else 0.0,
+        'peak_rss_mb': _peak_rss_mb()
+    }
+
+
+def bulk_sync_products(shopify_api, jsonl_url: Optional[str] = None, poll_interval: float = 2.0,
+                       batch_size: int = BATCH_SIZE, prune: bool = True) -> Dict:
+    """
+    Mirror the full Shopify catalog through a bulk operation.
+
+    Pass `jsonl_url` to skip the bulk operation and ingest an existing result
+    file, e.g. a canned JSONL served locally.
+    """
+    operation_id = None
+    # Products changed once the export has started may be missing from it or
+    # stale in it, so the snapshot time is taken before starting
+    snapshot = datetime.utcnow()
+    if not jsonl_url:
+        operation_id = shopify_api.start_bulk_products_export()
+        operation = shopify_api.wait_for_bulk_operation(operation_id, poll_interval=poll_interval)
+        jsonl_url = operation.get('url')
+
+    if jsonl_url:
+        report = ingest_products(shopify_api.iter_jsonl(jsonl_url), batch_size=batch_size, prune=prune,
+                                 synced_at=snapshot)
+    else:
+        # A completed operation without a URL means the catalog is empty
+        report = ingest_products([], batch_size=batch_size, prune=prune, synced_at=snapshot)
+
+    report['bulk_operation_id'] = operation_id
+    return report
+
+
+_run_lock = threading.Lock()
+_last_run = {'status': 'idle', 'report': None, 'error': None, 'started_at': None, 'finished_at': None}
+
+
+def start_background_sync(shopify_api, **kwargs) -> bool:
+    """Run bulk_sync_products on a background thread; False if one is already running"""
+    with _run_lock:
+        if _last_run['status'] == 'running':
+            return False
+        _last_run.update(status='running', report=None, error=None,
+                         started_at=datetime.utcnow().isoformat(), finished_at=None)
+
+    def run():
+        result = {}
+        try:
+            report = bulk_sync_products(shopify_api, **kwargs)
+            result.update(status='completed', report=report)
+        except Exception as e:
+            result.update(status='failed', error=str(e))
+        finally:
+            result['finished_at'] = datetime.utcnow().isoformat()
+            with _run_lock:
+                _last_run.update(result)
+
+    threading.Thread(target=run, name='bulk-product-sync', daemon=True).start()
+    return True
+
+
+def sync_status() -> Dict:
+    """State and report of the most recent background sync in this worker"""
+    with _run_lock:
+        return dict(_last_run)
@@ -0,0 +1,231 @@
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from flask import g
+from mongoengine.queryset.visitor import Q
+from pymongo import UpdateOne
+from .models import Product
+
+# Read-through cache over the identifier_products mirror.
+# PRODUCT_CACHE_MODE: 'off' (always read Shopify) or 'read_through'
+CACHE_MODE = os.getenv('PRODUCT_CACHE_MODE', 'off').lower()
+CACHE_TTL = int(os.getenv('PRODUCT_CACHE_TTL', 300))
+REFILL_BATCH_SIZE = 500
+
+HIT = 'HIT'
+MISS = 'MISS'
+STALE = 'STALE'
+
+_stats_lock = threading.Lock()
+_stats = {
+    'hits': 0,
+    'misses': 0,
+    'stale': 0,
+    'served_age_total': 0.0,
+    'served_age_max': 0.0,
+    'served': 0,
+}
+
+# Last time this worker refilled the whole catalog from Shopify
+_catalog_synced_at = None
+
+
+def is_enabled() -> bool:
+    """Return True when GETs should be served from the Mongo mirror"""
+    return CACHE_MODE == 'read_through'
+
+
+def _mirror_fields(product: Dict, synced_at: datetime) -> Dict:
+    fields = {
+        'title': product['title'],
+        'description': product.get('description', ''),
+        'price': product['price'],
+        'sku': product.get('sku', ''),
+        'image_url': product.get('image_url', ''),
+        'synced_at': synced_at,
+    }
+    # Only overwrite the stored Shopify IDs when the source actually knows them
+    for key in ('variant_id', 'media_id', 'image_source_url'):
+        if product.get(key):
+            fields[key] = product[key]
+    return fields
+
+
+def _age(synced_at: Optional[datetime], now: datetime) -> float:
+    return (now - synced_at).total_seconds() if synced_at else float('inf')
+
+
+def record(status: str, age: Optional[float] = None, count: int = 1):
+    """Update counters for `count` products and remember the cache status for the response headers"""
+    with _stats_lock:
+        if status == HIT:
+            _stats['hits'] += count
+        elif status == MISS:
+            _stats['misses'] += count
+        else:
+            _stats['stale'] += count
+
+        if age is not None and age != float('inf'):
+            _stats['served'] += 1
+            _stats['served_age_total'] += age
+            _stats['served_age_max'] = max(_stats['served_age_max'], age)
+
+    g.product_cache_status = status
+    g.product_cache_age = age
+
+
+def _to_shopify_shape(product: Product) -> Dict:
+    """Match the structure returned by ShopifyAPI so callers can't tell the source"""
+    data = product.to_dict()
+    data.pop('id', None)
+    return data
+
+
+def get(product_id: str) -> Tuple[Optional[Dict], Optional[float]]:
+    """Return (product, age_seconds) from the mirror, or (None, None)"""
+    product = Product.objects(shopify_id=str(product_id)).first()
+    if not product:
+        return None, None
+    return _to_shopify_shape(product), _age(product.synced_at, datetime.utcnow())
+
+
+def get_fresh(product_id: str) -> Optional[Dict]:
+    """Return the mirrored product if it is within the TTL, recording a hit"""
+    product, age = get(product_id)
+    if product is None or age > CACHE_TTL:
+        return None
+    record(HIT, age)
+    return product
+
+
+def get_fresh_many(product_ids: List[str]) -> Dict[str, Dict]:
+    """Return mirrored products within the TTL, keyed by shopify_id, with one query"""
+    now = datetime.utcnow()
+    cutoff = now - timedelta(seconds=CACHE_TTL)
+    products = {}
+    for product in Product.objects(shopify_id__in=[str(i) for i in product_ids], synced_at__gte=cutoff):
+        products[product.shopify_id] = _to_shopify_shape(product)
+        record(HIT, _age(product.synced_at, now))
+    return products
+
+
+def store(product: Dict):
+    """Write a product fetched from Shopify into the mirror"""
+    Product.objects(shopify_id=str(product['shopify_id'])).update_one(
+        upsert=True,
+        **{f'set__{key}': value for key, value in _mirror_fields(product, datetime.utcnow()).items()}
+    )
+
+
+def _keep_newer(fields: Dict, snapshot: datetime) -> List[Dict]:
+    """Update pipeline writing `fields` unless the row was synced at or after `snapshot`"""
+    # Mongo keeps milliseconds: a write in the same millisecond counts as newer
+    newer = {'$gte': ['$synced_at', snapshot]}
+    return [{'$set': {
+        key: {'$cond': [newer, f'${key}', {'$literal': value}]}
+        for key, value in fields.items()
+    }}]
+
+
+def store_many(products: Iterable[Dict], synced_at: Optional[datetime] = None):
+    """
+    Upsert a batch of Shopify products into the mirror with one bulk_write.
+
+    `synced_at` is when the products were read from Shopify; rows written
+    since then (e.g. by an update during a bulk export) are left alone.
+    """
+    operations = [
+        UpdateOne(
+            {'shopify_id': str(product['shopify_id'])},
+            _keep_newer(_mirror_fields(product, synced_at), synced_at) if synced_at
+            else {'$set': _mirror_fields(product, datetime.utcnow())},
+            upsert=True
+        )
+        for product in products
+    ]
+    if operations:
+        Product._get_collection().bulk_write(operations, ordered=False)
+
+
+def prune_unsynced(synced_at: datetime) -> int:
+    """Remove mirrored products not synced since `synced_at`, including expired ones"""
+    return Product.objects(Q(synced_at__lt=synced_at) | Q(synced_at=None)).delete()
+
+
+def invalidate(product_id: str):
+    """Expire a mirrored product so the next read refills it from Shopify"""
+    Product.objects(shopify_id=str(product_id)).update_one(set__synced_at=None)
+    invalidate_catalog()
+
+
+def invalidate_catalog():
+    """Force the next catalog read to go to Shopify"""
+    global _catalog_synced_at
+    _catalog_synced_at = None
+
+
+def catalog_is_fresh() -> bool:
+    return _catalog_synced_at is not None and _age(_catalog_synced_at, datetime.utcnow()) <= CACHE_TTL
+
+
+def iter_catalog(status: str) -> Iterator[Dict]:
+    """Yield every mirrored product, recording how old the served entries are"""
+    now = datetime.utcnow()
+    catalog_age = _age(_catalog_synced_at, now) if _catalog_synced_at else None
+    record(status, catalog_age)
+    for product in Product.objects.order_by('shopify_id').no_cache():
+        yield _to_shopify_shape(product)
+
+
+def refill_catalog(products: Iterable[Dict]) -> Iterator[Dict]:
+    """
+    Pass products through while upserting them into the mirror in batches.
+
+    Once the whole catalog has been seen, mirrored products that Shopify no
+    longer returns are removed and the catalog is marked fresh.
+    """
+    global _catalog_synced_at
+    started_at = datetime.utcnow()
+    record(MISS)
+
+    batch: List[Dict] = []
+    for product in products:
+        batch.append(product)
+        if len(batch) >= REFILL_BATCH_SIZE:
+            store_many(batch, synced_at=started_at)
+            batch = []
+        yield product
+    store_many(batch, synced_at=started_at)
+
+    prune_unsynced(started_at)
+    _catalog_synced_at = started_at
+
+
+def stats() -> Dict:
+    """Hit ratio and served-entry age for the product cache"""
+    with _stats_lock:
+        lookups = _stats['hits'] + _stats['misses'] + _stats['stale']
+        return {
+            'mode': CACHE_MODE,
+            'ttl_seconds': CACHE_TTL,
+            'hits': _stats['hits'],
+            'misses': _stats['misses'],
+            'stale': _stats['stale'],
+            'hit_ratio': (_stats['hits'] / lookups) if lookups else 0.0,
+            'served_age_avg_seconds': (_stats['served_age_total'] / _stats['served']) if _stats['served'] else 0.0,
+            'served_age_max_seconds': _stats['served_age_max'],
+            'catalog_synced_at': _catalog_synced_at.isoformat() if _catalog_synced_at else None,
+        }
+
+
+def response_headers() -> Dict:
+    """Cache headers for the current request (X-Cache and Age)"""
+    status = g.get('product_cache_status')
+    if not status:
+        return {}
+    headers = {'X-Cache': status}
+    age = g.get('product_cache_age')
+    if age is not None and age != float('inf'):
+        headers['Age'] = str(int(age))
+    return headers
@@ -0,0 +1,28 @@
+import json
+import click
+from .bulk import bulk_sync_products, BATCH_SIZE
+
+
+@click.command('sync-products-bulk')
+@click.option('--jsonl-url', default=None, help='Ingest an existing bulk result file instead of starting a bulk operation')
+@click.option('--batch-size', default=BATCH_SIZE, show_default=True, help='Products per Mongo bulk_write')
+@click.option('--poll-interval', default=2.0, show_default=True, help='Seconds between bulk operation status polls')
+@click.option('--no-prune', is_flag=True, help='Keep mirrored products missing from the export')
+def sync_products_bulk_command(jsonl_url, batch_size, poll_interval, no_prune):
+    """Mirror the Shopify catalog into MongoDB via bulkOperationRunQuery"""
+    # Imported here so the Shopify client is only built when the command runs
+    from app.products.controller import shopify_api
+
+    report = bulk_sync_products(
+        shopify_api,
+        jsonl_url=jsonl_url,
+        poll_interval=poll_interval,
+        batch_size=batch_size,
+        prune=not no_prune
+    )
+    click.echo(json.dumps(report, indent=2))
+
+
+def register_commands(app):
+    """Register product CLI commands on the Flask app"""
+    app.cli.add_command(sync_products_bulk_command)
@@ -1,4 +1,9 @@
+import logging
+import os
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
 from typing import Dict, List, Optional
 import requests
 from flask import current_app, request
@@ -6,13 +11,41 @@ from datetime import datetime
 from .models import Product
 from app.extensions import db
 from app.events.models import Event
-from .services import log_product_event
+from .services import log_product_event, log_product_events
+from . import cache as product_cache
+from . import bulk as product_bulk
 from app.utils.shopify import ShopifyAPI
+from app.utils.shopify_throttle import ThrottleWaitExceeded
 from flask_jwt_extended import get_jwt_identity
+from marshmallow import ValidationError
+from .input_validation import ProductSchema, ProductUpdateSchema, dump_product
+
+logger = logging.getLogger(__name__)
 
 # Initialize Shopify API
 shopify_api = ShopifyAPI()
 
+# Concurrent Shopify creates per batch request (the cost throttle still applies)
+BATCH_CONCURRENCY = int(os.getenv('PRODUCT_BATCH_CONCURRENCY', 4))
+
+PRODUCT_GID_PREFIX = 'gid://shopify/Product/'
+
+def get_upstream_stats():
+    """Shopify connection pool usage, per-operation call latency and throttle state"""
+    return {
+        'pool': shopify_api.pool_stats(),
+        'calls': shopify_api.call_stats(),
+        'throttle': shopify_api.throttle.stats()
+    }
+
+def start_bulk_sync():
+    """Start a background bulk catalog sync into the Mongo mirror"""
+    return product_bulk.start_background_sync(shopify_api)
+
+def get_bulk_sync_status():
+    """Status and throughput report of the last bulk catalog sync"""
+    return product_bulk.sync_status()
+
 def get_all_products():
     """Get all products directly from Shopify"""
     try:
@@ -28,6 +61,79 @@ def get_all_products():
         
         return products
     
+    except ThrottleWaitExceeded:
+        raise
+    except Exception as e:
+        current_app.logger.error(f"Failed to get products: {str(e)}")
+        raise Exception(f"Failed to get products: {str(e)}")
+
+def stream_all_products(page_size=None, max_pages=None):
+    """Return a generator over every Shopify product, fetched page by page"""
+    try:
+        user_id = get_jwt_identity()
+        if not user_id:
+            user_id = 'System'
+
+        if product_cache.is_enabled():
+            products = _read_through_catalog(page_size, max_pages)
+        else:
+            products = shopify_api.iter_products(first=page_size, max_pages=max_pages)
+
+        # Log read event in PostgreSQL
+        log_product_event('READ', 'ALL_PRODUCTS', str(user_id))
+
+        return products
+
+    except ThrottleWaitExceeded:
+        raise
+    except Exception as e:
+        current_app.logger.error(f"Failed to get products: {str(e)}")
+        raise Exception(f"Failed to get products: {str(e)}")
+
+def _read_through_catalog(page_size=None, max_pages=None):
+    """Serve the catalog from the Mongo mirror, refilling it from Shopify when expired"""
+    if product_cache.catalog_is_fresh():
+        return product_cache.iter_catalog(product_cache.HIT)
+
+    products = shopify_api.iter_products(first=page_size, max_pages=max_pages)
+    try:
+        # Pull the first page now so an unreachable Shopify falls back to the mirror
+        first = next(products, None)
+    except Exception as e:
+        current_app.logger.warning(f"Shopify unavailable, serving stale products: {str(e)}")
+        return product_cache.iter_catalog(product_cache.STALE)
+
+    products = chain([first], products) if first is not None else iter(())
+
+    # Only a complete walk of the catalog may refill (and prune) the mirror
+    if max_pages or shopify_api.max_pages:
+        product_cache.record(product_cache.MISS)
+        return products
+    return product_cache.refill_catalog(products)
+
+def get_products_page(cursor=None, page_size=None):
+    """Get one page of products from Shopify for client-driven paging"""
+    try:
+        user_id = get_jwt_identity()
+        if not user_id:
+            user_id = 'System'
+
+        page = shopify_api.get_products_page(first=page_size, after=cursor or None)
+
+        if product_cache.is_enabled():
+            product_cache.store_many(page['products'])
+
+        # Log read event in PostgreSQL
+        log_product_event('READ', 'ALL_PRODUCTS', str(user_id))
+
+        return {
+            'products': page['products'],
+            'next_cursor': page['end_cursor'] if page['has_next_page'] else None,
+            'has_next_page': page['has_next_page']
+        }
+
+    except ThrottleWaitExceeded:
+        raise
     except Exception as e:
         current_app.logger.error(f"Failed to get products: {str(e)}")
         raise Exception(f"Failed to get products: {str(e)}")
@@ -47,17 +153,21 @@ def create_product(product_data):
         # If Shopify creation successful, create in local DBs
         try:
             # Create product in our database
-            print("hi there ther eht herfnefwefewf")
-            print(shopify_product)
+            logger.debug('Shopify product created: %s', shopify_product)
             product = Product(
                 shopify_id=str(shopify_product['shopify_id']),
                 title=shopify_product['title'],
                 description=shopify_product['description'],
                 price=shopify_product['price'],
                 sku=shopify_product['sku'],
-                image_url=product_data['image_url']
+                image_url=product_data['image_url'],
+                variant_id=shopify_product.get('variant_id'),
+                media_id=shopify_product.get('media_id'),
+                image_source_url=shopify_product.get('image_source_url'),
+                synced_at=datetime.utcnow()
             )
             product.save()
+            product_cache.invalidate_catalog()
             
             # Log event in PostgreSQL
             log_product_event('CREATE', shopify_product['shopify_id'], str(user_id))
@@ -67,12 +177,121 @@ def create_product(product_data):
         except Exception as db_error:
             # If local DB operations fail, log the error but don't rollback Shopify
             current_app.logger.error(f"Failed to sync with local DB: {str(db_error)}")
+            product_cache.invalidate_catalog()
             return shopify_product
     
+    except ThrottleWaitExceeded:
+        raise
     except Exception as e:
         current_app.logger.error(f"Failed to create product: {str(e)}")
         raise Exception(f"Failed to create product: {str(e)}")
 
+def _mirror_state(product: Product) -> Dict:
+    """Last known Shopify state of a mirrored product, for update diffing"""
+    return dict(product.to_dict(), variant_id=product.variant_id, media_id=product.media_id,
+                image_source_url=product.image_source_url)
+
+def save_products_batch(items):
+    """
+    Create or update many products with bounded concurrency.
+
+    Items with a `shopify_id` update that product (validated with
+    ProductUpdateSchema and diffed against the mirror, as single updates
+    are); the others are created (validated with ProductSchema). Shopify
+    calls run in parallel, the Mongo mirror is written with one bulk_write
+    and the events with one INSERT per type. Returns per-item results and
+    the batch throughput.
+    """
+    started = time.perf_counter()
+    user_id = get_jwt_identity()
+    if not user_id:
+        user_id = 'System'
+
+    create_schema = ProductSchema()
+    update_schema = ProductUpdateSchema()
+    results = [None] * len(items)
+    valid = []
+    seen_ids = set()
+    for index, item in enumerate(items):
+        try:
+            product_id = item.get('shopify_id') if isinstance(item, dict) else None
+            if product_id:
+                product_id = str(product_id)
+                if product_id in seen_ids:
+                    raise ValidationError({'shopify_id': ['Appears more than once in this batch.']})
+                seen_ids.add(product_id)
+                data = {key: value for key, value in item.items() if key != 'shopify_id'}
+                valid.append((index, product_id, update_schema.load(data)))
+            else:
+                valid.append((index, None, create_schema.load(item)))
+        except ValidationError as e:
+            results[index] = {'index': index, 'status': 'invalid', 'errors': e.messages}
+
+    # Last known state of the products being updated, read in one query
+    current_states = {}
+    if seen_ids:
+        try:
+            for product in Product.objects(shopify_id__in=list(seen_ids)):
+                if product.synced_at:
+                    current_states[product.shopify_id] = _mirror_state(product)
+        except Exception as db_error:
+            current_app.logger.warning(f"Failed to read local product state: {str(db_error)}")
+
+    def write(entry):
+        index, product_id, product_data = entry
+        try:
+            if product_id is None:
+                return entry, shopify_api.create_product(product_data), None
+            shopify_product = shopify_api.update_product(product_id, product_data, current_states.get(product_id))
+            if not shopify_product:
+                raise Exception("Failed to update product in Shopify")
+            return entry, shopify_product, None
+        except Exception as e:
+            return entry, None, str(e)
+
+    created = []
+    updated = []
+    with ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY, thread_name_prefix='product-batch') as executor:
+        for (index, product_id, product_data), shopify_product, error in executor.map(write, valid):
+            if error:
+                results[index] = {'index': index, 'status': 'failed', 'error': error}
+                continue
+            # Keep the source URL in the mirror, as single writes do
+            shopify_product['image_url'] = product_data.get('image_url') or shopify_product.get('image_url')
+            (created if product_id is None else updated).append(shopify_product)
+            results[index] = {
+                'index': index,
+                'status': 'created' if product_id is None else 'updated',
+                'product': dump_product(shopify_product)
+            }
+
+    # Sync the successful writes to local DBs in bulk
+    try:
+        product_cache.store_many(created + updated)
+        product_cache.invalidate_catalog()
+    except Exception as db_error:
+        current_app.logger.error(f"Failed to sync batch with local DB: {str(db_error)}")
+    log_product_events('CREATE', [product['shopify_id'] for product in created], str(user_id))
+    log_product_events('UPDATE', [product['shopify_id'] for product in updated], str(user_id))
+
+    elapsed = time.perf_counter() - started
+    written = len(created) + len(updated)
+    summary = {
+        'total': len(items),
+        'created': len(created),
+        'updated': len(updated),
+        'failed': sum(1 for result in results if result['status'] == 'failed'),
+        'invalid': sum(1 for result in results if result['status'] == 'invalid'),
+        'seconds': round(elapsed, 3),
+        'products_per_minute': round(written * 60 / elapsed, 1) if elapsed else 0.0
+    }
+    current_app.logger.info(
+        f"Product batch: {summary['created']} created, {summary['updated']} updated of "
+        f"{summary['total']} in {summary['seconds']}s ({summary['products_per_minute']} products/min)"
+    )
+
+    return {'summary': summary, 'results': results}
+
 def get_product_by_id(product_id):
     """Get a product directly from Shopify"""
     try:
@@ -80,8 +299,11 @@ def get_product_by_id(product_id):
         if not user_id:
             user_id = 'System'
         
-        # Get product directly from Shopify
-        product = shopify_api.get_product(product_id)
+        if product_cache.is_enabled():
+            product = _read_through_product(product_id)
+        else:
+            # Get product directly from Shopify
+            product = shopify_api.get_product(product_id)
         
         if not product:
             raise Exception("Product not found in Shopify")
@@ -91,10 +313,89 @@ def get_product_by_id(product_id):
         
         return product
         
+    except ThrottleWaitExceeded:
+        raise
     except Exception as e:
         current_app.logger.error(f"Failed to get product: {str(e)}")
         raise Exception(f"Failed to get product: {str(e)}")
 
+def get_products_by_ids(product_ids):
+    """Resolve many products in one request, fetching cache misses from Shopify in chunks"""
+    try:
+        user_id = get_jwt_identity()
+        if not user_id:
+            user_id = 'System'
+
+        # Deduplicate while keeping the requested order; the mirror and the
+        # Shopify results are keyed by numeric ID, so GIDs are reduced to it
+        product_ids = list(dict.fromkeys(_numeric_product_id(product_id) for product_id in product_ids))
+
+        found = {}
+        if product_cache.is_enabled():
+            try:
+                found = product_cache.get_fresh_many(product_ids)
+            except Exception as db_error:
+                current_app.logger.error(f"Failed to read product cache: {str(db_error)}")
+
+        misses = [product_id for product_id in product_ids if product_id not in found]
+        if misses:
+            if product_cache.is_enabled():
+                # One miss per ID, as get_fresh_many counts one hit per ID
+                product_cache.record(product_cache.MISS, count=len(misses))
+            fetched = shopify_api.get_products_by_ids(misses)
+            found.update(fetched)
+            if product_cache.is_enabled() and fetched:
+                try:
+                    product_cache.store_many(fetched.values())
+                except Exception as db_error:
+                    current_app.logger.error(f"Failed to refill product cache: {str(db_error)}")
+
+        products = [found[product_id] for product_id in product_ids if product_id in found]
+
+        # Log all read events in PostgreSQL with one INSERT
+        log_product_events('READ', [product['shopify_id'] for product in products], str(user_id))
+
+        return {
+            'products': products,
+            'missing': [product_id for product_id in product_ids if product_id not in found]
+        }
+
+    except ThrottleWaitExceeded:
+        raise
+    except Exception as e:
+        current_app.logger.error(f"Failed to get products: {str(e)}")
+        raise Exception(f"Failed to get products: {str(e)}")
+
+def _numeric_product_id(product_id):
+    """Numeric shopify_id for either form: '123' or 'gid://shopify/Product/123'"""
+    product_id = str(product_id)
+    if product_id.startswith(PRODUCT_GID_PREFIX):
+        return product_id[len(PRODUCT_GID_PREFIX):]
+    return product_id
+
+def _read_through_product(product_id):
+    """Serve a product from the Mongo mirror, refilling it from Shopify on miss or expiry"""
+    product = product_cache.get_fresh(product_id)
+    if product:
+        return product
+
+    try:
+        product = shopify_api.get_product(product_id)
+    except Exception as e:
+        cached, age = product_cache.get(product_id)
+        if not cached:
+            raise
+        current_app.logger.warning(f"Shopify unavailable, serving stale product {product_id}: {str(e)}")
+        product_cache.record(product_cache.STALE, age)
+        return cached
+
+    product_cache.record(product_cache.MISS)
+    try:
+        product_cache.store(product)
+    except Exception as db_error:
+        current_app.logger.error(f"Failed to refill product cache: {str(db_error)}")
+    return product
+
 def update_product(product_id, product_data):
     """Update a product in Shopify and sync to local DB only if successful"""
     try:
@@ -102,8 +403,18 @@ def update_product(product_id, product_data):
         if not user_id:
             user_id = 'System'
 
+        # Last known state from the Mongo mirror, so only changed fields are sent
+        product = None
+        current = None
+        try:
+            product = Product.objects(shopify_id=product_id).first()
+            if product and product.synced_at:
+                current = _mirror_state(product)
+        except Exception as db_error:
+            current_app.logger.warning(f"Failed to read local product state: {str(db_error)}")
+
         # First update in Shopify
-        shopify_product = shopify_api.update_product(product_id, product_data)
+        shopify_product = shopify_api.update_product(product_id, product_data, current)
         
         if not shopify_product:
             raise Exception("Failed to update product in Shopify")
@@ -111,25 +422,22 @@ def update_product(product_id, product_data):
         # If Shopify update successful, update local DBs
         try:
             # Update in MongoDB
-            product = Product.objects(shopify_id=product_id).first()
             if not product:
-                product = Product(
-                    shopify_id=str(shopify_product['shopify_id']),
-                    title=shopify_product['title'],
-                    description=shopify_product['description'],
-                    price=shopify_product['price'],
-                    sku=shopify_product['sku'],
-                    image_url=product_data['image_url']
-                )
-            else:
-                product.title = shopify_product['title']
-                product.description = shopify_product['description']
-                product.price =shopify_product['price']
-                product.sku = shopify_product['sku']
-                product.image_url = product_data['image_url']
+                product = Product(shopify_id=str(shopify_product['shopify_id']))
+
+            product.title = shopify_product['title']
+            product.description = shopify_product['description']
+            product.price = shopify_product['price']
+            product.sku = shopify_product['sku']
+            product.image_url = product_data.get('image_url') or shopify_product.get('image_url')
+            product.variant_id = shopify_product.get('variant_id') or product.variant_id
+            product.media_id = shopify_product.get('media_id') or product.media_id
+            product.image_source_url = shopify_product.get('image_source_url') or product.image_source_url
             
             product.updated_at = datetime.utcnow()
+            product.synced_at = product.updated_at
             product.save()
+            product_cache.invalidate_catalog()
             
             # Log event in PostgreSQL
             log_product_event('UPDATE', product_id, str(user_id))
@@ -139,8 +447,14 @@ def update_product(product_id, product_data):
         except Exception as db_error:
             # If local DB operations fail, log the error but don't rollback Shopify
             current_app.logger.error(f"Failed to sync with local DB: {str(db_error)}")
+            try:
+                product_cache.invalidate(product_id)
+            except Exception:
+                product_cache.invalidate_catalog()
             return shopify_product
         
+    except ThrottleWaitExceeded:
+        raise
     except Exception as e:
         current_app.logger.error(f"Failed to update product: {str(e)}")
         raise Exception(f"Failed to update product: {str(e)}")
@@ -164,6 +478,7 @@ def delete_product(product_id):
             product = Product.objects(shopify_id=product_id).first()
             if product:
                 product.delete()
+            product_cache.invalidate_catalog()
             
             # Log event in PostgreSQL
             log_product_event('DELETE', product_id, str(user_id))
@@ -173,8 +488,11 @@ def delete_product(product_id):
         except Exception as db_error:
             # If local DB operations fail, log the error but don't rollback Shopify
             current_app.logger.error(f"Failed to sync with local DB: {str(db_error)}")
+            product_cache.invalidate_catalog()
             return True
     
+    except ThrottleWaitExceeded:
+        raise
     except Exception as e:
         current_app.logger.error(f"Failed to delete product: {str(e)}")
         raise Exception(f"Failed to delete product: {str(e)}")
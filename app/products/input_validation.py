@@ -1,4 +1,5 @@
 from marshmallow import Schema, fields, validate
+from app.utils.serialization import compile_dumper
 
 class ProductSchema(Schema):
     shopify_id = fields.Str(dump_only=True)
@@ -8,6 +9,9 @@ class ProductSchema(Schema):
     sku = fields.Str()
     image_url = fields.Str()
 
+# Precompiled ProductSchema().dump for response bodies
+dump_product = compile_dumper(ProductSchema)
+
 class ProductUpdateSchema(ProductSchema):
     title = fields.Str(validate=validate.Length(min=1))
     price = fields.Float(validate=validate.Range(min=0))
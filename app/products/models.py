@@ -11,6 +11,15 @@ class Product(Document):
     price = FloatField(required=True)
     sku = StringField()
     image_url = StringField()
+    # Shopify IDs of the default variant and current image, so updates
+    # don't need a lookup query
+    variant_id = StringField()
+    media_id = StringField()
+    # URL the current image was uploaded from; image_url becomes the
+    # Shopify CDN URL when the mirror is refilled
+    image_source_url = StringField()
+    # When this mirror entry was last refreshed from Shopify (None = expired)
+    synced_at = DateTimeField()
  
     
     meta = {
@@ -1,15 +1,73 @@
-import traceback
-from flask import request, jsonify
+import json
+import logging
+import math
+from flask import current_app, request, jsonify, Response, stream_with_context
 from marshmallow import ValidationError
 from flask_restx import Namespace, Resource
 from flask_jwt_extended import jwt_required
-from app.products.controller import create_product, get_all_products, get_product_by_id, update_product, delete_product
-from app.products.input_validation import ProductSchema, ProductUpdateSchema
+from app.products.controller import (
+    create_product, get_all_products, get_product_by_id, update_product, delete_product,
+    stream_all_products, get_products_page, get_upstream_stats,
+    start_bulk_sync, get_bulk_sync_status, get_products_by_ids, save_products_batch
+)
+from app.products.input_validation import ProductUpdateSchema, dump_product
+from app.products import cache as product_cache
 from app.utils.event_logger import log_event
+from app.utils.profiling import span
+from app.utils.serialization import dumps
+from app.utils.shopify_throttle import ThrottleWaitExceeded
+
+logger = logging.getLogger(__name__)
 
 
 api = Namespace('products', description='Product related endpoints')
 
+# Upper bound on IDs resolved by one batch lookup
+MAX_BATCH_IDS = 250
+# Upper bound on products written by one batch request
+MAX_BATCH_ITEMS = 5000
+
+
+def throttled_response(error):
+    """503 for calls the Shopify rate limit held past SHOPIFY_THROTTLE_MAX_WAIT"""
+    retry_after = max(1, math.ceil(error.retry_after))
+    return {'code': 'SHOPIFY_THROTTLED', 'message': str(error)}, 503, {'Retry-After': str(retry_after)}
+
+
+def parse_batch_body():
+    """Read a JSON array or NDJSON (one object per line) request body"""
+    if request.mimetype in ('application/x-ndjson', 'application/ndjson'):
+        return [json.loads(line) for line in request.get_data().splitlines() if line.strip()]
+    data = request.get_json(silent=True)
+    if not isinstance(data, list):
+        raise ValueError('Body must be a JSON array or NDJSON')
+    return data
+
+
+def stream_json_array(items):
+    """
+    Stream an iterable as a JSON array response.
+
+    The first item is pulled eagerly so upstream failures still surface as
+    an error response instead of a truncated 200. Items are encoded with the
+    app's JSON_BACKEND, like every other response body.
+    """
+    items = iter(items)
+    first = next(items, None)
+    backend = current_app.config.get('JSON_BACKEND', 'auto')
+
+    def generate():
+        if first is None:
+            yield b'[]'
+            return
+        yield b'[' + dumps(first, backend, newline=False)
+        for item in items:
+            yield b',' + dumps(item, backend, newline=False)
+        yield b']'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+
 @api.route('/')
 class ProductList(Resource):
     # @jwt_required()   
@@ -17,10 +75,27 @@ class ProductList(Resource):
     def get(self):
         """Get all products with filtering and pagination"""
         try:
-            products = get_all_products()
-            return products
+            # Batch lookup: ?ids=1,2,3
+            if request.args.get('ids'):
+                ids = [i.strip() for i in request.args.get('ids').split(',') if i.strip()]
+                if len(ids) > MAX_BATCH_IDS:
+                    return {'error': f'At most {MAX_BATCH_IDS} ids per request'}, 400
+                return get_products_by_ids(ids), 200, product_cache.response_headers()
+
+            page_size = request.args.get('page_size', type=int)
+
+            # Client-driven paging: ?cursor= (empty for the first page)
+            if 'cursor' in request.args:
+                return get_products_page(request.args.get('cursor'), page_size), 200
+
+            max_pages = request.args.get('max_pages', type=int)
+            response = stream_json_array(stream_all_products(page_size, max_pages))
+            response.headers.update(product_cache.response_headers())
+            return response
         except ValidationError as e:
             return {'error': e.messages}, 400
+        except ThrottleWaitExceeded as e:
+            return throttled_response(e)
         except Exception as e:
             return {'error': str(e)}, 500
 
@@ -32,15 +107,91 @@ class ProductList(Resource):
 
             data = request.json
             product = create_product(data)
-            print(product)
-            schema = ProductSchema()
-            return schema.dump(product), 201
+            logger.debug('Created product: %s', product)
+            with span('serialize', 'dump_product'):
+                body = dump_product(product)
+            return body, 201
         except ValidationError as e:
             return {'error': e.messages}, 400
+        except ThrottleWaitExceeded as e:
+            return throttled_response(e)
+        except Exception as e:
+            logger.exception('Request failed: %s %s', request.method, request.path)
+            return {'error': str(e)}, 500
+
+@api.route('/cache/stats')
+class ProductCacheStats(Resource):
+    @jwt_required()
+    def get(self):
+        """Get product cache hit ratio and served entry age"""
+        return product_cache.stats(), 200
+
+@api.route('/batch')
+class ProductBatch(Resource):
+    @jwt_required()
+    def post(self):
+        """Create or update many products from a JSON array or NDJSON upload"""
+        try:
+            items = parse_batch_body()
+            if not items:
+                return {'error': 'No products provided'}, 400
+            if len(items) > MAX_BATCH_ITEMS:
+                return {'error': f'At most {MAX_BATCH_ITEMS} products per batch'}, 400
+            return save_products_batch(items), 200
+        except ValueError as e:
+            return {'error': str(e)}, 400
         except Exception as e:
-            print(traceback.format_exc())
+            logger.exception('Request failed: %s %s', request.method, request.path)
             return {'error': str(e)}, 500
 
+@api.route('/lookup')
+class ProductLookup(Resource):
+    @jwt_required()
+    def post(self):
+        """Get many products by ID in one request"""
+        try:
+            data = request.get_json(silent=True) or {}
+            ids = data.get('ids')
+            if not isinstance(ids, list) or not ids:
+                return {'error': 'ids must be a non-empty list'}, 400
+            if len(ids) > MAX_BATCH_IDS:
+                return {'error': f'At most {MAX_BATCH_IDS} ids per request'}, 400
+            return get_products_by_ids(ids), 200, product_cache.response_headers()
+        except ThrottleWaitExceeded as e:
+            return throttled_response(e)
+        except Exception as e:
+            logger.exception('Request failed: %s %s', request.method, request.path)
+            return {'error': str(e)}, 500
+
+@api.route('/upstream/stats')
+class ShopifyUpstreamStats(Resource):
+    @jwt_required()
+    def get(self):
+        """Get Shopify connection pool, per-operation latency and throttle stats"""
+        return get_upstream_stats(), 200
+
+@api.route('/bulk-sync')
+class ProductBulkSync(Resource):
+    @jwt_required()
+    def post(self):
+        """Start mirroring the Shopify catalog via a bulk operation"""
+        try:
+            data = request.get_json(silent=True) or {}
+            # The server would fetch and mirror any URL; ingesting a file is CLI-only
+            if data.get('jsonl_url'):
+                return {'error': 'jsonl_url is only accepted by the sync-products-bulk command'}, 400
+            if not start_bulk_sync():
+                return {'error': 'A bulk sync is already running'}, 409
+            return get_bulk_sync_status(), 202
+        except Exception as e:
+            logger.exception('Request failed: %s %s', request.method, request.path)
+            return {'error': str(e)}, 500
+
+    @jwt_required()
+    def get(self):
+        """Get the status of the last bulk sync"""
+        return get_bulk_sync_status(), 200
+
 @api.route('/<string:product_id>')
 class ProductResource(Resource):
     @jwt_required()
@@ -48,11 +199,14 @@ class ProductResource(Resource):
         """Get a specific product by ID"""
         try:
             product = get_product_by_id(product_id)
-            print(product_id)
+            logger.debug('Get product %s', product_id)
             if not product:
                 return {'error': 'Product not found'}, 404
-            schema = ProductSchema()
-            return schema.dump(product), 200
+            with span('serialize', 'dump_product'):
+                body = dump_product(product)
+            return body, 200, product_cache.response_headers()
+        except ThrottleWaitExceeded as e:
+            return throttled_response(e)
         except Exception as e:
             return {'error': str(e)}, 500
 
@@ -73,12 +227,15 @@ class ProductResource(Resource):
                 return {'error': 'Product not found'}, 404
                 
             # Return the updated product
-            schema = ProductSchema()
-            return schema.dump(updated_product), 200
+            with span('serialize', 'dump_product'):
+                body = dump_product(updated_product)
+            return body, 200
         except ValidationError as e:
             return {'error': e.messages}, 400
+        except ThrottleWaitExceeded as e:
+            return throttled_response(e)
         except Exception as e:
-            print(traceback.format_exc())
+            logger.exception('Request failed: %s %s', request.method, request.path)
             return {'error': str(e)}, 500
 
     @jwt_required()
@@ -95,6 +252,8 @@ class ProductResource(Resource):
                 return {'error': 'Product not found'}, 404
                 
             return '', 204
+        except ThrottleWaitExceeded as e:
+            return throttled_response(e)
         except Exception as e:
             return {'error': str(e)}, 500
 
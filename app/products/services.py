@@ -8,6 +8,9 @@ from app import db
 from app.events.models import Event
 from flask import request
 from datetime import datetime
+from app.utils.event_sink import get_event_sink
+from app.events.services import insert_events, notify_events_committed
+from app.events.rollups import update_rollups
 
 
 def log_product_event(event_type, product_id, user_id=None):
@@ -18,6 +21,16 @@ def log_product_event(event_type, product_id, user_id=None):
                 # In a real app, this might come from authentication
                 user_id = request.headers.get('User-ID', 'system')
             
+            # Hand off to the background writer when it is running
+            sink = get_event_sink()
+            if sink is not None:
+                return sink.enqueue({
+                    'event_type': event_type,
+                    'user_id': user_id,
+                    'product_id': product_id,
+                    'timestamp': datetime.utcnow()
+                })
+
             # Create new event record
             new_event = Event(
                 event_type=event_type,
@@ -27,11 +40,53 @@ def log_product_event(event_type, product_id, user_id=None):
             )
             # Add and commit to database
             db.session.add(new_event)
+            row = {
+                'event_type': event_type,
+                'user_id': user_id,
+                'product_id': product_id,
+                'timestamp': new_event.timestamp
+            }
+            update_rollups(db.session, [row])
             db.session.commit()
+            notify_events_committed([row])
             
             return True
         except Exception as e:
             current_app.logger.error(f"Failed to log event: {str(e)}")
             db.session.rollback()
             return False
-        
\ No newline at end of file
+        
+
+def log_product_events(event_type, product_ids, user_id=None):
+        """Log one event per product with a single multi-row INSERT"""
+        try:
+            if user_id is None:
+                user_id = request.headers.get('User-ID', 'system')
+
+            if not product_ids:
+                return True
+
+            now = datetime.utcnow()
+            rows = [
+                {
+                    'event_type': event_type,
+                    'user_id': user_id,
+                    'product_id': product_id,
+                    'timestamp': now
+                }
+                for product_id in product_ids
+            ]
+
+            sink = get_event_sink()
+            if sink is not None:
+                return sink.enqueue_many(rows) == len(rows)
+
+            insert_events(db.session, rows)
+            db.session.commit()
+            notify_events_committed(rows)
+
+            return True
+        except Exception as e:
+            current_app.logger.error(f"Failed to log events: {str(e)}")
+            db.session.rollback()
+            return False
@@ -1,5 +1,12 @@
+import logging
+from datetime import datetime
 from app.events.models import Event
 from app.extensions import db
+from app.utils.event_sink import get_event_sink
+from app.events.rollups import update_rollups
+from app.events.services import notify_events_committed
+
+logger = logging.getLogger(__name__)
 
 def log_event(event_type, user_id, product_id):
     """
@@ -11,24 +18,45 @@ def log_event(event_type, user_id, product_id):
         product_id (str): ID of the product involved
     
     Returns:
-        Event: The created event object
+        Event: The created event object (not yet persisted, so without an
+        event_id, when the background event sink is enabled)
     """
     try:
         # Create a new event
         event = Event(
             event_type=event_type,
             user_id=user_id,
-            product_id=product_id
+            product_id=product_id,
+            timestamp=datetime.utcnow()
         )
         
+        # Hand off to the background writer when it is running
+        sink = get_event_sink()
+        if sink is not None:
+            if not sink.enqueue(event_row(event)):
+                return None
+            return event
+        
         # Save to database
         db.session.add(event)
+        update_rollups(db.session, [event_row(event)])
         db.session.commit()
+        notify_events_committed([event_row(event)])
         
         return event
     except Exception as e:
         # Rollback the session in case of any error
         db.session.rollback()
         # Log the error but don't raise it to avoid breaking the main flow
-        print(f"Failed to log event: {str(e)}")
-        return None 
\ No newline at end of file
+        logger.error(f"Failed to log event: {str(e)}")
+        return None
+
+
+def event_row(event):
+    """Column values of an Event for bulk writes"""
+    return {
+        'event_type': event.event_type,
+        'user_id': event.user_id,
+        'product_id': event.product_id,
+        'timestamp': event.timestamp
+    }
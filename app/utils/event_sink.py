@@ -0,0 +1,219 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Dict, List, Optional
+from sqlalchemy.exc import DataError, IntegrityError
+from app.events.services import insert_events, notify_events_committed
+
+try:
+    import psycopg2
+except ImportError:  # pragma: no cover - COPY needs psycopg2 anyway
+    psycopg2 = None
+
+logger = logging.getLogger(__name__)
+
+# Failures caused by the rows themselves (COPY raises the driver's own errors)
+ROW_ERRORS = (DataError, IntegrityError)
+if psycopg2 is not None:
+    ROW_ERRORS += (psycopg2.DataError, psycopg2.IntegrityError)
+
+BLOCK = 'block'
+DROP = 'drop'
+
+# The sink used by log_event/log_product_event (None = write synchronously)
+event_sink = None
+
+
+class EventSink:
+    """
+    Background writer for identifier_events.
+
+    Request threads enqueue rows into a bounded queue and return at once. A
+    writer thread flushes them in one statement (multi-row INSERT or COPY)
+    when `batch_size` rows are pending or the oldest pending row is
+    `max_age` seconds old. When the queue is full, the 'block' policy waits
+    up to `block_timeout` seconds and then drops; the 'drop' policy drops
+    the row immediately.
+
+    A flush rejected because of its data is split in halves until only the
+    offending rows are dropped; any other failure (e.g. a lost connection)
+    is retried `retries` times with exponential backoff from `retry_delay`.
+    """
+
+    def __init__(self, engine, batch_size: int = 500, max_age: float = 1.0, max_queue: int = 10000,
+                 policy: str = BLOCK, block_timeout: float = 0.5, method: str = 'insert',
+                 retries: int = 3, retry_delay: float = 0.5):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.max_age = max_age
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.method = method
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._started_at = time.monotonic()
+        self._stats = {
+            'enqueued': 0,
+            'dropped': 0,
+            'flushes': 0,
+            'flushed_rows': 0,
+            'failed_rows': 0,
+            'retries': 0,
+            'split_flushes': 0,
+            'flush_seconds_total': 0.0,
+            'flush_seconds_max': 0.0,
+            'flush_seconds_last': 0.0
+        }
+
+    def _ensure_started(self):
+        # Start lazily and again after a fork, since threads don't survive it
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='event-sink', daemon=True)
+            self._thread.start()
+
+    def enqueue(self, row: Dict) -> bool:
+        """Queue one event row; returns False if it was dropped"""
+        self._ensure_started()
+        try:
+            if self.policy == BLOCK:
+                self._queue.put(row, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(row)
+        except queue.Full:
+            with self._stats_lock:
+                self._stats['dropped'] += 1
+            return False
+        with self._stats_lock:
+            self._stats['enqueued'] += 1
+        return True
+
+    def enqueue_many(self, rows: List[Dict]) -> int:
+        """Queue several rows; returns how many were accepted"""
+        return sum(1 for row in rows if self.enqueue(row))
+
+    def _run(self):
+        while not self._stop.is_set() or not self._queue.empty():
+            batch = self._collect()
+            if batch:
+                self._flush(batch)
+
+    def _collect(self) -> List[Dict]:
+        """Gather rows until the batch is full or its first row reaches max_age"""
+        try:
+            batch = [self._queue.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + self.max_age
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or (self._stop.is_set() and self._queue.empty()):
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch: List[Dict], attempt: int = 0):
+        started = time.perf_counter()
+        try:
+            with self.engine.begin() as connection:
+                insert_events(connection, batch, self.method)
+        except ROW_ERRORS as e:
+            if len(batch) == 1:
+                logger.error(f"Dropped an event the database rejected: {str(e)}")
+                with self._stats_lock:
+                    self._stats['failed_rows'] += 1
+                return
+            # Keep the good rows: retry each half on its own
+            with self._stats_lock:
+                self._stats['split_flushes'] += 1
+            middle = len(batch) // 2
+            self._flush(batch[:middle])
+            self._flush(batch[middle:])
+            return
+        except Exception as e:
+            if attempt < self.retries:
+                logger.warning(f"Failed to flush {len(batch)} events, retrying: {str(e)}")
+                with self._stats_lock:
+                    self._stats['retries'] += 1
+                time.sleep(self.retry_delay * 2 ** attempt)
+                self._flush(batch, attempt + 1)
+                return
+            logger.error(f"Failed to flush {len(batch)} events: {str(e)}")
+            with self._stats_lock:
+                self._stats['failed_rows'] += len(batch)
+            return
+
+        elapsed = time.perf_counter() - started
+        with self._stats_lock:
+            self._stats['flushes'] += 1
+            self._stats['flushed_rows'] += len(batch)
+            self._stats['flush_seconds_total'] += elapsed
+            self._stats['flush_seconds_max'] = max(self._stats['flush_seconds_max'], elapsed)
+            self._stats['flush_seconds_last'] = elapsed
+
+        notify_events_committed(batch)
+
+    def close(self, timeout: float = 10.0):
+        """Flush everything still queued and stop the writer"""
+        self._stop.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+
+    def stats(self) -> Dict:
+        """Queue depth, flush latency and throughput"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        uptime = time.monotonic() - self._started_at
+        stats.update({
+            'queue_depth': self._queue.qsize(),
+            'queue_capacity': self._queue.maxsize,
+            'policy': self.policy,
+            'method': self.method,
+            'flush_seconds_avg': stats['flush_seconds_total'] / stats['flushes'] if stats['flushes'] else 0.0,
+            'write_rows_per_second': stats['flushed_rows'] / stats['flush_seconds_total'] if stats['flush_seconds_total'] else 0.0,
+            'rows_per_second': stats['flushed_rows'] / uptime if uptime else 0.0
+        })
+        return stats
+
+
+def init_event_sink(app, engine) -> Optional[EventSink]:
+    """Create the background event sink from app config (EVENT_SINK_ENABLED)"""
+    global event_sink
+    if not app.config.get('EVENT_SINK_ENABLED', False):
+        return None
+
+    event_sink = EventSink(
+        engine,
+        batch_size=app.config.get('EVENT_SINK_BATCH_SIZE', 500),
+        max_age=app.config.get('EVENT_SINK_MAX_AGE', 1.0),
+        max_queue=app.config.get('EVENT_SINK_MAX_QUEUE', 10000),
+        policy=app.config.get('EVENT_SINK_POLICY', BLOCK),
+        block_timeout=app.config.get('EVENT_SINK_BLOCK_TIMEOUT', 0.5),
+        method=app.config.get('EVENT_SINK_METHOD', 'insert'),
+        retries=app.config.get('EVENT_SINK_RETRIES', 3),
+        retry_delay=app.config.get('EVENT_SINK_RETRY_DELAY', 0.5)
+    )
+    atexit.register(event_sink.close)
+    return event_sink
+
+
+def get_event_sink() -> Optional[EventSink]:
+    return event_sink
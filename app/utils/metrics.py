@@ -0,0 +1,156 @@
+import os
+import time
+
+from flask import Response, g, has_request_context, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess, REGISTRY
+)
+from pymongo import monitoring
+from sqlalchemy import event
+from app.utils.profiling import add_span
+
+# Prometheus metrics. With PROMETHEUS_MULTIPROC_DIR set (required when
+# running several worker processes) every process writes its samples to
+# that directory and /metrics aggregates all of them.
+MULTIPROCESS = bool(os.getenv('PROMETHEUS_MULTIPROC_DIR'))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+POSTGRES = 'postgres'
+MONGO = 'mongo'
+SHOPIFY = 'shopify'
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Request latency per API resource',
+    ['resource', 'method', 'status'], buckets=LATENCY_BUCKETS
+)
+REQUEST_DEPENDENCY_TIME = Histogram(
+    'http_request_dependency_seconds', 'Time one request spent in a dependency',
+    ['resource', 'method', 'dependency'], buckets=LATENCY_BUCKETS
+)
+REQUEST_DEPENDENCY_CALLS = Histogram(
+    'http_request_dependency_calls', 'Calls one request made to a dependency',
+    ['resource', 'method', 'dependency'], buckets=COUNT_BUCKETS
+)
+SHOPIFY_LATENCY = Histogram(
+    'shopify_request_duration_seconds', 'Shopify GraphQL call latency per operation',
+    ['operation'], buckets=LATENCY_BUCKETS
+)
+SHOPIFY_ERRORS = Counter(
+    'shopify_request_errors_total', 'Failed Shopify GraphQL calls per operation', ['operation']
+)
+QUERY_LATENCY = Histogram(
+    'db_query_duration_seconds', 'Database query latency',
+    ['backend', 'operation'], buckets=LATENCY_BUCKETS
+)
+
+
+def _track(dependency: str, elapsed: float, name: str):
+    """Add one dependency call to the current request's totals and timeline"""
+    if not has_request_context():
+        return
+    totals = g.setdefault('dependency_totals', {})
+    calls, seconds = totals.get(dependency, (0, 0.0))
+    totals[dependency] = (calls + 1, seconds + elapsed)
+    add_span(dependency, name, elapsed)
+
+
+def observe_shopify_call(operation: str, elapsed: float, failed: bool):
+    SHOPIFY_LATENCY.labels(operation).observe(elapsed)
+    if failed:
+        SHOPIFY_ERRORS.labels(operation).inc()
+    _track(SHOPIFY, elapsed, operation)
+
+
+def observe_query(backend: str, operation: str, elapsed: float, detail: str = None):
+    QUERY_LATENCY.labels(backend, operation).observe(elapsed)
+    _track(backend, elapsed, detail or operation)
+
+
+def instrument_engine(engine):
+    """Time every SQLAlchemy statement run on `engine`"""
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    def finish(conn, statement):
+        started = conn.info.get('query_started')
+        if started:
+            operation = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else 'unknown'
+            observe_query(POSTGRES, operation, time.perf_counter() - started.pop(), statement[:200])
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        finish(conn, statement)
+
+    @event.listens_for(engine, 'handle_error')
+    def handle_error(context):
+        finish(context.connection, context.statement or '')
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Times every MongoDB command (pymongo calls these on the issuing thread)"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        observe_query(MONGO, event.command_name, event.duration_micros / 1e6)
+
+    def failed(self, event):
+        observe_query(MONGO, event.command_name, event.duration_micros / 1e6)
+
+
+def instrument_mongo():
+    """Register the command listener; must run before the MongoClient is created"""
+    monitoring.register(MongoCommandListener())
+
+
+def _resource() -> str:
+    return request.endpoint or 'unmatched'
+
+
+def registry() -> CollectorRegistry:
+    if not MULTIPROCESS:
+        return REGISTRY
+    collector_registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(collector_registry)
+    return collector_registry
+
+
+def init_metrics(app):
+    """Time every request and serve the metrics at /metrics"""
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop('request_started', None)
+        if started is None:
+            return response
+        resource, method = _resource(), request.method
+        if resource == 'metrics':
+            return response
+        REQUEST_LATENCY.labels(resource, method, str(response.status_code)).observe(
+            time.perf_counter() - started
+        )
+        totals = g.pop('dependency_totals', {})
+        for dependency in (POSTGRES, MONGO, SHOPIFY):
+            calls, seconds = totals.get(dependency, (0, 0.0))
+            REQUEST_DEPENDENCY_CALLS.labels(resource, method, dependency).observe(calls)
+            REQUEST_DEPENDENCY_TIME.labels(resource, method, dependency).observe(seconds)
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(generate_latest(registry()), headers={'Content-Type': CONTENT_TYPE_LATEST})
+
+
+def mark_process_dead(pid: int):
+    """Call from the server's worker-exit hook (e.g. gunicorn child_exit)"""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,147 @@
+import cProfile
+import hmac
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask import g, has_request_context, request
+
+logger = logging.getLogger(__name__)
+
+# Only one deterministic profiler can run per process at a time
+_profile_lock = threading.Lock()
+
+
+def add_span(kind: str, name: str, elapsed: float):
+    """Record a finished call (Shopify, DB, serialization) on the current request's timeline"""
+    if not has_request_context():
+        return
+    spans = g.get('spans')
+    if spans is not None:
+        spans.append((kind, name, time.perf_counter() - elapsed, elapsed))
+
+
+@contextmanager
+def span(kind: str, name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_span(kind, name, time.perf_counter() - started)
+
+
+def _file_stem(endpoint: str) -> str:
+    stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')
+    return f"{stamp}-{endpoint or 'unmatched'}-{os.getpid()}"
+
+
+def write_timeline(directory: str, started: float, elapsed: float, status: int, spans) -> str:
+    """
+    Write a slow request as a Chrome trace (open in chrome://tracing or
+    https://ui.perfetto.dev): one event for the request, one per span
+    """
+    tid = threading.get_ident()
+    events = [{
+        'name': f'{request.method} {request.path}', 'cat': 'request', 'ph': 'X',
+        'ts': 0, 'dur': round(elapsed * 1e6), 'pid': os.getpid(), 'tid': tid,
+        'args': {'endpoint': request.endpoint, 'status': status, 'query': request.query_string.decode('latin-1')}
+    }]
+    for kind, name, span_started, span_elapsed in spans:
+        events.append({
+            'name': name, 'cat': kind, 'ph': 'X',
+            'ts': round((span_started - started) * 1e6), 'dur': round(span_elapsed * 1e6),
+            'pid': os.getpid(), 'tid': tid
+        })
+
+    path = os.path.join(directory, _file_stem(request.endpoint) + '.trace.json')
+    with open(path, 'w') as fh:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, fh, separators=(',', ':'))
+    return path
+
+
+def init_profiling(app):
+    """
+    Register the profiling hooks from app config; registers nothing when
+    both profiling and slow-request capture are off.
+
+    - PROFILING_ENABLED: run a request under cProfile when it carries
+      PROFILING_HEADER with the PROFILING_TOKEN value, or for a
+      PROFILING_SAMPLE_RATE fraction of requests; the .prof file (pstats
+      format) goes to PROFILING_DIR and its name is returned in
+      X-Profile-File.
+    - SLOW_REQUEST_THRESHOLD_MS > 0: requests slower than this are written
+      to PROFILING_DIR as a timeline of their Shopify calls, DB statements
+      and serialization.
+    """
+    profiling_enabled = app.config.get('PROFILING_ENABLED', False)
+    threshold = app.config.get('SLOW_REQUEST_THRESHOLD_MS', 0) / 1000.0
+    if not profiling_enabled and threshold <= 0:
+        return
+
+    directory = app.config.get('PROFILING_DIR', 'profiles')
+    os.makedirs(directory, exist_ok=True)
+    header = app.config.get('PROFILING_HEADER', 'X-Profile')
+    token = app.config.get('PROFILING_TOKEN', '')
+    sample_rate = app.config.get('PROFILING_SAMPLE_RATE', 0.0)
+
+    def wants_profile() -> bool:
+        value = request.headers.get(header)
+        if token and value and hmac.compare_digest(value, token):
+            return True
+        return sample_rate > 0 and random.random() < sample_rate
+
+    @app.before_request
+    def start_profiling():
+        g.profiling_started = time.perf_counter()
+        if threshold > 0:
+            g.spans = []
+        if profiling_enabled and wants_profile() and _profile_lock.acquire(blocking=False):
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiler (e.g. a debugger) is active on this thread
+                _profile_lock.release()
+                return
+            g.profiler = profiler
+
+    @app.after_request
+    def finish_profiling(response):
+        started = g.pop('profiling_started', None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            _profile_lock.release()
+            try:
+                path = os.path.join(directory, _file_stem(request.endpoint) + '.prof')
+                profiler.dump_stats(path)
+                response.headers['X-Profile-File'] = os.path.basename(path)
+            except OSError as e:
+                logger.error(f"Failed to write profile: {str(e)}")
+
+        spans = g.pop('spans', None)
+        if spans is not None and elapsed >= threshold:
+            try:
+                path = write_timeline(directory, started, elapsed, response.status_code, spans)
+                logger.warning('Slow request %s %s took %.0f ms, timeline in %s',
+                               request.method, request.path, elapsed * 1000, path)
+            except OSError as e:
+                logger.error(f"Failed to write slow request timeline: {str(e)}")
+        return response
+
+    @app.teardown_request
+    def release_profiler(exc):
+        # after_request is skipped on unhandled errors; don't leave the profiler running
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            _profile_lock.release()
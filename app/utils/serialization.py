@@ -0,0 +1,143 @@
+import json
+import logging
+import uuid
+from datetime import date, datetime, time
+from decimal import Decimal
+from functools import partial
+from typing import Callable, Dict, Type
+
+from flask import current_app, make_response
+from marshmallow import Schema, fields, missing
+from app.utils.profiling import span
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup, stdlib json is used instead
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+ORJSON = 'orjson'
+STDLIB = 'json'
+
+
+def _default(value):
+    """Types json can't encode natively; orjson only needs Decimal"""
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def _orjson_dumps(data, pretty: bool, newline: bool = True) -> bytes:
+    # Datetimes, dates and UUIDs are encoded natively, in isoformat()
+    option = orjson.OPT_NON_STR_KEYS
+    if newline:
+        option |= orjson.OPT_APPEND_NEWLINE
+    if pretty:
+        option |= orjson.OPT_INDENT_2
+    return orjson.dumps(data, default=_default, option=option)
+
+
+def _stdlib_dumps(data, pretty: bool, newline: bool = True) -> bytes:
+    settings = dict(current_app.config.get('RESTX_JSON') or {})
+    if pretty:
+        settings.setdefault('indent', 4)
+    settings.setdefault('default', _default)
+    return (json.dumps(data, **settings) + ('\n' if newline else '')).encode('utf-8')
+
+
+def resolve_backend(name: str = 'auto') -> str:
+    """'auto' picks orjson when it is installed; an unavailable orjson falls back to json"""
+    name = (name or 'auto').lower()
+    if name in ('auto', ORJSON):
+        if orjson is not None:
+            return ORJSON
+        if name == ORJSON:
+            logger.warning('JSON_BACKEND=orjson but orjson is not installed; using json')
+        return STDLIB
+    if name != STDLIB:
+        raise ValueError(f'Unknown JSON backend: {name}')
+    return STDLIB
+
+
+def dumps(data, backend: str = 'auto', pretty: bool = False, newline: bool = True) -> bytes:
+    """Encode a response body (or, without the newline, one piece of it) with the given backend"""
+    if resolve_backend(backend) == ORJSON:
+        return _orjson_dumps(data, pretty, newline)
+    return _stdlib_dumps(data, pretty, newline)
+
+
+def json_representation(backend: str = 'auto') -> Callable:
+    """
+    Build a flask-restx representation for application/json.
+
+    Register it with api.representation('application/json'). Bodies are
+    pretty-printed in debug mode, like flask-restx's own output_json, and
+    encoding is timed as a serialization span for slow-request capture.
+    """
+    encode = _orjson_dumps if resolve_backend(backend) == ORJSON else _stdlib_dumps
+
+    def output_json(data, code, headers=None):
+        with span('serialize', 'json'):
+            body = encode(data, current_app.debug)
+        response = make_response(body, code)
+        response.headers.extend(headers or {})
+        return response
+
+    output_json.backend = resolve_backend(backend)
+    return output_json
+
+
+# Field types whose dump is a plain cast of the attribute value
+_CASTS = {
+    fields.String: str,
+    fields.Float: float,
+    fields.Integer: int
+}
+
+
+def _has_dump_hooks(schema: Schema) -> bool:
+    return any(
+        names and (tag[0] if isinstance(tag, tuple) else tag) in ('pre_dump', 'post_dump')
+        for tag, names in getattr(schema, '_hooks', {}).items()
+    )
+
+
+def compile_dumper(schema_class: Type[Schema]) -> Callable[[object], Dict]:
+    """
+    Precompile schema_class().dump for dicts and plain objects.
+
+    Flat schemas of String/Float/Integer fields without defaults, nested
+    attributes or dump hooks become a single loop over (key, attribute, cast) triples, with the
+    same output as marshmallow: absent keys are omitted and None stays None.
+    Any other schema gets one shared instance's dump.
+    """
+    schema = schema_class()
+    plan = []
+    for name, field in schema.dump_fields.items():
+        cast = _CASTS.get(type(field))
+        attribute = field.attribute or name
+        if (cast is None or field.dump_default is not missing or getattr(field, 'as_string', False)
+                or '.' in attribute):
+            plan = None
+            break
+        plan.append((field.data_key or name, attribute, cast))
+
+    if plan is None or _has_dump_hooks(schema):
+        return schema.dump
+
+    def dump(obj) -> Dict:
+        get = obj.get if isinstance(obj, dict) else partial(getattr, obj)
+        result = {}
+        for key, attribute, cast in plan:
+            value = get(attribute, missing)
+            if value is missing:
+                continue
+            result[key] = None if value is None else cast(value)
+        return result
+
+    return dump
@@ -1,12 +1,34 @@
+import logging
 import os
+import re
 import json
+import time
+import threading
 import requests
-from typing import Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import DefaultCookiePolicy
+from requests.adapters import HTTPAdapter
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 from dotenv import load_dotenv
+from app.utils.shopify_throttle import CostBucket, ThrottleWaitExceeded
+from app.utils.metrics import observe_shopify_call
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
 
+# Shopify caps connection page sizes at 250 nodes
+MAX_PAGE_SIZE = 250
+
+OPERATION_NAME_RE = re.compile(r'\b(?:query|mutation)\s+(\w+)')
+
+
+def operation_name(query: str) -> str:
+    """Return the GraphQL operation name of a query document"""
+    match = OPERATION_NAME_RE.search(query)
+    return match.group(1) if match else 'anonymous'
+
 class ShopifyAPI:
     def __init__(self):
         self.shop_name = os.getenv('SHOPIFY_SHOP_NAME')
@@ -18,51 +40,234 @@ class ShopifyAPI:
         if not self.access_token:
             raise ValueError("SHOPIFY_ACCESS_TOKEN environment variable is not set")
             
-        self.base_url = f'https://{self.shop_name}.myshopify.com/admin/api/{self.api_version}/graphql.json'
+        # SHOPIFY_API_URL points the client at another GraphQL endpoint
+        # (e.g. the fake server used by the benchmarks)
+        self.base_url = os.getenv('SHOPIFY_API_URL') or (
+            f'https://{self.shop_name}.myshopify.com/admin/api/{self.api_version}/graphql.json'
+        )
         self.headers = {
             'X-Shopify-Access-Token': self.access_token,
             'Content-Type': 'application/json',
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive',
         }
 
-    def _make_request(self, query: str, variables: Optional[Dict] = None) -> Dict:
-        """Make a GraphQL request to Shopify"""
+        # Connection pool settings (one pool per worker, shared by all threads)
+        self.pool_connections = int(os.getenv('SHOPIFY_POOL_CONNECTIONS', 4))
+        self.pool_maxsize = int(os.getenv('SHOPIFY_POOL_MAXSIZE', 10))
+        self.pool_block = os.getenv('SHOPIFY_POOL_BLOCK', 'false').lower() == 'true'
+        self.timeout = (
+            float(os.getenv('SHOPIFY_CONNECT_TIMEOUT', 3.05)),
+            float(os.getenv('SHOPIFY_READ_TIMEOUT', 30))
+        )
+
+        # Batch lookups: IDs per nodes() query and concurrent chunks
+        self.nodes_chunk_size = int(os.getenv('SHOPIFY_NODES_CHUNK_SIZE', 50))
+        self.fanout_workers = int(os.getenv('SHOPIFY_FANOUT_WORKERS', 4))
+
+        # Catalog pagination settings (0 max pages means follow every page)
+        self.page_size = min(int(os.getenv('SHOPIFY_PAGE_SIZE', 100)), MAX_PAGE_SIZE)
+        self.max_pages = int(os.getenv('SHOPIFY_MAX_PAGES', 0))
+
+        # Client-side leaky bucket; set SHOPIFY_THROTTLE_STATE_FILE to share
+        # it between the worker processes on a host
+        self.throttle = CostBucket(
+            state_file=os.getenv('SHOPIFY_THROTTLE_STATE_FILE') or None,
+            max_wait=float(os.getenv('SHOPIFY_THROTTLE_MAX_WAIT', 30))
+        )
+        self.throttle_max_retries = int(os.getenv('SHOPIFY_THROTTLE_MAX_RETRIES', 5))
+
+        self._session_lock = threading.Lock()
+        self._session = None
+
+        # Per-operation call count and latency
+        self._call_stats_lock = threading.Lock()
+        self._call_stats = {}
+
+    @property
+    def session(self) -> requests.Session:
+        """Lazily build the pooled keep-alive session shared by this client"""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = self._build_session()
+        return self._session
+
+    def _build_session(self) -> requests.Session:
+        """Create a requests Session backed by a sized urllib3 connection pool"""
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=self.pool_block
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update(self.headers)
+        # Cookies are the only mutable per-session state, so keep the jar empty
+        # to make the session safe to share across request threads
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        return session
+
+    def pool_stats(self) -> Dict:
+        """Report connection pool usage: requests sent vs. new connections opened"""
+        stats = {'requests': 0, 'connections_opened': 0, 'pool_hits': 0, 'pool_misses': 0}
+        if self._session is None:
+            return stats
+
+        seen = set()
+        for adapter in self._session.adapters.values():
+            if id(adapter) in seen:
+                continue
+            seen.add(id(adapter))
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                stats['requests'] += pool.num_requests
+                stats['connections_opened'] += pool.num_connections
+
+        stats['pool_misses'] = stats['connections_opened']
+        stats['pool_hits'] = max(stats['requests'] - stats['connections_opened'], 0)
+        return stats
+
+    def _record_call(self, operation: str, elapsed: float, failed: bool):
+        with self._call_stats_lock:
+            stats = self._call_stats.setdefault(operation, {
+                'count': 0, 'errors': 0, 'total_seconds': 0.0, 'max_seconds': 0.0
+            })
+            stats['count'] += 1
+            stats['errors'] += int(failed)
+            stats['total_seconds'] += elapsed
+            stats['max_seconds'] = max(stats['max_seconds'], elapsed)
+        observe_shopify_call(operation, elapsed, failed)
+
+    def call_stats(self) -> Dict:
+        """Report call count and latency per GraphQL operation name"""
+        with self._call_stats_lock:
+            return {
+                operation: dict(stats, avg_seconds=stats['total_seconds'] / stats['count'])
+                for operation, stats in self._call_stats.items()
+            }
+
+    def close(self):
+        """Close all pooled connections"""
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    @staticmethod
+    def _is_throttled(data: Dict) -> bool:
+        return any(
+            (error.get('extensions') or {}).get('code') == 'THROTTLED'
+            for error in data.get('errors') or []
+        )
+
+    def _make_request(
+        self,
+        query: str,
+        variables: Optional[Dict] = None,
+        timeout: Optional[Union[float, Tuple[float, float]]] = None
+    ) -> Dict:
+        """
+        Make a GraphQL request to Shopify over the pooled session.
+
+        The call first reserves its estimated cost from the throttle bucket,
+        and THROTTLED responses are retried with backoff.
+        """
+        operation = operation_name(query)
+        estimated_cost = self.throttle.estimate(
+            operation, variables, is_mutation=query.lstrip().startswith('mutation')
+        )
+        started = time.perf_counter()
+        failed = True
         try:
             payload = {
                 'query': query,
                 'variables': variables or {}
             }
             
-            response = requests.post(self.base_url, json=payload, headers=self.headers)
-            
-            # Check for HTTP errors
-            if response.status_code == 401:
-                raise Exception("Unauthorized: Invalid Shopify access token or shop name")
-            elif response.status_code == 404:
-                raise Exception(f"Shop not found: {self.shop_name}")
-            elif response.status_code != 200:
-                raise Exception(f"Shopify API error: {response.status_code} - {response.text}")
-            
-            data = response.json()
-            
-            # Check for GraphQL errors
-            if 'errors' in data:
-                error_message = data['errors'][0]['message']
-                raise Exception(f"Shopify GraphQL error: {error_message}")
+            attempt = 0
+            while True:
+                self.throttle.acquire(estimated_cost)
+                
+                response = self.session.post(
+                    self.base_url,
+                    json=payload,
+                    timeout=timeout or self.timeout
+                )
+                
+                # Check for HTTP errors
+                if response.status_code == 401:
+                    raise Exception("Unauthorized: Invalid Shopify access token or shop name")
+                elif response.status_code == 404:
+                    raise Exception(f"Shop not found: {self.shop_name}")
+                elif response.status_code not in (200, 429):
+                    raise Exception(f"Shopify API error: {response.status_code} - {response.text}")
+                
+                data = response.json() if response.status_code == 200 else {}
+                
+                cost = (data.get('extensions') or {}).get('cost')
+                if cost:
+                    self.throttle.settle(operation, cost)
+                    estimated_cost = self.throttle.estimate(operation)
+                
+                if response.status_code == 429 or self._is_throttled(data):
+                    if attempt >= self.throttle_max_retries:
+                        raise Exception("Shopify GraphQL error: Throttled")
+                    time.sleep(self.throttle.backoff(attempt, estimated_cost))
+                    attempt += 1
+                    continue
                 
-            return data
+                # Check for GraphQL errors
+                if 'errors' in data:
+                    error_message = data['errors'][0]['message']
+                    raise Exception(f"Shopify GraphQL error: {error_message}")
+                    
+                failed = False
+                return data
             
         except requests.exceptions.RequestException as e:
             raise Exception(f"Failed to connect to Shopify: {str(e)}")
         except json.JSONDecodeError as e:
             raise Exception(f"Invalid response from Shopify: {str(e)}")
+        except ThrottleWaitExceeded:
+            raise
         except Exception as e:
             raise Exception(f"Shopify API error: {str(e)}")
+        finally:
+            self._record_call(operation, time.perf_counter() - started, failed)
 
-    def get_products(self, first: int = 100) -> List[Dict]:
-        """Fetch products from Shopify"""
+    @staticmethod
+    def _format_product(product: Dict) -> Dict:
+        """Flatten a Shopify product node into our product structure"""
+        # Extract numeric ID from the GID
+        product_id = product['id'].split('/')[-1]
+
+        # Get variant data
+        variant = product['variants']['edges'][0]['node'] if product['variants']['edges'] else None
+        price = float(variant['price']) if variant else 0.0
+        sku = variant['sku'] if variant else ''
+
+        # Get image URL
+        image = product['images']['edges'][0]['node']['url'] if product['images']['edges'] else ''
+
+        return {
+            'shopify_id': product_id,
+            'title': product['title'],
+            'description': product['descriptionHtml'],
+            'price': price,
+            'sku': sku,
+            'image_url': image
+        }
+
+    def get_products_page(self, first: Optional[int] = None, after: Optional[str] = None) -> Dict:
+        """Fetch a single page of products starting after the given cursor"""
         query = """
-        query getProducts($first: Int!) {
-            products(first: $first) {
+        query getProducts($first: Int!, $after: String) {
+            products(first: $first, after: $after) {
                 edges {
                     node {
                         id
@@ -85,54 +290,106 @@ class ShopifyAPI:
                         }
                     }
                 }
+                pageInfo {
+                    hasNextPage
+                    endCursor
+                }
             }
         }
         """
-        
-        variables = {"first": first}
+
+        first = min(first or self.page_size, MAX_PAGE_SIZE)
+        variables = {"first": first, "after": after}
         result = self._make_request(query, variables)
-        
-        # Format the response to match the desired structure
-        products = []
-        for edge in result['data']['products']['edges']:
-            product = edge['node']
-            print("Product:", product)  # Debug print
-            print("Variants:", product['variants'])  # Debug print
-            
-            # Extract numeric ID from the GID
-            product_id = product['id'].split('/')[-1]
-            
-            # Get variant data
-            variant = product['variants']['edges'][0]['node'] if product['variants']['edges'] else None
-            print("Variant:", variant)  # Debug print
-            price = float(variant['price']) if variant else 0.0
-            sku = variant['sku'] if variant else ''
-            
-            # Get image URL
-            image = product['images']['edges'][0]['node']['url'] if product['images']['edges'] else ''
-            
-            formatted_product = {
-                'shopify_id': product_id,
-                'title': product['title'],
-                'description': product['descriptionHtml'],
-                'price': price,
-                'sku': sku,
-                'image_url': image
-            }
-            products.append(formatted_product)
-            
-        return products
+
+        products = result['data']['products']
+        page_info = products['pageInfo']
+
+        return {
+            'products': [self._format_product(edge['node']) for edge in products['edges']],
+            'has_next_page': page_info['hasNextPage'],
+            'end_cursor': page_info['endCursor']
+        }
+
+    def iter_product_pages(
+        self,
+        first: Optional[int] = None,
+        after: Optional[str] = None,
+        max_pages: Optional[int] = None
+    ) -> Iterator[Dict]:
+        """
+        Follow the products cursor page by page.
+
+        The next page is requested on a background thread while the caller
+        is still consuming the current one.
+        """
+        max_pages = self.max_pages if max_pages is None else max_pages
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='shopify-prefetch')
+        try:
+            future = executor.submit(self.get_products_page, first, after)
+            pages = 0
+            while future is not None:
+                page = future.result()
+                pages += 1
+
+                future = None
+                if page['has_next_page'] and (not max_pages or pages < max_pages):
+                    future = executor.submit(self.get_products_page, first, page['end_cursor'])
+
+                yield page
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def iter_products(
+        self,
+        first: Optional[int] = None,
+        after: Optional[str] = None,
+        max_pages: Optional[int] = None
+    ) -> Iterator[Dict]:
+        """Yield every product in the catalog, one at a time"""
+        for page in self.iter_product_pages(first, after, max_pages):
+            yield from page['products']
+
+    def get_products(self, first: Optional[int] = None, max_pages: Optional[int] = None) -> List[Dict]:
+        """Fetch all products from Shopify, following pagination"""
+        return list(self.iter_products(first=first, max_pages=max_pages))
 
     def create_product(self, product_data: Dict) -> Dict:
-        """Create a new product in Shopify with variants and images"""
-        # Step 1: Create the base product
+        """
+        Create a new product in Shopify with its variant and image.
+
+        The product, its default variant price/SKU and its media are sent in
+        a single productCreate mutation, and the response is built from the
+        mutation payload instead of re-querying the product.
+        """
         create_product_mutation = """
-        mutation productCreate($input: ProductInput!) {
-            productCreate(input: $input) {
+        mutation productCreate($input: ProductInput!, $media: [CreateMediaInput!]) {
+            productCreate(input: $input, media: $media) {
                 product {
                     id
                     title
                     descriptionHtml
+                    variants(first: 1) {
+                        edges {
+                            node {
+                                id
+                                price
+                                sku
+                            }
+                        }
+                    }
+                    media(first: 1) {
+                        edges {
+                            node {
+                                ... on MediaImage {
+                                    id
+                                    image {
+                                        url
+                                    }
+                                }
+                            }
+                        }
+                    }
                 }
                 userErrors {
                     field
@@ -145,37 +402,48 @@ class ShopifyAPI:
         product_variables = {
             "input": {
                 "title": product_data["title"],
-                "descriptionHtml": product_data.get("description", "")
-            }
+                "descriptionHtml": product_data.get("description", ""),
+                "variants": [{
+                    "price": str(product_data["price"]),
+                    "sku": product_data.get("sku", "")
+                }]
+            },
+            "media": None
         }
         
-        product_result = self._make_request(create_product_mutation, product_variables)
+        if product_data.get("image_url"):
+            product_variables["media"] = [{
+                "mediaContentType": "IMAGE",
+                "originalSource": product_data["image_url"]
+            }]
         
-        if product_result.get("errors"):
-            raise Exception(f"Shopify API Error: {product_result['errors'][0]['message']}")
-            
-        product_id = product_result["data"]["productCreate"]["product"]["id"]
+        result = self._make_request(create_product_mutation, product_variables)
+        payload = result["data"]["productCreate"]
         
-        # Step 2: Create or update variant
-        create_variant_mutation = """
-        mutation productVariantUpdate($input: ProductVariantInput!) {
-            productVariantUpdate(input: $input) {
-                productVariant {
-                    id
-                    price
-                    sku
-                }
-                userErrors {
-                    field
-                    message
-                }
-            }
-        }
-        """
+        if payload.get("userErrors"):
+            raise Exception(f"Shopify API Error: {payload['userErrors'][0]['message']}")
+        
+        product = payload["product"]
+        variant = product['variants']['edges'][0]['node'] if product['variants']['edges'] else None
+        media = product['media']['edges'][0]['node'] if product['media']['edges'] else {}
         
-        print("Creating variant with data:", product_data)  # Debug print
+        # Media is processed asynchronously, so the CDN URL may not exist yet
+        image_url = (media.get('image') or {}).get('url') or product_data.get("image_url", '')
         
-        # First, get the existing variant ID
+        return {
+            'shopify_id': product['id'].split('/')[-1],
+            'title': product['title'],
+            'description': product['descriptionHtml'],
+            'price': float(variant['price']) if variant else float(product_data["price"]),
+            'sku': variant['sku'] if variant else product_data.get("sku", ''),
+            'image_url': image_url,
+            'variant_id': variant['id'] if variant else None,
+            'media_id': media.get('id'),
+            'image_source_url': product_data.get("image_url") or None
+        }
+
+    def _get_variant_id(self, product_gid: str) -> str:
+        """Look up the default variant ID of a product"""
         get_variant_query = """
         query getProductVariants($productId: ID!) {
             product(id: $productId) {
@@ -190,73 +458,64 @@ class ShopifyAPI:
         }
         """
         
-        variant_query_variables = {
-            "productId": product_id
-        }
-        
-        variant_query_result = self._make_request(get_variant_query, variant_query_variables)
-        variant_id = variant_query_result['data']['product']['variants']['edges'][0]['node']['id']
-        
-        variant_variables = {
-            "input": {
-                "id": variant_id,
-                "price": str(product_data["price"]),
-                "sku": product_data.get("sku", "")
-            }
-        }
-        
-        print("Variant variables:", variant_variables)  # Debug print
-        
-        variant_result = self._make_request(create_variant_mutation, variant_variables)
-        
-        print("Variant creation result:", variant_result)  # Debug print
-        
-        if variant_result.get("errors"):
-            raise Exception(f"Shopify API Error: {variant_result['errors'][0]['message']}")
-        
-        # Step 3: Add image if provided
-        if product_data.get("image_url"):
-            create_media_mutation = """
-            mutation productCreateMedia($productId: ID!, $media: [CreateMediaInput!]!) {
-                productCreateMedia(productId: $productId, media: $media) {
-                    media {
-                        ... on MediaImage {
-                            id
-                            image {
-                                url
-                            }
-                        }
-                    }
-                    userErrors {
-                        field
-                        message
-                    }
-                }
-            }
-            """
-            
-            media_variables = {
-                "productId": product_id,
-                "media": [{
-                    "mediaContentType": "IMAGE",
-                    "originalSource": product_data["image_url"]
-                }]
-            }
-            
-            media_result = self._make_request(create_media_mutation, media_variables)
-            
-            if media_result.get("errors"):
-                raise Exception(f"Shopify API Error: {media_result['errors'][0]['message']}")
-        
-        # Return the complete product data
-        return self.get_product(product_id)
-
-    def update_product(self, product_id: str, product_data: Dict) -> Dict:
-        """Update an existing product in Shopify"""
-        # Step 1: Update the base product
-        update_product_mutation = """
-        mutation productUpdate($input: ProductInput!) {
-            productUpdate(input: $input) {
+        result = self._make_request(get_variant_query, {"productId": product_gid})
+        return result['data']['product']['variants']['edges'][0]['node']['id']
+
+    def update_product(self, product_id: str, product_data: Dict, current: Optional[Dict] = None) -> Dict:
+        """
+        Update an existing product in Shopify.
+
+        `current` is the last known state of the product (the Mongo mirror,
+        including variant_id/media_id/image_source_url). Only the mutations
+        whose fields differ from it are sent, batched into one GraphQL
+        document named after them, and an unchanged payload makes no
+        upstream call. Without `current` every supplied field is written.
+        """
+        product_gid = f"gid://shopify/Product/{product_id}"
+        current = current or {}
+        
+        def changed(field, cast=str):
+            if field not in product_data or product_data[field] is None:
+                return False
+            if current.get(field) is None:
+                return True
+            return cast(product_data[field]) != cast(current[field])
+
+        product_changed = changed('title') or changed('description')
+        variant_changed = changed('price', float) or changed('sku')
+        # The mirror's image_url is the Shopify CDN URL after a refill, so
+        # compare with the URL the image was uploaded from
+        image_source = current.get('image_source_url') or current.get('image_url')
+        image_changed = bool(product_data.get('image_url')) and product_data['image_url'] != image_source
+        
+        variant_id = current.get('variant_id')
+        media_id = current.get('media_id')
+        
+        result = dict(current)
+        result['shopify_id'] = str(product_id)
+        
+        if not (product_changed or variant_changed or image_changed):
+            return result if current else self.get_product(product_id)
+        
+        if variant_changed and not variant_id:
+            variant_id = self._get_variant_id(product_gid)
+        
+        declarations = []
+        selections = []
+        mutations = []
+        variables = {}
+        
+        if product_changed:
+            product_input = {"id": product_gid}
+            if 'title' in product_data:
+                product_input["title"] = product_data["title"]
+            if 'description' in product_data:
+                product_input["descriptionHtml"] = product_data.get("description") or ""
+            declarations.append("$product: ProductInput!")
+            variables["product"] = product_input
+            mutations.append("productUpdate")
+            selections.append("""
+            productUpdate(input: $product) {
                 product {
                     id
                     title
@@ -266,27 +525,19 @@ class ShopifyAPI:
                     field
                     message
                 }
-            }
-        }
-        """
-        
-        product_variables = {
-            "input": {
-                "id": f"gid://shopify/Product/{product_id}",
-                "title": product_data["title"],
-                "descriptionHtml": product_data.get("description", "")
-            }
-        }
-        
-        product_result = self._make_request(update_product_mutation, product_variables)
-        
-        if product_result.get("errors"):
-            raise Exception(f"Shopify API Error: {product_result['errors'][0]['message']}")
-        
-        # Step 2: Update the variant
-        update_variant_mutation = """
-        mutation productVariantUpdate($input: ProductVariantInput!) {
-            productVariantUpdate(input: $input) {
+            }""")
+        
+        if variant_changed:
+            variant_input = {"id": variant_id}
+            if product_data.get("price") is not None:
+                variant_input["price"] = str(product_data["price"])
+            if product_data.get("sku") is not None:
+                variant_input["sku"] = product_data["sku"]
+            declarations.append("$variant: ProductVariantInput!")
+            variables["variant"] = variant_input
+            mutations.append("productVariantUpdate")
+            selections.append("""
+            productVariantUpdate(input: $variant) {
                 productVariant {
                     id
                     price
@@ -296,18 +547,108 @@ class ShopifyAPI:
                     field
                     message
                 }
-            }
-        }
-        """
-        
-        # Get the variant ID
-        get_variant_query = """
-        query getProductVariants($productId: ID!) {
-            product(id: $productId) {
-                variants(first: 1) {
-                    edges {
-                        node {
-                            id
+            }""")
+        
+        if image_changed:
+            declarations.append("$productId: ID!")
+            declarations.append("$media: [CreateMediaInput!]!")
+            variables["productId"] = product_gid
+            variables["media"] = [{
+                "mediaContentType": "IMAGE",
+                "originalSource": product_data["image_url"]
+            }]
+            # Replace the previous image instead of piling up duplicates
+            if media_id:
+                declarations.append("$oldMediaIds: [ID!]!")
+                variables["oldMediaIds"] = [media_id]
+                mutations.append("productDeleteMedia")
+                selections.append("""
+            productDeleteMedia(productId: $productId, mediaIds: $oldMediaIds) {
+                deletedMediaIds
+                mediaUserErrors {
+                    field
+                    message
+                }
+            }""")
+            mutations.append("productCreateMedia")
+            selections.append("""
+            productCreateMedia(productId: $productId, media: $media) {
+                media {
+                    ... on MediaImage {
+                        id
+                        image {
+                            url
+                        }
+                    }
+                }
+                mediaUserErrors {
+                    field
+                    message
+                }
+            }""")
+        
+        # Named after its mutations so metrics and learned costs are per combination
+        update_mutation = "mutation %s(%s) {%s\n        }" % (
+            "_".join(mutations), ", ".join(declarations), "".join(selections)
+        )
+        
+        data = self._make_request(update_mutation, variables)["data"]
+        
+        for key, payload in data.items():
+            errors = payload.get("userErrors") or payload.get("mediaUserErrors")
+            if errors:
+                raise Exception(f"Shopify API Error: {errors[0]['message']}")
+        
+        if product_changed:
+            product = data["productUpdate"]["product"]
+            result['title'] = product['title']
+            result['description'] = product['descriptionHtml']
+        
+        if variant_changed:
+            variant = data["productVariantUpdate"]["productVariant"]
+            result['variant_id'] = variant['id']
+            result['price'] = float(variant['price'])
+            result['sku'] = variant['sku']
+        
+        if image_changed:
+            media = (data["productCreateMedia"]["media"] or [{}])[0]
+            result['media_id'] = media.get('id')
+            result['image_source_url'] = product_data["image_url"]
+            # Media is processed asynchronously, so the CDN URL may not exist yet
+            result['image_url'] = (media.get('image') or {}).get('url') or product_data["image_url"]
+        
+        if not current:
+            # No last known state to merge into, so read back the full product
+            fetched = self.get_product(product_id)
+            fetched.update({
+                key: result[key] for key in ('variant_id', 'media_id', 'image_source_url') if result.get(key)
+            })
+            return fetched
+        
+        return result
+
+    def _get_products_chunk(self, product_gids: List[str]) -> List[Dict]:
+        """Fetch one chunk of products with a single nodes() query"""
+        query = """
+        query getProductsByIds($ids: [ID!]!) {
+            nodes(ids: $ids) {
+                ... on Product {
+                    id
+                    title
+                    descriptionHtml
+                    variants(first: 1) {
+                        edges {
+                            node {
+                                price
+                                sku
+                            }
+                        }
+                    }
+                    images(first: 1) {
+                        edges {
+                            node {
+                                url
+                            }
                         }
                     }
                 }
@@ -315,63 +656,153 @@ class ShopifyAPI:
         }
         """
         
-        variant_query_variables = {
-            "productId": f"gid://shopify/Product/{product_id}"
-        }
-        
-        variant_query_result = self._make_request(get_variant_query, variant_query_variables)
-        variant_id = variant_query_result['data']['product']['variants']['edges'][0]['node']['id']
-        
-        variant_variables = {
-            "input": {
-                "id": variant_id,
-                "price": str(product_data["price"]),
-                "sku": product_data.get("sku", "")
+        result = self._make_request(query, {"ids": product_gids})
+        # Unknown IDs come back as null nodes
+        return [self._format_product(node) for node in result['data']['nodes'] if node and node.get('id')]
+
+    def get_products_by_ids(self, product_ids: List[str]) -> Dict[str, Dict]:
+        """
+        Fetch many products by ID, keyed by numeric shopify_id.
+
+        IDs are split into nodes() queries of `nodes_chunk_size` to stay
+        within the query cost limit, and the chunks run concurrently.
+        """
+        product_gids = [
+            product_id if product_id.startswith("gid://") else f"gid://shopify/Product/{product_id}"
+            for product_id in product_ids
+        ]
+        chunks = [
+            product_gids[i:i + self.nodes_chunk_size]
+            for i in range(0, len(product_gids), self.nodes_chunk_size)
+        ]
+        
+        products = {}
+        if not chunks:
+            return products
+        
+        if len(chunks) == 1:
+            results = [self._get_products_chunk(chunks[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.fanout_workers, len(chunks)),
+                                    thread_name_prefix='shopify-fanout') as executor:
+                results = list(executor.map(self._get_products_chunk, chunks))
+        
+        for chunk in results:
+            for product in chunk:
+                products[product['shopify_id']] = product
+        return products
+
+    def start_bulk_products_export(self) -> str:
+        """Start a bulkOperationRunQuery exporting the catalog and return its ID"""
+        mutation = """
+        mutation bulkOperationRunQuery($query: String!) {
+            bulkOperationRunQuery(query: $query) {
+                bulkOperation {
+                    id
+                    status
+                }
+                userErrors {
+                    field
+                    message
+                }
             }
         }
+        """
         
-        variant_result = self._make_request(update_variant_mutation, variant_variables)
-        
-        if variant_result.get("errors"):
-            raise Exception(f"Shopify API Error: {variant_result['errors'][0]['message']}")
-        
-        # Step 3: Update image if provided
-        if product_data.get("image_url"):
-            # Create new image
-            create_media_mutation = """
-            mutation productCreateMedia($productId: ID!, $media: [CreateMediaInput!]!) {
-                productCreateMedia(productId: $productId, media: $media) {
-                    media {
-                        ... on MediaImage {
-                            id
-                            image {
-                                url
+        # Nested connections are emitted as separate JSONL lines with __parentId
+        bulk_query = """
+        {
+            products {
+                edges {
+                    node {
+                        id
+                        title
+                        descriptionHtml
+                        variants {
+                            edges {
+                                node {
+                                    id
+                                    price
+                                    sku
+                                }
+                            }
+                        }
+                        media {
+                            edges {
+                                node {
+                                    ... on MediaImage {
+                                        id
+                                        image {
+                                            url
+                                        }
+                                    }
+                                }
                             }
                         }
-                    }
-                    userErrors {
-                        field
-                        message
                     }
                 }
             }
-            """
-            
-            media_variables = {
-                "productId": f"gid://shopify/Product/{product_id}",
-                "media": [{
-                    "mediaContentType": "IMAGE",
-                    "originalSource": product_data["image_url"]
-                }]
+        }
+        """
+        
+        result = self._make_request(mutation, {"query": bulk_query})
+        payload = result["data"]["bulkOperationRunQuery"]
+        
+        if payload.get("userErrors"):
+            raise Exception(f"Shopify API Error: {payload['userErrors'][0]['message']}")
+        
+        return payload["bulkOperation"]["id"]
+
+    def get_bulk_operation(self, operation_id: str) -> Dict:
+        """Get the status of a bulk operation"""
+        query = """
+        query bulkOperationStatus($id: ID!) {
+            node(id: $id) {
+                ... on BulkOperation {
+                    id
+                    status
+                    errorCode
+                    objectCount
+                    url
+                }
             }
-            
-            media_result = self._make_request(create_media_mutation, media_variables)
-            
-            if media_result.get("errors"):
-                raise Exception(f"Shopify API Error: {media_result['errors'][0]['message']}")
+        }
+        """
         
-        # Return the updated product
-        return self.get_product(product_id)
+        result = self._make_request(query, {"id": operation_id})
+        return result["data"]["node"]
+
+    def wait_for_bulk_operation(self, operation_id: str, poll_interval: float = 2.0, timeout: float = 3600) -> Dict:
+        """Poll a bulk operation until it finishes and return its final state"""
+        deadline = time.monotonic() + timeout
+        while True:
+            operation = self.get_bulk_operation(operation_id)
+            if operation["status"] == "COMPLETED":
+                return operation
+            if operation["status"] in ("FAILED", "CANCELED", "EXPIRED"):
+                raise Exception(
+                    f"Bulk operation {operation_id} {operation['status'].lower()}: {operation.get('errorCode')}"
+                )
+            if time.monotonic() >= deadline:
+                raise Exception(f"Bulk operation {operation_id} did not finish within {timeout}s")
+            time.sleep(poll_interval)
+
+    def iter_jsonl(self, url: str) -> Iterator[bytes]:
+        """Stream the lines of a bulk operation result file without loading it whole"""
+        # The result lives on a storage host; never send it our access token
+        response = self.session.get(
+            url,
+            headers={'X-Shopify-Access-Token': None},
+            stream=True,
+            timeout=self.timeout
+        )
+        try:
+            response.raise_for_status()
+            for line in response.iter_lines(chunk_size=64 * 1024):
+                if line:
+                    yield line
+        finally:
+            response.close()
 
     def delete_product(self, product_id: str) -> Dict:
         """Delete a product from Shopify"""
@@ -440,27 +871,7 @@ class ShopifyAPI:
         if result.get("errors"):
             raise Exception(f"Shopify API Error: {result['errors'][0]['message']}")
         
-        product = result["data"]["product"]
-        
-        # Extract numeric ID from the GID
-        numeric_id = product['id'].split('/')[-1]
-        
-        # Get variant data
-        variant = product['variants']['edges'][0]['node'] if product['variants']['edges'] else None
-        price = float(variant['price']) if variant else 0.0
-        sku = variant['sku'] if variant else ''
-        
-        # Get image URL
-        image = product['images']['edges'][0]['node']['url'] if product['images']['edges'] else ''
-        
-        formatted_product = {
-            'shopify_id': numeric_id,
-            'title': product['title'],
-            'description': product['descriptionHtml'],
-            'price': price,
-            'sku': sku,
-            'image_url': image
-        }
+        formatted_product = self._format_product(result["data"]["product"])
         
-        print("Formatted product:", formatted_product)  # Debug print
+        logger.debug('Formatted product: %s', formatted_product)
         return formatted_product
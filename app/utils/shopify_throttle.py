@@ -0,0 +1,196 @@
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows has no flock, state stays per process
+    fcntl = None
+
+# Defaults for a standard Shopify plan; the real values are learned from
+# extensions.cost.throttleStatus on every response
+DEFAULT_MAXIMUM = 1000.0
+DEFAULT_RESTORE_RATE = 50.0
+DEFAULT_MUTATION_COST = 10.0
+# Longest single sleep of a waiting call, so a bucket size or restore rate
+# learned from another call's response is picked up
+WAIT_POLL_INTERVAL = 0.25
+
+
+class ThrottleWaitExceeded(Exception):
+    """Raised when a call has waited the configured limit and still can't be sent"""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        # Seconds until the bucket was expected to afford the call
+        self.retry_after = retry_after
+
+
+class CostBucket:
+    """
+    Client-side mirror of Shopify's GraphQL leaky bucket.
+
+    Calls reserve their estimated cost before being sent and sleep until the
+    bucket has restored enough points, for at most `max_wait` seconds before
+    giving up with ThrottleWaitExceeded. The bucket is corrected from the
+    throttleStatus Shopify returns. When `state_file` is set the bucket is
+    stored there under an exclusive flock so every worker process on the
+    host draws from the same budget.
+    """
+
+    def __init__(
+        self,
+        maximum: float = DEFAULT_MAXIMUM,
+        restore_rate: float = DEFAULT_RESTORE_RATE,
+        state_file: Optional[str] = None,
+        max_wait: float = 30.0
+    ):
+        self.state_file = state_file if fcntl is not None else None
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._state = {
+            'available': maximum,
+            'maximum': maximum,
+            'restore_rate': restore_rate,
+            'updated_at': time.time()
+        }
+        # Learned requestedQueryCost per operation name
+        self._costs = {}
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'queue_depth': 0,
+            'max_queue_depth': 0,
+            'waits': 0,
+            'wait_seconds_total': 0.0,
+            'wait_seconds_max': 0.0,
+            'throttled_retries': 0
+        }
+
+    @contextmanager
+    def _locked_state(self):
+        """Yield the bucket state, shared through the state file when configured"""
+        with self._lock:
+            if not self.state_file:
+                yield self._state
+                return
+
+            with open(self.state_file, 'a+') as fh:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+                try:
+                    fh.seek(0)
+                    raw = fh.read()
+                    state = json.loads(raw) if raw else dict(self._state)
+                    yield state
+                    fh.seek(0)
+                    fh.truncate()
+                    fh.write(json.dumps(state))
+                    fh.flush()
+                    self._state = state
+                finally:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _refill(state: Dict, now: float):
+        elapsed = max(now - state['updated_at'], 0.0)
+        state['available'] = min(state['maximum'], state['available'] + elapsed * state['restore_rate'])
+        state['updated_at'] = now
+
+    def estimate(self, operation: str, variables: Optional[Dict] = None, is_mutation: bool = False) -> float:
+        """Estimate the cost of a call before sending it"""
+        if operation in self._costs:
+            return self._costs[operation]
+        if is_mutation:
+            return DEFAULT_MUTATION_COST
+        # Connections and nodes() cost roughly one point per requested node
+        # plus the query itself
+        variables = variables or {}
+        first = variables.get('first') or len(variables.get('ids') or []) or 1
+        return 2.0 + float(first)
+
+    def acquire(self, cost: float):
+        """Reserve `cost` points, sleeping up to max_wait seconds until the bucket can afford them"""
+        started = time.monotonic()
+        waited = 0.0
+        queued = False
+        try:
+            while True:
+                with self._locked_state() as state:
+                    self._refill(state, time.time())
+                    cost = min(cost, state['maximum'])
+                    if state['available'] >= cost:
+                        state['available'] -= cost
+                        return
+                    delay = (cost - state['available']) / state['restore_rate']
+
+                # Keep waiting while there is time left: responses settle the
+                # bucket from the actual cost, which often frees points early
+                remaining = self.max_wait - waited
+                if remaining <= 0:
+                    raise ThrottleWaitExceeded(
+                        f"Shopify rate limit: waited {waited:.1f}s and {cost:.0f} points are still not available",
+                        retry_after=delay
+                    )
+
+                if not queued:
+                    queued = True
+                    self._enter_queue()
+                time.sleep(min(delay, remaining, WAIT_POLL_INTERVAL))
+                waited = time.monotonic() - started
+        finally:
+            if queued:
+                self._leave_queue(waited)
+
+    def settle(self, operation: str, cost: Dict):
+        """Correct the bucket from a response's extensions.cost block"""
+        if cost.get('requestedQueryCost') is not None:
+            self._costs[operation] = float(cost['requestedQueryCost'])
+
+        status = cost.get('throttleStatus')
+        if not status:
+            return
+        with self._locked_state() as state:
+            self._refill(state, time.time())
+            state['maximum'] = float(status['maximumAvailable'])
+            state['restore_rate'] = float(status['restoreRate'])
+            # Shopify's level doesn't count points reserved by calls still in
+            # flight, so it may only lower the local level, never raise it
+            state['available'] = min(state['available'], float(status['currentlyAvailable']), state['maximum'])
+
+    def backoff(self, attempt: int, cost: float) -> float:
+        """Delay before retrying a throttled call: enough to restore `cost`, growing exponentially"""
+        with self._stats_lock:
+            self._stats['throttled_retries'] += 1
+        with self._locked_state() as state:
+            self._refill(state, time.time())
+            needed = max(cost - state['available'], 0.0) / state['restore_rate']
+        return max(needed, 0.5 * (2 ** attempt)) + random.uniform(0, 0.25)
+
+    def _enter_queue(self):
+        with self._stats_lock:
+            self._stats['queue_depth'] += 1
+            self._stats['max_queue_depth'] = max(self._stats['max_queue_depth'], self._stats['queue_depth'])
+
+    def _leave_queue(self, waited: float):
+        with self._stats_lock:
+            self._stats['queue_depth'] -= 1
+            self._stats['waits'] += 1
+            self._stats['wait_seconds_total'] += waited
+            self._stats['wait_seconds_max'] = max(self._stats['wait_seconds_max'], waited)
+
+    def stats(self) -> Dict:
+        """Queue depth, wait time and the current bucket level"""
+        with self._locked_state() as state:
+            self._refill(state, time.time())
+            bucket = {
+                'available': state['available'],
+                'maximum': state['maximum'],
+                'restore_rate': state['restore_rate']
+            }
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['wait_seconds_avg'] = stats['wait_seconds_total'] / stats['waits'] if stats['waits'] else 0.0
+        stats['bucket'] = bucket
+        return stats
@@ -0,0 +1,243 @@
+import hashlib
+import heapq
+import json
+import math
+import struct
+import sys
+import zlib
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+def _hash64(value: str, salt: bytes = b'') -> int:
+    digest = hashlib.blake2b(value.encode('utf-8'), digest_size=8, salt=salt).digest()
+    return int.from_bytes(digest, 'big')
+
+
+def _pack_array(values: array) -> bytes:
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _unpack_array(typecode: str, raw: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(raw)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+class HyperLogLog:
+    """
+    Distinct counter in 2**precision one-byte registers.
+
+    The relative standard error of `count()` is 1.04 / sqrt(2**precision)
+    (1.6% at the default precision of 12). Sketches of the same precision
+    merge losslessly, so counts over a time range are the merge of the
+    per-bucket sketches.
+    """
+
+    def __init__(self, precision: int = 12, registers: Optional[bytearray] = None):
+        if not 4 <= precision <= 18:
+            raise ValueError('precision must be between 4 and 18')
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = registers if registers is not None else bytearray(self.size)
+
+    @staticmethod
+    def standard_error(precision: int) -> float:
+        return 1.04 / math.sqrt(1 << precision)
+
+    def add(self, value: str):
+        hashed = _hash64(value)
+        index = hashed >> (64 - self.precision)
+        rest = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: 'HyperLogLog'):
+        if other.precision != self.precision:
+            raise ValueError('Cannot merge HyperLogLog sketches of different precision')
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        m = self.size
+        alpha = 0.7213 / (1 + 1.079 / m) if m >= 128 else {16: 0.673, 32: 0.697, 64: 0.709}[m]
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Small-range correction (linear counting)
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self) -> bytes:
+        return zlib.compress(bytes([self.precision]) + bytes(self.registers))
+
+    @classmethod
+    def from_bytes(cls, raw: bytes) -> 'HyperLogLog':
+        raw = zlib.decompress(raw)
+        return cls(raw[0], bytearray(raw[1:]))
+
+
+class CountMinSketch:
+    """
+    Frequency counter in a depth x width table of counters.
+
+    `estimate(item)` never undercounts and overcounts by at most
+    e / width * total with probability 1 - e**-depth (0.13% of the total
+    with 98% confidence at 2048 x 4). Sketches of the same shape merge by
+    adding their tables.
+    """
+
+    def __init__(self, width: int = 2048, depth: int = 4, table: Optional[array] = None, total: int = 0):
+        self.width = width
+        self.depth = depth
+        self.table = table if table is not None else array('Q', bytes(8 * width * depth))
+        self.total = total
+
+    @staticmethod
+    def error_rate(width: int, depth: int) -> Tuple[float, float]:
+        """(relative overcount bound, probability the bound holds)"""
+        return math.e / width, 1 - math.exp(-depth)
+
+    def _cells(self, item: str) -> List[int]:
+        # Kirsch-Mitzenmacher: depth indexes from two hashes
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:], 'big') | 1
+        return [row * self.width + (h1 + row * h2) % self.width for row in range(self.depth)]
+
+    def add(self, item: str, count: int = 1) -> int:
+        """Add `count` occurrences of `item` and return its new estimate"""
+        self.total += count
+        table = self.table
+        estimate = None
+        for cell in self._cells(item):
+            table[cell] += count
+            if estimate is None or table[cell] < estimate:
+                estimate = table[cell]
+        return estimate
+
+    def estimate(self, item: str) -> int:
+        table = self.table
+        return min(table[cell] for cell in self._cells(item))
+
+    def merge(self, other: 'CountMinSketch'):
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError('Cannot merge Count-Min sketches of different shape')
+        self.table = array('Q', map(int.__add__, self.table, other.table))
+        self.total += other.total
+
+    def to_bytes(self) -> bytes:
+        header = struct.pack('<IIQ', self.width, self.depth, self.total)
+        return zlib.compress(header + _pack_array(self.table))
+
+    @classmethod
+    def from_bytes(cls, raw: bytes) -> 'CountMinSketch':
+        raw = zlib.decompress(raw)
+        width, depth, total = struct.unpack_from('<IIQ', raw)
+        return cls(width, depth, _unpack_array('Q', raw[struct.calcsize('<IIQ'):]), total)
+
+
+class TopK:
+    """
+    Heavy hitters: a Count-Min sketch plus a min-heap of the `capacity`
+    items with the highest estimated counts.
+
+    Items can only enter the heap while they are being counted, so an item
+    whose occurrences are spread thinly across many buckets may be missed
+    when buckets are merged; items that are heavy in any bucket are kept.
+    """
+
+    def __init__(self, capacity: int = 100, sketch: Optional[CountMinSketch] = None,
+                 candidates: Optional[Dict[str, int]] = None):
+        self.capacity = capacity
+        self.sketch = sketch or CountMinSketch()
+        self.candidates = dict(candidates or {})
+        self._heap = [(count, item) for item, count in self.candidates.items()]
+        heapq.heapify(self._heap)
+
+    def _floor(self) -> int:
+        # Drop heap entries whose count has since been raised
+        heap = self._heap
+        while heap and self.candidates.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+        return heap[0][0] if heap else 0
+
+    def _offer(self, item: str, estimate: int):
+        if item in self.candidates or len(self.candidates) < self.capacity:
+            self.candidates[item] = estimate
+            heapq.heappush(self._heap, (estimate, item))
+        elif estimate > self._floor():
+            _, evicted = heapq.heappop(self._heap)
+            del self.candidates[evicted]
+            self.candidates[item] = estimate
+            heapq.heappush(self._heap, (estimate, item))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(count, key) for key, count in self.candidates.items()]
+            heapq.heapify(self._heap)
+
+    def add(self, item: str, count: int = 1):
+        self._offer(item, self.sketch.add(item, count))
+
+    def merge(self, other: 'TopK'):
+        self.sketch.merge(other.sketch)
+        items = set(self.candidates) | set(other.candidates)
+        ranked = heapq.nlargest(self.capacity, ((self.sketch.estimate(item), item) for item in items))
+        self.candidates = {item: count for count, item in ranked}
+        self._heap = list(ranked)
+        heapq.heapify(self._heap)
+
+    def top(self, k: int) -> List[Tuple[str, int]]:
+        ranked = sorted(self.candidates.items(), key=lambda pair: (-pair[1], pair[0]))
+        return ranked[:k]
+
+    @staticmethod
+    def combine(topks: List['TopK'], k: int) -> List[Tuple[str, int]]:
+        """
+        Top `k` items across several buckets without merging their tables.
+
+        Each candidate is counted as the sum of its per-bucket estimates,
+        which is never below the true count and never above the estimate
+        of the merged sketch.
+        """
+        items = set()
+        for topk in topks:
+            items.update(topk.candidates)
+        totals = dict.fromkeys(items, 0)
+        cells = {}
+        for topk in topks:
+            sketch = topk.sketch
+            shape = (sketch.width, sketch.depth)
+            if shape not in cells:
+                cells[shape] = {item: sketch._cells(item) for item in items}
+            table = sketch.table
+            for item, item_cells in cells[shape].items():
+                totals[item] += min(table[cell] for cell in item_cells)
+        ranked = sorted(totals.items(), key=lambda pair: (-pair[1], pair[0]))
+        return ranked[:k]
+
+    def to_bytes(self) -> bytes:
+        candidates = json.dumps(self.candidates, separators=(',', ':')).encode('utf-8')
+        return struct.pack('<II', self.capacity, len(candidates)) + candidates + self.sketch.to_bytes()
+
+    @classmethod
+    def from_bytes(cls, raw: bytes) -> 'TopK':
+        capacity, length = struct.unpack_from('<II', raw)
+        offset = struct.calcsize('<II')
+        candidates = json.loads(raw[offset:offset + length])
+        return cls(capacity, CountMinSketch.from_bytes(raw[offset + length:]), candidates)
+
+
+def merge_all(sketches: Iterable):
+    """Merge an iterable of same-kind sketches into the first one (None if empty)"""
+    merged = None
+    for sketch in sketches:
+        if merged is None:
+            merged = sketch
+        else:
+            merged.merge(sketch)
+    return merged
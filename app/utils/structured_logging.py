@@ -0,0 +1,187 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+# LogRecord attributes that are not `extra=` fields
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record; `extra=` fields are included as keys"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'line': record.lineno,
+            'pid': record.process,
+            'thread': record.threadName
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc_info'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a fraction of DEBUG records per logger.
+
+    `rates` maps logger name prefixes to the fraction kept (the longest
+    matching prefix wins); records above DEBUG always pass.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = sorted(rates.items(), key=lambda item: len(item[0]), reverse=True)
+        self._cache = {}
+
+    def _rate(self, name: str) -> float:
+        rate = self._cache.get(name)
+        if rate is None:
+            rate = 1.0
+            for prefix, prefix_rate in self.rates:
+                if name == prefix or name.startswith(prefix + '.'):
+                    rate = prefix_rate
+                    break
+            self._cache[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        rate = self._rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler over a bounded queue that drops records when the writer
+    falls behind instead of blocking the caller.
+
+    Only the message and traceback are rendered on the calling thread;
+    JSON encoding and I/O happen on the listener thread.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def parse_sample_rates(value: Optional[str]) -> Dict[str, float]:
+    """Parse 'app.utils.shopify=0.01,app.products=0.1'"""
+    rates = {}
+    for item in (value or '').split(','):
+        if '=' in item:
+            name, rate = item.split('=', 1)
+            rates[name.strip()] = float(rate)
+    return rates
+
+
+_listener = None
+_handler = None
+_lock = threading.Lock()
+
+
+def setup_logging(
+    level: str = 'INFO',
+    log_file: Optional[str] = 'app.log',
+    max_bytes: int = 10 * 1024 * 1024,
+    backup_count: int = 5,
+    json_format: bool = True,
+    sample_rates: Optional[Dict[str, float]] = None,
+    queue_size: int = 10000
+) -> DroppingQueueHandler:
+    """
+    Route the root logger through a bounded queue to a background writer
+    that emits to stdout and a size-rotated file.
+
+    Safe to call more than once; later calls replace the pipeline.
+    """
+    global _listener, _handler
+    formatter = JsonFormatter() if json_format else logging.Formatter(
+        '%(asctime)s - %(levelname)s - %(name)s - %(message)s'
+    )
+
+    outputs: List[logging.Handler] = [logging.StreamHandler(sys.stdout)]
+    if log_file:
+        outputs.append(logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8'
+        ))
+    for output in outputs:
+        output.setFormatter(formatter)
+
+    handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+    if sample_rates:
+        handler.addFilter(SamplingFilter(sample_rates))
+    listener = logging.handlers.QueueListener(handler.queue, *outputs, respect_handler_level=False)
+
+    with _lock:
+        root = logging.getLogger()
+        if _handler is not None:
+            root.removeHandler(_handler)
+            if _listener is not None:
+                _listener.stop()
+        else:
+            for existing in list(root.handlers):
+                root.removeHandler(existing)
+        root.addHandler(handler)
+        root.setLevel(level.upper())
+        listener.start()
+        _listener, _handler = listener, handler
+
+    return handler
+
+
+def stop_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def logging_stats() -> Dict:
+    if _handler is None:
+        return {'enabled': False}
+    return {
+        'enabled': True,
+        'queue_depth': _handler.queue.qsize(),
+        'queue_capacity': _handler.queue.maxsize,
+        'dropped': _handler.dropped
+    }
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,92 @@
+"""
+Benchmark password verification throughput through the bcrypt process pool.
+
+Runs login-style checks (one bcrypt.checkpw each) from many request threads
+against HashingPool at several worker counts and reports logins per second,
+per worker core, and the latency seen by the callers. No database needed:
+
+    python -m benchmarks.auth_hashing --workers 1,2,4 --rounds 12
+"""
+import argparse
+import json
+import os
+import statistics
+import threading
+import time
+
+from app.auth.hashing import HashingPool, HashingBusy, BCRYPT_ROUNDS
+
+
+def run(workers, rounds, logins, concurrency):
+    pool = HashingPool(workers=workers, max_pending=concurrency, queue_timeout=60)
+    pool.start()
+    hashed = pool.hash_password('correct horse battery staple', rounds=rounds)
+
+    latencies = []
+    rejected = [0]
+    lock = threading.Lock()
+    remaining = [logins]
+
+    def client():
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            started = time.perf_counter()
+            try:
+                pool.check_password('correct horse battery staple', hashed)
+            except HashingBusy:
+                with lock:
+                    rejected[0] += 1
+                continue
+            with lock:
+                latencies.append((time.perf_counter() - started) * 1000)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    pool.close()
+
+    per_second = len(latencies) / elapsed
+    return {
+        'workers': workers,
+        'rounds': rounds,
+        'logins': len(latencies),
+        'rejected': rejected[0],
+        'logins_per_second': round(per_second, 2),
+        'logins_per_second_per_core': round(per_second / min(workers, os.cpu_count() or 1), 2),
+        'latency_median_ms': round(statistics.median(latencies), 2),
+        'latency_max_ms': round(max(latencies), 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', default='1,2,4', help='Pool sizes to measure')
+    parser.add_argument('--rounds', type=int, default=BCRYPT_ROUNDS, help='bcrypt cost factor')
+    parser.add_argument('--logins', type=int, default=200, help='Checks per pool size')
+    parser.add_argument('--concurrency', type=int, default=32, help='Concurrent request threads')
+    parser.add_argument('--output', default=None, help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    results = []
+    for workers in sorted(int(workers) for workers in args.workers.split(',')):
+        result = run(workers, args.rounds, args.logins, args.concurrency)
+        results.append(result)
+        print(f"{workers:>3} workers  cost {args.rounds}  "
+              f"{result['logins_per_second']:>8.2f} logins/s  "
+              f"{result['logins_per_second_per_core']:>7.2f} /s/core  "
+              f"median {result['latency_median_ms']:>8.2f} ms")
+
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
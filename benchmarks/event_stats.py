@@ -0,0 +1,116 @@
+"""
+Benchmark /api/events/stats query time against identifier_events size.
+
+Seeds synthetic events (user_id 'bench-*') into the configured PostgreSQL
+database in steps, times get_event_stats for several filter sets at each
+size, then deletes the seeded rows. Run against a scratch database:
+
+    python -m benchmarks.event_stats --sizes 10000,100000,1000000
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from app import create_app
+from app.extensions import db
+from app.events import controller, rollups, stats_cache
+from app.events.models import Event
+from app.events.services import copy_events
+
+SEED_USER_PREFIX = 'bench-'
+SEED_DAYS = 90
+EVENT_TYPES = ['CREATE', 'READ', 'UPDATE', 'DELETE']
+
+SCENARIOS = {
+    'all_by_day': {'group_by': 'day'},
+    'month_by_day': {'group_by': 'day', 'time_range': 'month'},
+    'week_reads': {'group_by': 'day', 'time_range': 'week', 'event_type': 'READ'},
+    'user_month': {'group_by': 'day', 'time_range': 'month', 'user_id': f'{SEED_USER_PREFIX}7'},
+    'all_by_month': {'group_by': 'month'},
+}
+
+
+def seed(count, seed_start, chunk_size=50000):
+    """Insert `count` synthetic events spread over the last SEED_DAYS days"""
+    span = SEED_DAYS * 24 * 3600
+    remaining = count
+    while remaining > 0:
+        rows = [
+            {
+                'event_type': random.choice(EVENT_TYPES),
+                'user_id': f'{SEED_USER_PREFIX}{random.randint(0, 999)}',
+                'product_id': str(random.randint(1, 5000)),
+                'timestamp': seed_start + timedelta(seconds=random.randint(0, span))
+            }
+            for _ in range(min(chunk_size, remaining))
+        ]
+        with db.engine.begin() as connection:
+            copy_events(connection, rows)
+        remaining -= len(rows)
+
+
+def time_scenario(filters, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        controller.get_event_stats(filters)
+        timings.append((time.perf_counter() - started) * 1000)
+        db.session.rollback()
+    return {'median_ms': round(statistics.median(timings), 2), 'min_ms': round(min(timings), 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10000,100000,1000000', help='Seeded row counts to measure at')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per scenario')
+    parser.add_argument('--output', default=None, help='Write results as JSON to this file')
+    parser.add_argument('--keep', action='store_true', help='Keep the seeded rows')
+    args = parser.parse_args()
+
+    app = create_app()
+    # Time the queries themselves: with the results cache on, repeats would be
+    # cache hits and entries filled at one seed size would be served at the next
+    stats_cache.CACHE_ENABLED = False
+    results = []
+    seed_start = datetime.utcnow() - timedelta(days=SEED_DAYS)
+
+    with app.app_context():
+        seeded = 0
+        try:
+            for size in sorted(int(size) for size in args.sizes.split(',')):
+                seed(size - seeded, seed_start)
+                seeded = size
+                db.session.execute(db.text('ANALYZE identifier_events'))
+                db.session.commit()
+                total = db.session.query(Event).count()
+
+                for source in (['raw', 'rollups'] if rollups.ROLLUPS_ENABLED else ['raw']):
+                    if source == 'rollups':
+                        rollups.rebuild_rollups(since=seed_start)
+                    enabled = rollups.ROLLUPS_ENABLED
+                    rollups.ROLLUPS_ENABLED = source == 'rollups'
+                    try:
+                        for name, filters in SCENARIOS.items():
+                            timing = time_scenario(filters, args.repeat)
+                            results.append(dict(timing, rows=total, source=source, scenario=name))
+                            print(f"{total:>12,} rows  {source:<8} {name:<14} "
+                                  f"median {timing['median_ms']:>9.2f} ms  min {timing['min_ms']:>9.2f} ms")
+                    finally:
+                        rollups.ROLLUPS_ENABLED = enabled
+        finally:
+            if not args.keep and seeded:
+                Event.query.filter(Event.user_id.like(f'{SEED_USER_PREFIX}%')).delete(synchronize_session=False)
+                db.session.commit()
+                if rollups.ROLLUPS_ENABLED:
+                    rollups.rebuild_rollups(since=seed_start)
+
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
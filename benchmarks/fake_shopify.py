@@ -0,0 +1,508 @@
+"""
+Local fake of the Shopify Admin GraphQL API for benchmarks.
+
+Answers the operations ShopifyAPI sends (product pages, nodes lookups,
+single reads, create/update/delete mutations and bulk exports) from an
+in-memory catalog. Every response carries an extensions.cost block backed
+by a leaky bucket, so the client throttle sees realistic throttleStatus
+values and THROTTLED errors when it overspends.
+
+    python -m benchmarks.fake_shopify --products 5000 --latency-ms 40 --jitter-ms 20
+    SHOPIFY_API_URL=http://127.0.0.1:8765/graphql.json python main.py
+
+GET /stats returns per-operation call counts and the number of throttled
+responses.
+"""
+import argparse
+import base64
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+from app.utils.shopify import operation_name
+
+GRAPHQL_PATH = '/graphql.json'
+BULK_PATH_RE = re.compile(r'^/bulk/(\d+)\.jsonl$')
+
+# Top-level fields ShopifyAPI.update_product combines into one document
+UPDATE_FIELDS = ('productUpdate', 'productVariantUpdate', 'productDeleteMedia', 'productCreateMedia')
+UPDATE_FIELD_RE = re.compile(r'\b(%s)\s*\(' % '|'.join(UPDATE_FIELDS))
+
+# Pseudo operation name for any combination of UPDATE_FIELDS
+UPDATE = 'update'
+
+PRODUCT_GID = 'gid://shopify/Product/%d'
+VARIANT_GID = 'gid://shopify/ProductVariant/%d'
+MEDIA_GID = 'gid://shopify/MediaImage/%d'
+BULK_GID = 'gid://shopify/BulkOperation/%d'
+
+# Bulk JSONL results are written in chunks of this many products
+BULK_CHUNK = 500
+
+
+def _numeric_id(gid: str) -> int:
+    return int(str(gid).rsplit('/', 1)[-1])
+
+
+def _encode_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(f'offset:{offset}'.encode()).decode()
+
+
+def _decode_cursor(cursor: Optional[str]) -> int:
+    if not cursor:
+        return 0
+    return int(base64.urlsafe_b64decode(cursor.encode()).decode().split(':', 1)[1])
+
+
+def update_fields(query: str):
+    """Update mutations selected by a document (the part after the operation name)"""
+    return UPDATE_FIELD_RE.findall(query[query.find('{') + 1:]) if '{' in query else []
+
+
+class FakeShopify:
+    """
+    In-memory catalog, cost bucket and bulk operations behind the fake server.
+
+    - latency_ms / jitter_ms: added to every GraphQL response
+    - bucket_size / restore_rate: the leaky bucket (Shopify's standard plan
+      is 1000 points restoring 50/s)
+    - throttle_rate: fraction of requests answered THROTTLED regardless of
+      the bucket, to exercise the client's retry path
+    - bulk_delay: seconds a bulk operation stays RUNNING
+    """
+
+    def __init__(
+        self,
+        products: int = 1000,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        bucket_size: float = 1000.0,
+        restore_rate: float = 50.0,
+        throttle_rate: float = 0.0,
+        bulk_delay: float = 0.5,
+        seed: int = 0
+    ):
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.bucket_size = bucket_size
+        self.restore_rate = restore_rate
+        self.throttle_rate = throttle_rate
+        self.bulk_delay = bulk_delay
+        self.random = random.Random(seed)
+
+        self.lock = threading.Lock()
+        self.products: Dict[int, Dict] = {}
+        self.next_id = 1
+        self.available = bucket_size
+        self.refilled_at = time.monotonic()
+        self.bulk_operations: Dict[int, Dict] = {}
+        self.calls = Counter()
+        self.throttled = 0
+
+        for _ in range(products):
+            self._add_product(
+                f'Product {self.next_id}', f'<p>Description of product {self.next_id}</p>',
+                str(round(self.random.uniform(1, 500), 2)), f'SKU-{self.next_id:06d}',
+                f'https://cdn.example.com/products/{self.next_id}.jpg'
+            )
+
+    def _add_product(self, title: str, description: str, price: str, sku: str, image_url: Optional[str]) -> Dict:
+        product_id = self.next_id
+        self.next_id += 1
+        product = {
+            'id': product_id,
+            'title': title,
+            'descriptionHtml': description,
+            'variant': {'id': VARIANT_GID % product_id, 'price': price, 'sku': sku},
+            'media': {'id': MEDIA_GID % product_id, 'url': image_url} if image_url else None
+        }
+        self.products[product_id] = product
+        return product
+
+    def product_ids(self):
+        with self.lock:
+            return list(self.products)
+
+    # Cost accounting
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(self.bucket_size, self.available + (now - self.refilled_at) * self.restore_rate)
+        self.refilled_at = now
+
+    @staticmethod
+    def requested_cost(operation: str, query: str, variables: Dict) -> int:
+        """Rough Shopify cost: 1 per object plus 2 per connection, 10 per mutation"""
+        if operation == UPDATE:
+            return 10 * len(update_fields(query))
+        if operation == 'getProducts':
+            return 2 + int(variables.get('first') or 0) * 3
+        if operation == 'getProductsByIds':
+            return 1 + len(variables.get('ids') or []) * 3
+        if operation in ('productCreate', 'productDelete', 'bulkOperationRunQuery'):
+            return 10
+        if operation == 'GetProduct':
+            return 5
+        return 1
+
+    def _cost(self, requested: int, actual: Optional[int]) -> Dict:
+        return {
+            'requestedQueryCost': requested,
+            'actualQueryCost': actual,
+            'throttleStatus': {
+                'maximumAvailable': self.bucket_size,
+                'currentlyAvailable': round(self.available, 1),
+                'restoreRate': self.restore_rate
+            }
+        }
+
+    def _charge(self, requested: int) -> Tuple[bool, Dict]:
+        """Spend `requested` points; False (and no charge) when throttled"""
+        with self.lock:
+            self._refill()
+            forced = self.throttle_rate > 0 and self.random.random() < self.throttle_rate
+            if forced or requested > self.available:
+                self.throttled += 1
+                return False, self._cost(requested, None)
+            self.available -= requested
+            return True, self._cost(requested, requested)
+
+    # GraphQL
+
+    def execute(self, query: str, variables: Dict) -> Dict:
+        name = operation = operation_name(query)
+        if query.lstrip().startswith('mutation') and update_fields(query):
+            # Named after its mutations, e.g. productVariantUpdate_productCreateMedia
+            operation = UPDATE
+        with self.lock:
+            self.calls[name] += 1
+
+        delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+
+        allowed, cost = self._charge(self.requested_cost(operation, query, variables))
+        if not allowed:
+            return {
+                'errors': [{'message': 'Throttled', 'extensions': {'code': 'THROTTLED'}}],
+                'extensions': {'cost': cost}
+            }
+
+        resolver = getattr(self, f'_resolve_{operation}', None)
+        if resolver is None:
+            return {'errors': [{'message': f'Unsupported operation {operation}'}], 'extensions': {'cost': cost}}
+        try:
+            with self.lock:
+                data = resolver(query, variables)
+        except (KeyError, TypeError, ValueError, IndexError) as e:
+            # Missing or malformed variables: answer like a GraphQL validation error
+            return {'errors': [{'message': f'Invalid variables for {operation}: {e!r}'}],
+                    'extensions': {'cost': cost}}
+        return {'data': data, 'extensions': {'cost': cost}}
+
+    @staticmethod
+    def _node(product: Dict) -> Dict:
+        variant, media = product['variant'], product['media']
+        return {
+            'id': PRODUCT_GID % product['id'],
+            'title': product['title'],
+            'descriptionHtml': product['descriptionHtml'],
+            'variants': {'edges': [{'node': dict(variant)}]},
+            'images': {'edges': [{'node': {'url': media['url']}}] if media else []},
+            'media': {'edges': [{'node': {'id': media['id'], 'image': {'url': media['url']}}}] if media else []}
+        }
+
+    def _lookup(self, gid: Optional[str]) -> Optional[Dict]:
+        try:
+            return self.products.get(_numeric_id(gid))
+        except (TypeError, ValueError):
+            return None
+
+    def _resolve_getProducts(self, query, variables):
+        ids = list(self.products)
+        start = _decode_cursor(variables.get('after'))
+        end = start + int(variables.get('first') or 50)
+        page = ids[start:end]
+        return {'products': {
+            'edges': [{'node': self._node(self.products[product_id])} for product_id in page],
+            'pageInfo': {'hasNextPage': end < len(ids), 'endCursor': _encode_cursor(end) if page else None}
+        }}
+
+    def _resolve_getProductsByIds(self, query, variables):
+        nodes = []
+        for gid in variables.get('ids') or []:
+            product = self._lookup(gid)
+            nodes.append(self._node(product) if product else None)
+        return {'nodes': nodes}
+
+    def _resolve_GetProduct(self, query, variables):
+        product = self._lookup(variables.get('id'))
+        return {'product': self._node(product) if product else None}
+
+    def _resolve_getProductVariants(self, query, variables):
+        product = self._lookup(variables.get('productId'))
+        return {'product': self._node(product) if product else None}
+
+    def _resolve_productCreate(self, query, variables):
+        product_input = variables.get('input') or {}
+        variant = (product_input.get('variants') or [{}])[0]
+        media = variables.get('media') or []
+        product = self._add_product(
+            product_input.get('title', ''), product_input.get('descriptionHtml', ''),
+            str(variant.get('price', '0.00')), variant.get('sku', ''),
+            media[0]['originalSource'] if media else None
+        )
+        return {'productCreate': {'product': self._node(product), 'userErrors': []}}
+
+    def _resolve_update(self, query, variables):
+        data = {}
+        missing = {'userErrors': [{'field': ['id'], 'message': 'Product does not exist'}]}
+        selected = set(update_fields(query))
+
+        if 'productUpdate' in selected:
+            product = self._lookup(variables['product']['id'])
+            if product is None:
+                data['productUpdate'] = dict(missing, product=None)
+            else:
+                product['title'] = variables['product'].get('title', product['title'])
+                product['descriptionHtml'] = variables['product'].get('descriptionHtml', product['descriptionHtml'])
+                node = self._node(product)
+                data['productUpdate'] = {
+                    'product': {key: node[key] for key in ('id', 'title', 'descriptionHtml')},
+                    'userErrors': []
+                }
+
+        if 'productVariantUpdate' in selected:
+            product = self._lookup(variables['variant']['id'])
+            if product is None:
+                data['productVariantUpdate'] = dict(missing, productVariant=None)
+            else:
+                variant = product['variant']
+                variant['price'] = str(variables['variant'].get('price', variant['price']))
+                variant['sku'] = variables['variant'].get('sku', variant['sku'])
+                data['productVariantUpdate'] = {'productVariant': dict(variant), 'userErrors': []}
+
+        product = self._lookup(variables.get('productId'))
+        if 'productDeleteMedia' in selected:
+            deleted = []
+            if product is not None and product['media'] and product['media']['id'] in variables['oldMediaIds']:
+                deleted = [product['media']['id']]
+                product['media'] = None
+            data['productDeleteMedia'] = {'deletedMediaIds': deleted, 'mediaUserErrors': []}
+
+        if 'productCreateMedia' in selected:
+            if product is None:
+                data['productCreateMedia'] = {'media': None, 'mediaUserErrors': missing['userErrors']}
+            else:
+                product['media'] = {'id': MEDIA_GID % product['id'], 'url': variables['media'][0]['originalSource']}
+                # Like Shopify, the processed image URL is not available yet
+                data['productCreateMedia'] = {'media': [{'id': product['media']['id'], 'image': None}],
+                                              'mediaUserErrors': []}
+        return data
+
+    def _resolve_productDelete(self, query, variables):
+        gid = (variables.get('input') or {}).get('id')
+        if self._lookup(gid) is None:
+            return {'productDelete': {'deletedProductId': None,
+                                      'userErrors': [{'field': ['id'], 'message': 'Product does not exist'}]}}
+        del self.products[_numeric_id(gid)]
+        return {'productDelete': {'deletedProductId': gid, 'userErrors': []}}
+
+    def _resolve_bulkOperationRunQuery(self, query, variables):
+        operation_id = len(self.bulk_operations) + 1
+        self.bulk_operations[operation_id] = {
+            'started': time.monotonic(),
+            # Export the catalog as it is now, like a snapshot
+            'products': [dict(product) for product in self.products.values()]
+        }
+        return {'bulkOperationRunQuery': {
+            'bulkOperation': {'id': BULK_GID % operation_id, 'status': 'CREATED'},
+            'userErrors': []
+        }}
+
+    def _resolve_bulkOperationStatus(self, query, variables):
+        try:
+            operation_id = _numeric_id(variables.get('id'))
+        except (TypeError, ValueError):
+            return {'node': None}
+        operation = self.bulk_operations.get(operation_id)
+        if operation is None:
+            return {'node': None}
+        done = time.monotonic() - operation['started'] >= self.bulk_delay
+        return {'node': {
+            'id': BULK_GID % operation_id,
+            'status': 'COMPLETED' if done else 'RUNNING',
+            'errorCode': None,
+            'objectCount': str(len(operation['products']) * 3) if done else '0',
+            # Filled in by the request handler, which knows the server address
+            'url': f'/bulk/{operation_id}.jsonl' if done else None
+        }}
+
+    def bulk_lines(self, operation_id: int):
+        """JSONL lines of a bulk export: each product followed by its variant and media"""
+        with self.lock:
+            operation = self.bulk_operations.get(operation_id)
+        if operation is None:
+            return None
+
+        def generate():
+            for product in operation['products']:
+                gid = PRODUCT_GID % product['id']
+                yield json.dumps({'id': gid, 'title': product['title'],
+                                  'descriptionHtml': product['descriptionHtml']})
+                yield json.dumps(dict(product['variant'], __parentId=gid))
+                if product['media']:
+                    yield json.dumps({'id': product['media']['id'], 'image': {'url': product['media']['url']},
+                                      '__parentId': gid})
+
+        return generate()
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                'products': len(self.products),
+                'calls': dict(self.calls),
+                'throttled': self.throttled,
+                'bulk_operations': len(self.bulk_operations)
+            }
+
+
+class FakeShopifyHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so the client's connection pool behaves as it does against Shopify
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def shop(self) -> FakeShopify:
+        return self.server.shop
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: Dict):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length)
+        if self.path != GRAPHQL_PATH:
+            return self._send_json(404, {'errors': 'Not Found'})
+        if not self.headers.get('X-Shopify-Access-Token'):
+            return self._send_json(401, {'errors': '[API] Invalid API key or access token'})
+        try:
+            request = json.loads(body)
+        except ValueError:
+            return self._send_json(400, {'errors': 'Invalid JSON'})
+
+        try:
+            result = self.shop.execute(request.get('query') or '', request.get('variables') or {})
+        except Exception as e:
+            # Answer instead of dropping the connection
+            return self._send_json(200, {'errors': [{'message': f'Internal error: {e!r}'}]})
+        node = (result.get('data') or {}).get('node')
+        if node and node.get('url'):
+            node['url'] = f'http://{self.headers.get("Host")}{node["url"]}'
+        self._send_json(200, result)
+
+    def do_GET(self):
+        if self.path == '/stats':
+            return self._send_json(200, self.shop.stats())
+
+        match = BULK_PATH_RE.match(self.path)
+        lines = self.shop.bulk_lines(int(match.group(1))) if match else None
+        if lines is None:
+            return self._send_json(404, {'errors': 'Not Found'})
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/jsonl')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        chunk = []
+        for line in lines:
+            chunk.append(line)
+            if len(chunk) >= BULK_CHUNK:
+                self._write_chunk(chunk)
+                chunk = []
+        if chunk:
+            self._write_chunk(chunk)
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _write_chunk(self, lines):
+        data = ('\n'.join(lines) + '\n').encode()
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+
+
+class FakeShopifyServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, shop: FakeShopify, host: str = '127.0.0.1', port: int = 0):
+        super().__init__((host, port), FakeShopifyHandler)
+        self.shop = shop
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}{GRAPHQL_PATH}'
+
+    @property
+    def stats_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/stats'
+
+    def start(self) -> 'FakeShopifyServer':
+        """Serve on a background thread"""
+        threading.Thread(target=self.serve_forever, name='fake-shopify', daemon=True).start()
+        return self
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--products', type=int, default=1000, help='Catalog size')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Latency added to every GraphQL call')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='Uniform random extra latency')
+    parser.add_argument('--bucket-size', type=float, default=1000.0, help='Cost bucket capacity')
+    parser.add_argument('--restore-rate', type=float, default=50.0, help='Cost points restored per second')
+    parser.add_argument('--throttle-rate', type=float, default=0.0,
+                        help='Fraction of calls answered THROTTLED regardless of the bucket')
+    parser.add_argument('--bulk-delay', type=float, default=0.5, help='Seconds a bulk operation keeps running')
+
+
+def from_arguments(args) -> FakeShopify:
+    return FakeShopify(
+        products=args.products,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        bucket_size=args.bucket_size,
+        restore_rate=args.restore_rate,
+        throttle_rate=args.throttle_rate,
+        bulk_delay=args.bulk_delay
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = FakeShopifyServer(from_arguments(args), args.host, args.port)
+    print(f'Fake Shopify GraphQL API at {server.url}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
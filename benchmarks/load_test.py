@@ -0,0 +1,340 @@
+"""
+Load test the Flask app against a local fake Shopify GraphQL API.
+
+Starts benchmarks.fake_shopify on a free port, points ShopifyAPI at it
+(SHOPIFY_API_URL), builds the app exactly as main.py does and drives it
+in-process through scripted scenarios from concurrent client threads:
+
+    browse        product pages, single reads and ?ids= batch lookups
+    bulk_import   POST /products/batch with --batch-size products
+    bulk_sync     start a bulk catalog sync and poll it until it finishes
+    ingest        POST /events/batch with --events-per-batch events
+    stats         poll /events/stats, /stats/top and /stats/unique
+
+Needs the Postgres and MongoDB from docker-compose (use scratch databases:
+the scenarios create users, products and events). Throughput and
+p50/p95/p99 latencies per endpoint go to --output as JSON; --baseline
+compares against an earlier run and exits 1 on a regression:
+
+    python -m benchmarks.load_test --duration 30 --concurrency 8 --output run.json
+    python -m benchmarks.load_test --output new.json --baseline run.json
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+
+from benchmarks.fake_shopify import FakeShopifyServer, add_arguments, from_arguments
+
+SCENARIOS = ('browse', 'bulk_import', 'bulk_sync', 'ingest', 'stats')
+EVENT_TYPES = ('CREATE', 'READ', 'UPDATE', 'DELETE')
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not values:
+        return None
+    rank = max(math.ceil(q / 100.0 * len(values)) - 1, 0)
+    return values[rank]
+
+
+def summarize(latencies):
+    latencies = sorted(latencies)
+    return {
+        'count': len(latencies),
+        'mean_ms': round(sum(latencies) / len(latencies), 2) if latencies else None,
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'max_ms': latencies[-1] if latencies else None
+    }
+
+
+class _Failed:
+    """Stands in for the response of a step that failed without one"""
+    status_code = 599
+
+
+class Session:
+    """One simulated client: a Flask test client with the bench user's token"""
+
+    def __init__(self, app, token, product_ids, args, seed):
+        self.client = app.test_client()
+        self.headers = {'Authorization': f'Bearer {token}'}
+        self.product_ids = product_ids
+        self.args = args
+        self.random = random.Random(seed)
+        self.cursor = ''
+        self.items = 0
+
+    def get(self, path, **kwargs):
+        return self.client.get(path, headers=self.headers, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.client.post(path, headers=self.headers, **kwargs)
+
+    # Each step returns (label, response); `items` counts products/events moved
+
+    def browse(self):
+        roll = self.random.random()
+        if roll < 0.4:
+            response = self.get('/api/products/', query_string={'cursor': self.cursor,
+                                                                'page_size': self.args.page_size})
+            if response.status_code == 200:
+                self.cursor = response.get_json().get('next_cursor') or ''
+            return 'products.page', response
+        if roll < 0.8:
+            return 'products.get', self.get(f'/api/products/{self.random.choice(self.product_ids)}')
+        ids = self.random.sample(self.product_ids, min(20, len(self.product_ids)))
+        return 'products.ids', self.get('/api/products/', query_string={'ids': ','.join(ids)})
+
+    def bulk_import(self):
+        batch = [{
+            'title': f'bench-{uuid.uuid4().hex[:12]}',
+            'description': 'Load test product',
+            'price': round(self.random.uniform(1, 500), 2),
+            'sku': f'BENCH-{self.random.randrange(10 ** 8):08d}'
+        } for _ in range(self.args.batch_size)]
+        response = self.post('/api/products/batch', json=batch)
+        if response.status_code == 200:
+            self.items += len(batch)
+        return 'products.batch', response
+
+    def bulk_sync(self):
+        started = time.monotonic()
+        response = self.post('/api/products/bulk-sync', json={})
+        if response.status_code != 202:
+            # 409: another session's sync is running
+            return 'products.bulk_sync', response
+        while time.monotonic() - started < self.args.sync_timeout:
+            time.sleep(0.1)
+            status = self.get('/api/products/bulk-sync')
+            body = status.get_json() or {}
+            if body.get('status') != 'running':
+                self.items += ((body.get('report') or {}).get('rows') or 0)
+                return 'products.bulk_sync', status if body.get('status') == 'completed' else _Failed()
+        return 'products.bulk_sync', _Failed()
+
+    def ingest(self):
+        events = [{
+            'event_type': self.random.choice(EVENT_TYPES),
+            'user_id': f'bench-user-{self.random.randrange(self.args.users)}',
+            'product_id': self.random.choice(self.product_ids)
+        } for _ in range(self.args.events_per_batch)]
+        response = self.client.post('/api/events/batch', json=events)
+        if response.status_code == 201:
+            self.items += len(events)
+        return 'events.batch', response
+
+    def stats(self):
+        roll = self.random.random()
+        if roll < 0.5:
+            return 'events.stats', self.client.get('/api/events/stats', query_string={
+                'group_by': 'day', 'time_range': self.random.choice(('day', 'week', 'month'))
+            })
+        if roll < 0.75:
+            return 'events.stats_top', self.client.get('/api/events/stats/top', query_string={
+                'event_type': self.random.choice(EVENT_TYPES + ('all',)), 'time_range': 'week'
+            })
+        return 'events.stats_unique', self.client.get('/api/events/stats/unique', query_string={
+            'product_id': self.random.choice(self.product_ids), 'time_range': 'week'
+        })
+
+
+def run_scenario(app, name, token, product_ids, args):
+    """Run one scenario from args.concurrency threads; returns its report"""
+    sessions = [Session(app, token, product_ids, args, seed=index) for index in range(args.concurrency)]
+    results = [defaultdict(list) for _ in sessions]
+    errors = [defaultdict(int) for _ in sessions]
+    concurrency = 1 if name == 'bulk_sync' else args.concurrency
+
+    def client(index, deadline, record):
+        session = sessions[index]
+        step = getattr(session, name)
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            label, response = step()
+            elapsed = (time.perf_counter() - started) * 1000
+            if not record:
+                continue
+            if response.status_code >= 400:
+                errors[index][label] += 1
+            else:
+                results[index][label].append(round(elapsed, 3))
+
+    def run(seconds, record):
+        deadline = time.monotonic() + seconds
+        threads = [threading.Thread(target=client, args=(index, deadline, record)) for index in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    if args.warmup:
+        run(args.warmup, record=False)
+    for session in sessions:
+        session.items = 0
+    started = time.perf_counter()
+    run(args.duration, record=True)
+    elapsed = time.perf_counter() - started
+
+    latencies, failed = defaultdict(list), defaultdict(int)
+    for per_session, per_session_errors in zip(results, errors):
+        for label, values in per_session.items():
+            latencies[label].extend(values)
+        for label, count in per_session_errors.items():
+            failed[label] += count
+
+    endpoints = {}
+    for label in sorted(set(latencies) | set(failed)):
+        endpoints[label] = dict(summarize(latencies[label]), errors=failed[label],
+                                throughput=round(len(latencies[label]) / elapsed, 2))
+    requests = sum(len(values) for values in latencies.values())
+    return {
+        'concurrency': concurrency,
+        'duration_s': round(elapsed, 2),
+        'requests': requests,
+        'errors': sum(failed.values()),
+        'throughput': round(requests / elapsed, 2),
+        'items_per_second': round(sum(session.items for session in sessions) / elapsed, 2),
+        'latency': summarize([value for values in latencies.values() for value in values]),
+        'endpoints': endpoints
+    }
+
+
+def login(app):
+    """Sign up a throwaway user and return its JWT"""
+    client = app.test_client()
+    credentials = {'email': f'bench-{uuid.uuid4().hex[:12]}@example.com', 'password': uuid.uuid4().hex}
+    response = client.post('/api/auth/signup', json=dict(credentials, name='Load Test'))
+    if response.status_code != 201:
+        raise SystemExit(f'Signup failed: {response.status_code} {response.get_data(as_text=True)}')
+    response = client.post('/api/auth/login', json=credentials)
+    if response.status_code != 200:
+        raise SystemExit(f'Login failed: {response.status_code} {response.get_data(as_text=True)}')
+    return response.get_json()['token']
+
+
+def load_product_ids(app, token, limit=1000):
+    client = app.test_client()
+    response = client.get('/api/products/', headers={'Authorization': f'Bearer {token}'},
+                          query_string={'cursor': '', 'page_size': 250})
+    if response.status_code != 200:
+        raise SystemExit(f'Listing products failed: {response.status_code} {response.get_data(as_text=True)}')
+    return [product['shopify_id'] for product in response.get_json()['products']][:limit]
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline, tolerance):
+    """Print per-endpoint changes against a baseline report; True if anything regressed"""
+    regressed = False
+    for scenario, result in report['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(scenario)
+        if not previous:
+            continue
+        for label, current in result['endpoints'].items():
+            before = previous['endpoints'].get(label)
+            if not before or not before['p95_ms'] or not current['p95_ms'] or not before['throughput']:
+                continue
+            p95_change = current['p95_ms'] / before['p95_ms'] - 1
+            throughput_change = current['throughput'] / before['throughput'] - 1
+            flag = ''
+            if p95_change > tolerance or throughput_change < -tolerance:
+                flag = '  REGRESSION'
+                regressed = True
+            print(f"{scenario:<12} {label:<22} p95 {before['p95_ms']:>9.2f} -> {current['p95_ms']:>9.2f} ms "
+                  f"({p95_change:+7.1%})  throughput {throughput_change:+7.1%}{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='Scenarios to run, in order')
+    parser.add_argument('--duration', type=float, default=20, help='Measured seconds per scenario')
+    parser.add_argument('--warmup', type=float, default=2, help='Unmeasured seconds before each scenario')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent client threads')
+    parser.add_argument('--page-size', type=int, default=50, help='Products per page when browsing')
+    parser.add_argument('--batch-size', type=int, default=50, help='Products per bulk import request')
+    parser.add_argument('--events-per-batch', type=int, default=1000, help='Events per ingestion request')
+    parser.add_argument('--users', type=int, default=10000, help='Distinct user IDs in generated events')
+    parser.add_argument('--sync-timeout', type=float, default=300, help='Seconds to wait for one bulk sync')
+    parser.add_argument('--shopify-url', default=None,
+                        help='Use this GraphQL endpoint instead of starting the fake server')
+    parser.add_argument('--output', default=None, help='Write the report as JSON to this file')
+    parser.add_argument('--baseline', default=None, help='Compare against an earlier --output file')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed p95 increase / throughput drop before flagging a regression')
+    add_arguments(parser.add_argument_group('fake Shopify'))
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    server = None
+    if args.shopify_url:
+        os.environ['SHOPIFY_API_URL'] = args.shopify_url
+    else:
+        server = FakeShopifyServer(from_arguments(args)).start()
+        os.environ['SHOPIFY_API_URL'] = server.url
+    os.environ.setdefault('SHOPIFY_SHOP_NAME', 'load-test')
+    os.environ.setdefault('SHOPIFY_ACCESS_TOKEN', 'load-test-token')
+
+    # ShopifyAPI reads its settings when the app modules are imported
+    from main import app
+
+    token = login(app)
+    product_ids = load_product_ids(app, token)
+    if not product_ids:
+        raise SystemExit('The catalog is empty')
+
+    report = {
+        'started_at': datetime.utcnow().isoformat(),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'settings': {key: value for key, value in vars(args).items() if key not in ('output', 'baseline')},
+        'scenarios': {}
+    }
+    for name in scenarios:
+        result = run_scenario(app, name, token, product_ids, args)
+        report['scenarios'][name] = result
+        latency = result['latency']
+        print(f"{name:<12} {result['requests']:>7} req  {result['throughput']:>9.2f} req/s  "
+              f"{result['items_per_second']:>10.2f} items/s  errors {result['errors']:>5}  "
+              f"p50 {latency['p50_ms'] or 0:>8.2f}  p95 {latency['p95_ms'] or 0:>8.2f}  "
+              f"p99 {latency['p99_ms'] or 0:>8.2f} ms")
+
+    if server is not None:
+        report['fake_shopify'] = server.shop.stats()
+        server.shutdown()
+
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(report, fh, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+        if compare(report, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+Compare the old and new response serialization paths.
+
+    product   --items single-product responses: a new ProductSchema() per
+              response + flask-restx output_json vs. the precompiled
+              dump_product + json_representation
+    products  one list response of --items products, same two paths
+    events    one list response of --items events: Event.to_dict()
+              (isoformat per row) + output_json vs. Event.dump_rows on
+              column tuples + json_representation
+
+Both paths must produce the same JSON document. Needs no database:
+
+    python -m benchmarks.serialization --items 5000 --repeat 20
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from flask import Flask
+from flask_restx.representations import output_json
+
+from app.events.models import Event
+from app.products.input_validation import ProductSchema, dump_product
+from app.utils.serialization import json_representation, resolve_backend
+
+
+def make_products(count):
+    rng = random.Random(0)
+    return [{
+        'shopify_id': str(8000000000 + index),
+        'title': f'Product {index}',
+        'description': f'<p>Description of product {index}</p>',
+        'price': round(rng.uniform(1, 500), 2),
+        'sku': f'SKU-{index:06d}',
+        'image_url': f'https://cdn.example.com/products/{index}.jpg',
+        'variant_id': f'gid://shopify/ProductVariant/{index}',
+        'media_id': None
+    } for index in range(count)]
+
+
+def make_event_rows(count):
+    rng = random.Random(0)
+    now = datetime.utcnow()
+    return [(
+        index,
+        rng.choice(('CREATE', 'READ', 'UPDATE', 'DELETE')),
+        f'user-{rng.randrange(1000)}',
+        str(rng.randrange(10000)),
+        now - timedelta(seconds=index, microseconds=rng.randrange(10 ** 6))
+    ) for index in range(count)]
+
+
+def timed(function, repeat):
+    """Median and best wall time of `repeat` calls, in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - started) * 1000)
+    return {'median_ms': round(statistics.median(samples), 3), 'best_ms': round(min(samples), 3)}
+
+
+def run(items, repeat, backend):
+    new_output = json_representation(backend)
+    products = make_products(items)
+    rows = make_event_rows(items)
+    events = [Event(**dict(zip(Event.FIELDS, row))) for row in rows]
+
+    def old_product():
+        # One schema per response, as the routes used to construct
+        return [output_json(ProductSchema().dump(product), 200) for product in products]
+
+    def new_product():
+        return [new_output(dump_product(product), 200) for product in products]
+
+    def old_products():
+        return output_json(ProductSchema().dump(products, many=True), 200)
+
+    def new_products():
+        return new_output([dump_product(product) for product in products], 200)
+
+    def old_events():
+        return output_json({'events': [event.to_dict() for event in events]}, 200)
+
+    def new_events():
+        return new_output({'events': Event.dump_rows(rows)}, 200)
+
+    # The new path must produce the same document
+    assert [json.loads(response.get_data()) for response in old_product()[:100]] == \
+        [json.loads(response.get_data()) for response in new_product()[:100]]
+    assert json.loads(old_products().get_data()) == json.loads(new_products().get_data())
+    assert json.loads(old_events().get_data()) == json.loads(new_events().get_data())
+
+    results = []
+    for name, old, new in (
+        ('product', old_product, new_product),
+        ('products', old_products, new_products),
+        ('events', old_events, new_events)
+    ):
+        before, after = timed(old, repeat), timed(new, repeat)
+        results.append({
+            'payload': name,
+            'items': items,
+            'backend': new_output.backend,
+            'old': before,
+            'new': after,
+            'speedup': round(before['median_ms'] / after['median_ms'], 2)
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=5000, help='Records per response')
+    parser.add_argument('--repeat', type=int, default=20, help='Timed runs per path')
+    parser.add_argument('--backend', default='auto', help="JSON backend of the new path: auto, orjson or json")
+    parser.add_argument('--output', default=None, help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    # output_json reads RESTX_JSON and debug from the current app
+    app = Flask(__name__)
+    with app.app_context():
+        print(f'new path JSON backend: {resolve_backend(args.backend)}')
+        results = run(args.items, args.repeat, args.backend)
+
+    for result in results:
+        print(f"{result['payload']:<9} {result['items']:>7} items  "
+              f"old {result['old']['median_ms']:>9.2f} ms  new {result['new']['median_ms']:>9.2f} ms  "
+              f"{result['speedup']:>5.2f}x")
+
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 import os
 from app import create_app
 from flask_restx import Api
+from app.utils.serialization import json_representation
 
 app = create_app()
 
@@ -18,6 +19,9 @@ api = Api(
     prefix='/api'  # Add explicit prefix
 )
 
+# orjson-backed JSON output (stdlib json when orjson is not installed)
+api.representation('application/json')(json_representation(app.config['JSON_BACKEND']))
+
 # Add namespaces
 api.add_namespace(auth_apis)
 api.add_namespace(events_apis)
@@ -0,0 +1,58 @@
+import os
+
+import pytest
+from flask import Flask
+
+# ShopifyAPI refuses to start without credentials; the tests never reach Shopify
+os.environ.setdefault('SHOPIFY_SHOP_NAME', 'test-shop')
+os.environ.setdefault('SHOPIFY_ACCESS_TOKEN', 'test-token')
+
+
+@pytest.fixture
+def app():
+    """A bare Flask app, for code that reads current_app"""
+    app = Flask(__name__)
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def mirror():
+    """An empty in-memory products collection in place of MongoDB"""
+    mongomock = pytest.importorskip('mongomock')
+    from mongoengine import connect, disconnect
+
+    from app.products.models import Product
+
+    connect('test', mongo_client_class=mongomock.MongoClient, uuidRepresentation='standard')
+    yield Product
+    Product.drop_collection()
+    disconnect()
+
+
+@pytest.fixture
+def events_db(app):
+    """The event tables in an in-memory SQLite database in place of PostgreSQL"""
+    from sqlalchemy import text
+
+    from app.events.models import Event
+    from app.extensions import db
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    db.metadata.create_all(db.engine, tables=[table for table in db.metadata.sorted_tables
+                                             if table is not Event.__table__])
+    # SQLite only autoincrements a single-column key, not (event_id, timestamp)
+    with db.engine.begin() as connection:
+        connection.execute(text(f"""
+            CREATE TABLE {Event.__tablename__} (
+                event_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                event_type VARCHAR(20) NOT NULL,
+                user_id VARCHAR(100) NOT NULL,
+                timestamp DATETIME NOT NULL,
+                product_id VARCHAR(100) NOT NULL
+            )
+        """))
+    yield Event
+    db.session.remove()
+    db.drop_all()
@@ -0,0 +1,76 @@
+import json
+from datetime import datetime, timedelta
+
+from app.products.bulk import bulk_sync_products
+
+
+def export_lines(*products):
+    """Bulk operation JSONL for (id, title, price) products"""
+    for shopify_id, title, price in products:
+        yield json.dumps({'id': f'gid://shopify/Product/{shopify_id}', 'title': title})
+        yield json.dumps({'id': f'gid://shopify/ProductVariant/{shopify_id}0', 'price': str(price),
+                          '__parentId': f'gid://shopify/Product/{shopify_id}'})
+
+
+class ExportingAPI:
+    """Bulk export API whose operation runs `during_export` before completing"""
+
+    def __init__(self, lines, during_export=None):
+        self.lines = list(lines)
+        self.during_export = during_export
+
+    def start_bulk_products_export(self):
+        return 'gid://shopify/BulkOperation/1'
+
+    def wait_for_bulk_operation(self, operation_id, poll_interval=2.0):
+        if self.during_export:
+            self.during_export()
+        return {'url': 'https://storage.example.com/export.jsonl'}
+
+    def iter_jsonl(self, url):
+        return iter(self.lines)
+
+
+def save(Product, shopify_id, title, synced_at):
+    Product(shopify_id=shopify_id, title=title, price=1.0, synced_at=synced_at).save()
+
+
+def test_export_replaces_the_mirror(app, mirror):
+    long_ago = datetime.utcnow() - timedelta(days=1)
+    save(mirror, '1', 'Old mug', long_ago)
+    save(mirror, '2', 'Deleted in Shopify', long_ago)
+
+    report = bulk_sync_products(ExportingAPI(export_lines(('1', 'Mug', 12.5), ('3', 'Plate', 3))))
+
+    assert report['rows'] == 2
+    assert report['pruned'] == 1
+    products = {product.shopify_id: product for product in mirror.objects}
+    assert sorted(products) == ['1', '3']
+    assert (products['1'].title, products['1'].price) == ('Mug', 12.5)
+
+
+def test_products_written_during_the_export_survive(app, mirror):
+    save(mirror, '1', 'Mug', datetime.utcnow() - timedelta(days=1))
+
+    def write_through_the_api():
+        # Created and updated after the export started: absent from it or stale in it
+        save(mirror, '2', 'New bowl', datetime.utcnow())
+        mirror.objects(shopify_id='1').update_one(set__title='Renamed mug', set__synced_at=datetime.utcnow())
+
+    bulk_sync_products(ExportingAPI(export_lines(('1', 'Mug', 12.5)), write_through_the_api))
+
+    products = {product.shopify_id: product for product in mirror.objects}
+    assert sorted(products) == ['1', '2']
+    assert products['1'].title == 'Renamed mug'
+    assert products['2'].title == 'New bowl'
+
+
+def test_expired_products_missing_from_the_export_are_pruned(app, mirror):
+    save(mirror, '1', 'Mug', datetime.utcnow())
+    save(mirror, '2', 'Deleted in Shopify', datetime.utcnow())
+    mirror.objects(shopify_id='2').update_one(set__synced_at=None)
+
+    report = bulk_sync_products(ExportingAPI(export_lines(('1', 'Mug', 12.5))))
+
+    assert report['pruned'] == 1
+    assert [product.shopify_id for product in mirror.objects] == ['1']
@@ -0,0 +1,40 @@
+import base64
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from marshmallow import ValidationError
+
+from app.events.controller import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    event = SimpleNamespace(timestamp=datetime(2024, 3, 1, 12, 30, 15, 123456), event_id=42)
+    assert decode_cursor(encode_cursor(event)) == (event.timestamp, 42)
+
+
+def test_cursor_is_url_safe():
+    event = SimpleNamespace(timestamp=datetime(2024, 3, 1), event_id=2 ** 40)
+    cursor = encode_cursor(event)
+    assert all(char.isalnum() or char in '-_=' for char in cursor)
+
+
+def test_cursors_order_like_their_events():
+    older = SimpleNamespace(timestamp=datetime(2024, 3, 1), event_id=9)
+    newer = SimpleNamespace(timestamp=datetime(2024, 3, 1), event_id=10)
+    assert decode_cursor(encode_cursor(older)) < decode_cursor(encode_cursor(newer))
+
+
+@pytest.mark.parametrize('cursor', [
+    'not base64!',
+    base64.urlsafe_b64encode(b'not json').decode(),
+    base64.urlsafe_b64encode(b'null').decode(),
+    base64.urlsafe_b64encode(b'["2024-03-01T00:00:00"]').decode(),
+    base64.urlsafe_b64encode(b'["yesterday", 1]').decode(),
+    base64.urlsafe_b64encode(b'["2024-03-01T00:00:00", "x"]').decode(),
+    'café',
+])
+def test_invalid_cursor_is_a_validation_error(cursor):
+    with pytest.raises(ValidationError) as excinfo:
+        decode_cursor(cursor)
+    assert excinfo.value.messages == {'cursor': ['Invalid cursor']}
@@ -0,0 +1,51 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.events.controller import export_events
+from app.events.input_validation import EventFilterSchema
+from app.extensions import db
+from app.utils.serialization import resolve_backend
+
+
+@pytest.fixture
+def events(events_db):
+    now = datetime.utcnow().replace(microsecond=0)
+    for minutes, event_type in enumerate(('CREATE', 'READ', 'READ', 'DELETE')):
+        db.session.add(events_db(event_type=event_type, user_id='u1', product_id='p1',
+                                 timestamp=now - timedelta(minutes=minutes)))
+    db.session.commit()
+    return now
+
+
+@pytest.mark.parametrize('backend', ['json', 'orjson'])
+def test_ndjson_lines_use_the_configured_backend(events, backend):
+    if backend == 'orjson' and resolve_backend('orjson') != 'orjson':
+        pytest.skip('orjson is not installed')
+
+    body = b''.join(export_events({}, 'ndjson', batch_size=3, backend=backend))
+
+    rows = [json.loads(line) for line in body.splitlines()]
+    assert [row['event_type'] for row in rows] == ['CREATE', 'READ', 'READ', 'DELETE']
+    assert rows[0]['timestamp'] == events.isoformat()
+    assert body.endswith(b'\n')
+
+
+def test_csv_has_a_header_and_one_line_per_event(events):
+    body = ''.join(export_events({'event_type': 'READ'}, 'csv', batch_size=1))
+
+    rows = list(csv.reader(io.StringIO(body)))
+    assert rows[0] == ['event_id', 'event_type', 'user_id', 'product_id', 'timestamp']
+    assert [row[1] for row in rows[1:]] == ['READ', 'READ']
+
+
+def test_all_event_types_is_accepted_and_not_filtered(events):
+    filters = EventFilterSchema(only=('event_type', 'time_range')).load({'event_type': 'all', 'time_range': 'day'})
+    assert filters['event_type'] == 'all'
+
+    body = b''.join(export_events(filters, 'ndjson'))
+    assert len(body.splitlines()) == 4
+
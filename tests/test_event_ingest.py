@@ -0,0 +1,49 @@
+import pytest
+
+from app.events import controller
+
+
+def records(count, event_type='READ'):
+    return [{'event_type': event_type, 'user_id': f'u{index}', 'product_id': 'p1'} for index in range(count)]
+
+
+@pytest.fixture
+def committed(monkeypatch):
+    """Rows passed to the commit listeners"""
+    rows = []
+    monkeypatch.setattr(controller, 'notify_events_committed', rows.extend)
+    return rows
+
+
+def test_valid_records_are_loaded_and_invalid_ones_reported(events_db, committed, monkeypatch):
+    monkeypatch.setattr(controller, 'INGEST_CHUNK_SIZE', 2)
+    batch = records(5)
+    batch[1]['event_type'] = 'VIEW'
+
+    result = controller.ingest_events(batch, method='insert')
+
+    assert (result['accepted'], result['rejected']) == (4, 1)
+    assert list(result['errors']) == [1]
+    assert events_db.query.count() == 4
+    assert len(committed) == 4
+
+
+def test_a_failing_chunk_rolls_back_the_whole_batch(events_db, committed, monkeypatch):
+    monkeypatch.setattr(controller, 'INGEST_CHUNK_SIZE', 2)
+    insert_events = controller.insert_events
+    calls = []
+
+    def failing_on_the_third_chunk(connection, rows, method):
+        calls.append(len(rows))
+        if len(calls) == 3:
+            raise RuntimeError('connection lost')
+        insert_events(connection, rows, method)
+
+    monkeypatch.setattr(controller, 'insert_events', failing_on_the_third_chunk)
+
+    with pytest.raises(RuntimeError):
+        controller.ingest_events(records(6), method='insert')
+
+    assert calls == [2, 2, 2]
+    assert events_db.query.count() == 0
+    assert committed == []
@@ -0,0 +1,20 @@
+from datetime import date
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
+
+from app.events.models import Event
+from app.events.partitions import add_months, partition_name
+
+
+def test_model_matches_the_migrated_table():
+    ddl = str(CreateTable(Event.__table__).compile(dialect=postgresql.dialect()))
+    assert 'CONSTRAINT identifier_events_pkey PRIMARY KEY (event_id, timestamp)' in ddl
+    assert 'PARTITION BY RANGE (timestamp)' in ddl
+    assert 'timestamp TIMESTAMP WITHOUT TIME ZONE NOT NULL' in ddl
+
+
+def test_months_wrap_around_the_year():
+    assert add_months(date(2024, 11, 1), 3) == date(2025, 2, 1)
+    assert add_months(date(2024, 1, 1), -1) == date(2023, 12, 1)
+    assert partition_name('identifier_events', date(2025, 2, 1)) == 'identifier_events_2025_02'
@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.products import cache as product_cache
+from app.products import controller
+
+
+def shopify_product(shopify_id):
+    return {'shopify_id': shopify_id, 'title': f'Product {shopify_id}', 'description': '',
+            'price': 1.0, 'sku': '', 'image_url': ''}
+
+
+@pytest.fixture
+def catalog(app, mirror, monkeypatch):
+    """Expired catalog over the in-memory mirror; Shopify returns products 1 and 2"""
+    def iter_products(first=None, max_pages=None):
+        return iter([shopify_product('1'), shopify_product('2')])
+
+    monkeypatch.setattr(product_cache, 'CACHE_MODE', 'read_through')
+    monkeypatch.setattr(controller.shopify_api, 'iter_products', iter_products)
+    monkeypatch.setattr(controller.shopify_api, 'max_pages', None)
+    product_cache.invalidate_catalog()
+    yield mirror
+    product_cache.invalidate_catalog()
+
+
+def test_partial_catalog_read_is_a_miss_and_leaves_the_mirror_alone(catalog):
+    catalog(shopify_id='3', title='Not in the first page', price=1.0, synced_at=datetime.utcnow()).save()
+    misses = product_cache.stats()['misses']
+
+    products = list(controller._read_through_catalog(max_pages=1))
+
+    assert [product['shopify_id'] for product in products] == ['1', '2']
+    assert product_cache.stats()['misses'] == misses + 1
+    assert product_cache.response_headers() == {'X-Cache': 'MISS'}
+    assert [product.shopify_id for product in catalog.objects] == ['3']
+    assert not product_cache.catalog_is_fresh()
+
+
+def test_refill_prunes_expired_products_missing_from_shopify(catalog):
+    catalog(shopify_id='2', title='Old', price=1.0, synced_at=datetime.utcnow() - timedelta(days=1)).save()
+    catalog(shopify_id='4', title='Deleted in Shopify', price=1.0).save()
+    product_cache.invalidate('2')
+
+    list(controller._read_through_catalog())
+
+    assert sorted(product.shopify_id for product in catalog.objects) == ['1', '2']
+    assert catalog.objects.get(shopify_id='2').title == 'Product 2'
+    assert product_cache.catalog_is_fresh()
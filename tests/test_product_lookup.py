@@ -0,0 +1,51 @@
+from datetime import datetime
+
+import pytest
+
+from app.products import cache as product_cache
+from app.products import controller
+
+
+def shopify_product(shopify_id):
+    return {'shopify_id': shopify_id, 'title': f'Product {shopify_id}', 'description': '',
+            'price': 1.0, 'sku': '', 'image_url': ''}
+
+
+@pytest.fixture
+def lookup(app, mirror, monkeypatch):
+    """Controller wired to the in-memory mirror, recording Shopify fetches and READ events"""
+    calls = {'fetched': [], 'events': []}
+
+    def get_products_by_ids(product_ids):
+        calls['fetched'].append(list(product_ids))
+        return {product_id: shopify_product(product_id) for product_id in product_ids if product_id != '404'}
+
+    monkeypatch.setattr(product_cache, 'CACHE_MODE', 'read_through')
+    monkeypatch.setattr(controller, 'get_jwt_identity', lambda: 'user-1')
+    monkeypatch.setattr(controller.shopify_api, 'get_products_by_ids', get_products_by_ids)
+    monkeypatch.setattr(controller, 'log_product_events',
+                        lambda event_type, product_ids, user_id: calls['events'].append(list(product_ids)))
+    return calls
+
+
+def test_mixed_numeric_and_gid_ids_resolve_once(lookup, mirror):
+    mirror(shopify_id='1', title='Cached', price=2.0, synced_at=datetime.utcnow()).save()
+
+    result = controller.get_products_by_ids([
+        'gid://shopify/Product/1', '1', 'gid://shopify/Product/2', 2, '2', 'gid://shopify/Product/404'
+    ])
+
+    assert [product['shopify_id'] for product in result['products']] == ['1', '2']
+    assert result['products'][0]['title'] == 'Cached'
+    assert result['missing'] == ['404']
+    # The cached product is not fetched again, and each other ID is fetched once
+    assert lookup['fetched'] == [['2', '404']]
+    assert lookup['events'] == [['1', '2']]
+
+
+def test_fetched_products_are_mirrored_under_their_numeric_id(lookup, mirror):
+    controller.get_products_by_ids(['gid://shopify/Product/7'])
+    assert [product.shopify_id for product in mirror.objects] == ['7']
+
+    controller.get_products_by_ids(['7'])
+    assert lookup['fetched'] == [['7']]
@@ -0,0 +1,81 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+from marshmallow import Schema, fields, post_dump
+
+from app.products.input_validation import ProductSchema, dump_product
+from app.utils.serialization import compile_dumper, dumps, resolve_backend
+
+PRODUCTS = [
+    {
+        'shopify_id': '8000000001',
+        'title': 'Mug',
+        'description': '<p>Blue mug</p>',
+        'price': 12.5,
+        'sku': 'MUG-1',
+        'image_url': 'https://cdn.example.com/mug.jpg'
+    },
+    # Absent keys, None values, and values the schema casts
+    {'shopify_id': 8000000002, 'title': 'Plate', 'price': '3', 'sku': None},
+    {'title': 'Bowl', 'price': 7, 'variant_id': 'gid://shopify/ProductVariant/1', 'media_id': None},
+    {},
+]
+
+
+@pytest.mark.parametrize('product', PRODUCTS)
+def test_dump_product_matches_the_schema_for_dicts(product):
+    assert dump_product(product) == ProductSchema().dump(product)
+
+
+@pytest.mark.parametrize('product', PRODUCTS)
+def test_dump_product_matches_the_schema_for_objects(product):
+    obj = SimpleNamespace(**product)
+    assert dump_product(obj) == ProductSchema().dump(obj)
+
+
+def test_dump_product_is_precompiled():
+    assert dump_product != ProductSchema().dump
+    assert not hasattr(dump_product, '__self__')
+
+
+def test_data_key_and_attribute_are_honoured():
+    class Renamed(Schema):
+        name = fields.Str(data_key='productName')
+        cost = fields.Float(attribute='price')
+
+    dumper = compile_dumper(Renamed)
+    product = {'name': 'Mug', 'price': 2}
+    assert dumper(product) == Renamed().dump(product) == {'productName': 'Mug', 'cost': 2.0}
+
+
+@pytest.mark.parametrize('schema_class', [
+    type('WithHook', (Schema,), {
+        'title': fields.Str(),
+        'upper': post_dump(lambda self, data, **kwargs: {key: value.upper() for key, value in data.items()})
+    }),
+    type('WithDefault', (Schema,), {'title': fields.Str(dump_default='untitled')}),
+    type('WithDateTime', (Schema,), {'created': fields.DateTime()}),
+    type('WithNested', (Schema,), {'title': fields.Str(attribute='product.title')}),
+])
+def test_unsupported_schemas_fall_back_to_marshmallow(schema_class):
+    dumper = compile_dumper(schema_class)
+    assert getattr(dumper, '__self__', None).__class__ is schema_class
+
+
+@pytest.mark.parametrize('backend', ['json', 'orjson'])
+def test_dumps_backends_encode_the_same_document(app, backend):
+    if backend == 'orjson' and resolve_backend('orjson') != 'orjson':
+        pytest.skip('orjson is not installed')
+    data = {'when': datetime(2024, 3, 1, 12, 0, 5), 'price': Decimal('1.5'), 'title': 'Café'}
+    body = dumps(data, backend)
+    assert body.endswith(b'\n')
+    assert json.loads(body) == {'when': '2024-03-01T12:00:05', 'price': 1.5, 'title': 'Café'}
+    assert not dumps(data, backend, newline=False).endswith(b'\n')
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        resolve_backend('yaml')
@@ -0,0 +1,82 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.utils.shopify import ShopifyAPI
+
+
+class GraphQLHandler(BaseHTTPRequestHandler):
+    """Keep-alive GraphQL endpoint recording which client connection each call used"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.server.connections.append(self.client_address)
+        body = json.dumps({'data': {'shop': {'name': 'test-shop'}}}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), GraphQLHandler)
+    server.connections = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def api(server, monkeypatch):
+    monkeypatch.setenv('SHOPIFY_API_URL', f'http://127.0.0.1:{server.server_address[1]}/graphql.json')
+    api = ShopifyAPI()
+    yield api
+    api.close()
+
+
+QUERY = 'query shop { shop { name } }'
+
+
+def test_sequential_calls_reuse_one_connection(api, server):
+    for _ in range(5):
+        assert api._make_request(QUERY)['data']['shop']['name'] == 'test-shop'
+
+    assert len(server.connections) == 5
+    assert len(set(server.connections)) == 1
+    assert api.pool_stats() == {'requests': 5, 'connections_opened': 1, 'pool_hits': 4, 'pool_misses': 1}
+
+
+def test_connection_is_shared_across_threads(api, server):
+    # One call at a time, each from a different thread
+    for _ in range(4):
+        thread = threading.Thread(target=api._make_request, args=(QUERY,))
+        thread.start()
+        thread.join()
+
+    assert len(set(server.connections)) == 1
+    stats = api.pool_stats()
+    assert (stats['requests'], stats['pool_hits'], stats['pool_misses']) == (4, 3, 1)
+
+
+def test_pool_stats_before_the_first_call(api):
+    assert api.pool_stats() == {'requests': 0, 'connections_opened': 0, 'pool_hits': 0, 'pool_misses': 0}
+
+
+def test_close_drops_the_pool(api, server):
+    api._make_request(QUERY)
+    api.close()
+    api._make_request(QUERY)
+
+    assert len(set(server.connections)) == 2
+    assert api.pool_stats()['requests'] == 1
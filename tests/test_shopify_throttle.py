@@ -0,0 +1,116 @@
+import threading
+import time
+
+import pytest
+
+from app.utils.shopify_throttle import DEFAULT_MUTATION_COST, CostBucket, ThrottleWaitExceeded
+
+
+def throttle_status(available, maximum=1000.0, restore_rate=50.0):
+    return {
+        'requestedQueryCost': None,
+        'throttleStatus': {
+            'maximumAvailable': maximum,
+            'currentlyAvailable': available,
+            'restoreRate': restore_rate
+        }
+    }
+
+
+def test_acquire_within_budget_does_not_wait():
+    bucket = CostBucket(maximum=100, restore_rate=1)
+    started = time.monotonic()
+    bucket.acquire(60)
+    assert time.monotonic() - started < 0.1
+    assert bucket.stats()['bucket']['available'] == pytest.approx(40, abs=0.5)
+    assert bucket.stats()['waits'] == 0
+
+
+def test_acquire_waits_for_restored_points():
+    bucket = CostBucket(maximum=100, restore_rate=200, max_wait=5)
+    bucket.acquire(100)
+    started = time.monotonic()
+    bucket.acquire(40)
+    waited = time.monotonic() - started
+    assert 0.1 < waited < 1.0
+    stats = bucket.stats()
+    assert stats['waits'] == 1
+    assert stats['queue_depth'] == 0
+
+
+def test_acquire_gives_up_after_max_wait():
+    bucket = CostBucket(maximum=100, restore_rate=1, max_wait=0.3)
+    bucket.acquire(100)
+    started = time.monotonic()
+    with pytest.raises(ThrottleWaitExceeded) as excinfo:
+        bucket.acquire(50)
+    assert 0.25 < time.monotonic() - started < 1.0
+    # Close to 50 points at one point per second are still missing
+    assert excinfo.value.retry_after == pytest.approx(49.7, abs=0.5)
+
+
+def test_waiting_call_uses_a_restore_rate_settled_by_a_response():
+    bucket = CostBucket(maximum=100, restore_rate=20, max_wait=5)
+    bucket.acquire(100)
+    timer = threading.Timer(0.2, bucket.settle, ('products', throttle_status(0, maximum=100, restore_rate=200)))
+    timer.start()
+    started = time.monotonic()
+    bucket.acquire(50)
+    timer.join()
+    assert time.monotonic() - started < 1.0
+
+
+def test_cost_is_capped_at_the_bucket_size():
+    bucket = CostBucket(maximum=100, restore_rate=1, max_wait=0)
+    bucket.acquire(500)
+    assert bucket.stats()['bucket']['available'] == pytest.approx(0, abs=0.5)
+
+
+def test_estimate_before_and_after_learning_the_cost():
+    bucket = CostBucket()
+    assert bucket.estimate('products', {'first': 50}) == 52.0
+    assert bucket.estimate('nodes', {'ids': ['1', '2', '3']}) == 5.0
+    assert bucket.estimate('productCreate', is_mutation=True) == DEFAULT_MUTATION_COST
+
+    bucket.settle('products', {'requestedQueryCost': 27})
+    assert bucket.estimate('products', {'first': 50}) == 27.0
+
+
+def test_settle_takes_the_bucket_size_rate_and_a_lower_level():
+    bucket = CostBucket(maximum=1000, restore_rate=50)
+    bucket.settle('products', throttle_status(120, maximum=2000, restore_rate=100))
+    state = bucket.stats()['bucket']
+    assert state['maximum'] == 2000
+    assert state['restore_rate'] == 100
+    assert state['available'] == pytest.approx(120, abs=1)
+
+
+def test_settle_does_not_hand_out_points_reserved_in_flight():
+    bucket = CostBucket(maximum=100, restore_rate=1)
+    bucket.acquire(80)
+    # A response sent before the reserved call reached Shopify
+    bucket.settle('products', throttle_status(100, maximum=100, restore_rate=1))
+    assert bucket.stats()['bucket']['available'] == pytest.approx(20, abs=0.5)
+
+
+def test_backoff_covers_the_missing_points():
+    bucket = CostBucket(maximum=100, restore_rate=10)
+    bucket.acquire(100)
+    assert bucket.backoff(0, 50) >= 4.9
+    assert bucket.stats()['throttled_retries'] == 1
+
+
+def test_backoff_grows_exponentially():
+    bucket = CostBucket(maximum=100, restore_rate=10)
+    assert 4.0 <= bucket.backoff(3, 1) <= 4.25
+
+
+def test_buckets_share_state_through_the_state_file(tmp_path):
+    state_file = str(tmp_path / 'throttle.json')
+    first = CostBucket(maximum=100, restore_rate=1, state_file=state_file, max_wait=0)
+    second = CostBucket(maximum=100, restore_rate=1, state_file=state_file, max_wait=0)
+    first.acquire(80)
+    with pytest.raises(ThrottleWaitExceeded):
+        second.acquire(50)
+    second.acquire(15)
+    assert first.stats()['bucket']['available'] == pytest.approx(5, abs=0.5)
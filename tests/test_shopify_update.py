@@ -0,0 +1,141 @@
+import pytest
+
+from app.utils.shopify import ShopifyAPI, operation_name
+
+CURRENT = {
+    'shopify_id': '101',
+    'title': 'Mug',
+    'description': '<p>Blue mug</p>',
+    'price': 12.5,
+    'sku': 'MUG-1',
+    'image_url': 'https://cdn.shopify.com/files/mug.jpg',
+    'image_source_url': 'https://example.com/mug.jpg',
+    'variant_id': 'gid://shopify/ProductVariant/201',
+    'media_id': 'gid://shopify/MediaImage/301'
+}
+
+
+class RecordingAPI(ShopifyAPI):
+    """ShopifyAPI answering mutations from canned payloads instead of the network"""
+
+    def __init__(self):
+        super().__init__()
+        self.requests = []
+
+    def _make_request(self, query, variables=None, timeout=None):
+        self.requests.append((query, variables))
+        data = {}
+        if 'productUpdate(' in query:
+            product = variables['product']
+            data['productUpdate'] = {
+                'product': {'id': product['id'], 'title': product.get('title', CURRENT['title']),
+                            'descriptionHtml': product.get('descriptionHtml', CURRENT['description'])},
+                'userErrors': []
+            }
+        if 'productVariantUpdate(' in query:
+            variant = variables['variant']
+            data['productVariantUpdate'] = {
+                'productVariant': {'id': variant['id'], 'price': variant.get('price', '12.5'),
+                                   'sku': variant.get('sku', CURRENT['sku'])},
+                'userErrors': []
+            }
+        if 'productDeleteMedia(' in query:
+            data['productDeleteMedia'] = {'deletedMediaIds': variables['oldMediaIds'], 'mediaUserErrors': []}
+        if 'productCreateMedia(' in query:
+            data['productCreateMedia'] = {
+                'media': [{'id': 'gid://shopify/MediaImage/302', 'image': None}],
+                'mediaUserErrors': []
+            }
+        return {'data': data}
+
+    def get_product(self, product_id):
+        self.requests.append(('get_product', product_id))
+        return dict(CURRENT)
+
+    def _get_variant_id(self, product_gid):
+        self.requests.append(('get_variant_id', product_gid))
+        return CURRENT['variant_id']
+
+
+@pytest.fixture
+def api():
+    return RecordingAPI()
+
+
+def test_unchanged_payload_makes_no_call(api):
+    payload = {key: CURRENT[key] for key in ('title', 'description', 'price', 'sku')}
+    payload['image_url'] = CURRENT['image_source_url']
+    result = api.update_product('101', payload, dict(CURRENT))
+    assert api.requests == []
+    assert result == CURRENT
+
+
+def test_price_given_as_string_is_compared_as_a_number(api):
+    api.update_product('101', {'price': '12.50'}, dict(CURRENT))
+    assert api.requests == []
+
+
+def test_only_the_variant_mutation_is_sent_for_a_price_change(api):
+    result = api.update_product('101', {'title': 'Mug', 'price': 15}, dict(CURRENT))
+    assert len(api.requests) == 1
+    query, variables = api.requests[0]
+    assert operation_name(query) == 'productVariantUpdate'
+    assert variables == {'variant': {'id': CURRENT['variant_id'], 'price': '15'}}
+    assert result['price'] == 15.0
+    assert result['title'] == 'Mug'
+
+
+def test_changed_mutations_are_batched_and_named_after_their_contents(api):
+    result = api.update_product('101', {'title': 'Big mug', 'image_url': 'https://example.com/big.jpg'},
+                                dict(CURRENT))
+    assert len(api.requests) == 1
+    query, variables = api.requests[0]
+    assert operation_name(query) == 'productUpdate_productDeleteMedia_productCreateMedia'
+    assert 'variant' not in variables
+    assert variables['oldMediaIds'] == [CURRENT['media_id']]
+    assert result['title'] == 'Big mug'
+    assert result['media_id'] == 'gid://shopify/MediaImage/302'
+    assert result['image_source_url'] == 'https://example.com/big.jpg'
+    # Media is processed asynchronously: no CDN URL yet
+    assert result['image_url'] == 'https://example.com/big.jpg'
+
+
+def test_image_is_compared_with_its_source_url(api):
+    # The mirror holds the CDN URL; resubmitting the uploaded URL is no change
+    api.update_product('101', {'image_url': CURRENT['image_source_url']}, dict(CURRENT))
+    assert api.requests == []
+
+    api.update_product('101', {'image_url': CURRENT['image_url']}, dict(CURRENT))
+    assert operation_name(api.requests[0][0]) == 'productDeleteMedia_productCreateMedia'
+
+
+def test_first_image_is_created_without_deleting_media(api):
+    current = dict(CURRENT, media_id=None, image_source_url=None, image_url='')
+    api.update_product('101', {'image_url': 'https://example.com/new.jpg'}, current)
+    query, variables = api.requests[0]
+    assert operation_name(query) == 'productCreateMedia'
+    assert 'oldMediaIds' not in variables
+
+
+def test_unknown_variant_id_is_looked_up(api):
+    current = dict(CURRENT, variant_id=None)
+    api.update_product('101', {'sku': 'MUG-2'}, current)
+    assert api.requests[0] == ('get_variant_id', 'gid://shopify/Product/101')
+    assert operation_name(api.requests[1][0]) == 'productVariantUpdate'
+
+
+def test_without_current_state_every_field_is_written_and_read_back(api):
+    result = api.update_product('101', {'title': 'Mug', 'price': 12.5})
+    names = [request[0] if request[0] in ('get_product', 'get_variant_id') else operation_name(request[0])
+             for request in api.requests]
+    assert names == ['get_variant_id', 'productUpdate_productVariantUpdate', 'get_product']
+    assert result['variant_id'] == CURRENT['variant_id']
+
+
+def test_user_errors_are_raised(api):
+    def failing(query, variables=None, timeout=None):
+        return {'data': {'productUpdate': {'product': None, 'userErrors': [{'field': 'title', 'message': 'Bad'}]}}}
+
+    api._make_request = failing
+    with pytest.raises(Exception, match='Bad'):
+        api.update_product('101', {'title': 'New'}, dict(CURRENT))
@@ -0,0 +1,123 @@
+import random
+from collections import Counter
+
+import pytest
+
+from app.utils.sketches import CountMinSketch, HyperLogLog, TopK, merge_all
+
+
+def hll_of(values, precision=12):
+    sketch = HyperLogLog(precision)
+    for value in values:
+        sketch.add(value)
+    return sketch
+
+
+@pytest.mark.parametrize('distinct', [10, 1000, 50000])
+def test_hll_count_is_within_its_error_bound(distinct):
+    sketch = hll_of(f'user-{index}' for index in range(distinct))
+    # Four standard errors: fails by chance far less than once in 10000 runs
+    tolerance = 4 * HyperLogLog.standard_error(12) * distinct
+    assert abs(sketch.count() - distinct) <= max(tolerance, 1)
+
+
+def test_hll_ignores_duplicates():
+    assert hll_of(['a', 'b', 'a', 'a', 'b']).count() == 2
+
+
+def test_hll_merge_is_the_union():
+    left = hll_of(f'user-{index}' for index in range(0, 6000))
+    right = hll_of(f'user-{index}' for index in range(4000, 10000))
+    union = hll_of(f'user-{index}' for index in range(10000))
+    left.merge(right)
+    assert left.registers == union.registers
+
+
+def test_hll_round_trips_through_bytes():
+    sketch = hll_of(f'user-{index}' for index in range(500))
+    restored = HyperLogLog.from_bytes(sketch.to_bytes())
+    assert restored.precision == sketch.precision
+    assert restored.count() == sketch.count()
+
+
+def test_hll_rejects_mismatched_precision():
+    with pytest.raises(ValueError):
+        HyperLogLog(10).merge(HyperLogLog(12))
+    with pytest.raises(ValueError):
+        HyperLogLog(3)
+
+
+def zipf_stream(items=2000, length=50000, seed=0):
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(items)]
+    return rng.choices([f'product-{rank}' for rank in range(items)], weights, k=length)
+
+
+def test_cms_never_undercounts_and_stays_within_its_bound():
+    stream = zipf_stream()
+    truth = Counter(stream)
+    sketch = CountMinSketch()
+    for item in stream:
+        sketch.add(item)
+
+    epsilon, _ = CountMinSketch.error_rate(sketch.width, sketch.depth)
+    over_bound = 0
+    for item, count in truth.items():
+        estimate = sketch.estimate(item)
+        assert estimate >= count
+        over_bound += estimate - count > epsilon * sketch.total
+    # The bound holds per item with probability 1 - e**-4 (98%)
+    assert over_bound <= 0.05 * len(truth)
+    assert sketch.total == len(stream)
+
+
+def test_cms_merge_adds_tables():
+    left, right, both = CountMinSketch(), CountMinSketch(), CountMinSketch()
+    for item in ('a', 'b', 'a'):
+        left.add(item)
+        both.add(item)
+    for item in ('a', 'c'):
+        right.add(item, 5)
+        both.add(item, 5)
+    left.merge(right)
+    assert left.table == both.table
+    assert left.total == both.total == 13
+
+
+def test_cms_round_trips_through_bytes():
+    sketch = CountMinSketch(width=64, depth=3)
+    sketch.add('a', 7)
+    restored = CountMinSketch.from_bytes(sketch.to_bytes())
+    assert (restored.width, restored.depth, restored.total) == (64, 3, 7)
+    assert restored.estimate('a') == 7
+
+
+def test_cms_rejects_mismatched_shapes():
+    with pytest.raises(ValueError):
+        CountMinSketch(width=64).merge(CountMinSketch(width=128))
+
+
+def test_topk_finds_the_heavy_hitters():
+    stream = zipf_stream()
+    topk = TopK(capacity=50)
+    for item in stream:
+        topk.add(item)
+    expected = [item for item, _ in Counter(stream).most_common(10)]
+    assert [item for item, _ in topk.top(10)] == expected
+
+
+def test_topk_combine_matches_merge():
+    stream = zipf_stream()
+    buckets = [TopK(capacity=50) for _ in range(4)]
+    for index, item in enumerate(stream):
+        buckets[index % 4].add(item)
+
+    combined = TopK.combine(buckets, 10)
+    merged = merge_all(TopK.from_bytes(bucket.to_bytes()) for bucket in buckets).top(10)
+    assert [item for item, _ in combined] == [item for item, _ in merged]
+    truth = Counter(stream)
+    assert all(count >= truth[item] for item, count in combined)
+
+
+def test_merge_all_of_nothing_is_none():
+    assert merge_all([]) is None
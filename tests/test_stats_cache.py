@@ -0,0 +1,163 @@
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.events import stats_cache
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    stats_cache.clear()
+    yield
+    stats_cache.clear()
+
+
+class EventStore:
+    """In-memory events with the aggregate the stats controller computes in SQL"""
+
+    def __init__(self, group_by, **filters):
+        self.group_by = group_by
+        self.filters = filters
+        self.rows = []
+        self.calls = []
+
+    def add(self, timestamp, event_type='READ', user_id='u1', product_id='p1'):
+        row = {'timestamp': timestamp, 'event_type': event_type, 'user_id': user_id, 'product_id': product_id}
+        self.rows.append(row)
+        return row
+
+    def compute(self, start, end):
+        self.calls.append((start, end))
+        return dict(Counter(
+            (stats_cache.bucket_start(row['timestamp'], self.group_by), row['event_type'])
+            for row in self.rows
+            if (start is None or row['timestamp'] >= start) and (end is None or row['timestamp'] < end)
+            and all(row[name] == value for name, value in self.filters.items())
+        ))
+
+    def get(self, start):
+        return stats_cache.get(self.group_by, self.filters, start, self.compute)
+
+
+def counted(name, before):
+    """How much a stats() counter grew since `before` (counters survive clear())"""
+    return stats_cache.stats()[name] - before[name]
+
+
+def days_ago(days, hour=12):
+    return (datetime.utcnow() - timedelta(days=days)).replace(hour=hour, minute=0, second=0, microsecond=0)
+
+
+def test_cached_counts_match_a_fresh_computation():
+    store = EventStore('day')
+    for days in (1, 2, 2, 5, 9):
+        store.add(days_ago(days))
+    store.add(datetime.utcnow(), 'CREATE')
+    start = days_ago(7, hour=0)
+
+    first = store.get(start)
+    assert first == store.compute(start, None)
+    assert store.get(start) == first
+
+
+def test_closed_buckets_are_not_recomputed_on_a_hit():
+    store = EventStore('day')
+    store.add(days_ago(3))
+    store.get(days_ago(7, hour=0))
+    store.calls.clear()
+    before = stats_cache.stats()
+
+    store.get(days_ago(7, hour=0))
+    open_start = stats_cache.bucket_start(datetime.utcnow(), 'day')
+    assert store.calls == [(open_start, None)]
+    assert counted('hits', before) == 1
+
+
+def test_invalidate_recomputes_only_the_touched_bucket():
+    store = EventStore('day')
+    store.add(days_ago(3))
+    start = days_ago(7, hour=0)
+    store.get(start)
+    before = stats_cache.stats()
+
+    row = store.add(days_ago(2), 'UPDATE')
+    stats_cache.invalidate([row])
+    store.calls.clear()
+
+    counts = store.get(start)
+    bucket = stats_cache.bucket_start(row['timestamp'], 'day')
+    assert counts[(bucket, 'UPDATE')] == 1
+    assert (bucket, stats_cache.next_bucket(bucket, 'day')) in store.calls
+    assert len(store.calls) == 2
+    assert counted('invalidations', before) == 1
+
+
+def test_invalidate_ignores_rows_outside_the_entry_filters():
+    store = EventStore('week', user_id='u1')
+    start = days_ago(30, hour=0)
+    store.get(start)
+    before = stats_cache.stats()
+
+    stats_cache.invalidate([{'timestamp': days_ago(10), 'event_type': 'READ', 'user_id': 'u2', 'product_id': 'p1'}])
+    assert counted('invalidations', before) == 0
+
+
+def test_invalidate_skips_rows_in_open_buckets():
+    store = EventStore('day')
+    store.get(days_ago(7, hour=0))
+    generation = stats_cache._generation
+    before = stats_cache.stats()
+
+    stats_cache.invalidate([store.add(datetime.utcnow())])
+    assert stats_cache._generation == generation
+    assert counted('invalidations', before) == 0
+    # Still counted, through the open bucket
+    assert sum(store.get(days_ago(7, hour=0)).values()) == 1
+
+
+def test_each_granularity_is_invalidated_by_its_own_bucket():
+    day, month = EventStore('day'), EventStore('month')
+    start = days_ago(90, hour=0)
+    day.get(start)
+    month.get(start)
+    before = stats_cache.stats()
+
+    row = day.add(days_ago(40))
+    month.rows.append(row)
+    stats_cache.invalidate([row])
+    assert counted('invalidations', before) == 2
+    assert day.get(start) == day.compute(start, None)
+    assert month.get(start) == month.compute(start, None)
+
+
+def test_fill_racing_an_invalidation_is_not_stored():
+    store = EventStore('day')
+    store.add(days_ago(3))
+    start = days_ago(7, hour=0)
+
+    def racing_compute(range_start, range_end):
+        counts = store.compute(range_start, range_end)
+        # An event commits into a closed bucket while the fill is running
+        stats_cache.invalidate([store.add(days_ago(4))])
+        return counts
+
+    stats_cache.get('day', {}, start, racing_compute)
+    assert stats_cache.stats()['entries'] == 0
+    assert store.get(start) == store.compute(start, None)
+
+
+def test_expired_entries_are_rebuilt(monkeypatch):
+    store = EventStore('day')
+    store.add(days_ago(3))
+    start = days_ago(7, hour=0)
+    store.get(start)
+
+    # A back-dated event written by another worker: no invalidation here
+    store.add(days_ago(3), 'DELETE')
+    assert store.get(start) != store.compute(start, None)
+
+    monkeypatch.setattr(stats_cache, 'MAX_AGE', 60)
+    for entry in stats_cache._entries.values():
+        entry['created'] -= 61
+    assert store.get(start) == store.compute(start, None)